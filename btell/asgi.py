@@ -3,6 +3,9 @@ ASGI config for btell project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The reading and story list views are async, so an ASGI server with a few workers (e.g.
+``uvicorn btell.asgi:application --workers 4``) can serve many concurrent readers.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,6 +27,9 @@ SECRET_KEY = 'django-insecure-r(53(rjg5ow_q1ecl*+9$1f30$ipmlcuvz%3lr%(!4q=yp&#_$
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Whether we are running the tests (`manage.py test`).
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -42,7 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'btell_main.util.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'btell_main.util.replicas.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,15 +62,24 @@ ROOT_URLCONF = 'btell.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django template backend, with render times measured (see `btell_main.util.instrumentation`).
+        'BACKEND': 'btell_main.util.instrumentation.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory. The development server still reloads them when
+            # they change.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'btell_main.views.context.user_context',
             ],
         },
     },
@@ -75,12 +91,72 @@ WSGI_APPLICATION = 'btell.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite in the project directory by default. Set BTELL_DB_ENGINE=postgresql (and the other
+# BTELL_DB_* variables) for production installs, which also need psycopg2 installed.
+
+if os.environ.get('BTELL_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BTELL_DB_NAME', 'btell'),
+            'USER': os.environ.get('BTELL_DB_USER', ''),
+            'PASSWORD': os.environ.get('BTELL_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BTELL_DB_HOST', ''),
+            'PORT': os.environ.get('BTELL_DB_PORT', ''),
+            # Keep connections open between requests, and check them before reusing them.
+            'CONN_MAX_AGE': int(os.environ.get('BTELL_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('BTELL_DB_POOLED'):
+        # Connections go through a transaction-pooling proxy (e.g. PgBouncer), which keeps the
+        # server connections open. Named cursors do not survive between transactions there.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    # Read-only replicas of the primary, e.g. BTELL_DB_REPLICA_HOSTS=replica1.local,replica2.local
+    for number, host in enumerate(filter(None, os.environ.get('BTELL_DB_REPLICA_HOSTS', '').split(','))):
+        DATABASES[f'replica{number + 1}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BTELL_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Seconds to wait for a lock before failing with "database is locked".
+                'timeout': 20,
+            },
+        }
+    }
+
+# Aliases of the databases which the reading and listing views may read from (see
+# `btell_main.util.replicas`). The primary (`default`) is used when there are none.
+BTELL_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['btell_main.util.replicas.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# In-memory per process by default. Set BTELL_CACHE_DIR to share the cache between worker processes.
+# Both backends count hits and misses for `btell_main.util.instrumentation`.
+
+if os.environ.get('BTELL_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'btell_main.util.instrumentation.FileBasedCache',
+            'LOCATION': os.environ['BTELL_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'btell_main.util.instrumentation.LocMemCache',
+        }
     }
-}
 
 
 # Password validation
@@ -145,3 +221,98 @@ LOGIN_REDIRECT_URL = '/'
 # Specific settings for BTell
 
 BTELL_MAX_USERNAME_LENGTH = 30
+
+# Number of stories shown on a single page of the story list.
+BTELL_STORIES_PER_PAGE = 20
+
+# Whether the full-text search index also covers the content of chapters, not just the title
+# and description of stories. Run `manage.py rebuild_search_index` after changing this.
+BTELL_SEARCH_CHAPTER_CONTENT = False
+
+# Number of chapter links whose compiled conditions and actions are kept in memory (per process).
+BTELL_DSL_CACHE_SIZE = 4096
+
+# Number of selective text conditions (see `util.chapter_render`) kept compiled in memory (per process).
+BTELL_SLOT_CONDITION_CACHE_SIZE = 4096
+
+# Store the story variables of readers packed into a single column of `StoryReader`, instead of
+# one `StoryReaderVars` row per variable.
+BTELL_READER_VARS_PACKED = False
+
+# How long (in seconds) the user and profile information shown on every page is cached.
+BTELL_USER_INFO_CACHE_TIMEOUT = 300
+
+# If set, likes and dislikes are counted in this many rows per story, and only periodically folded
+# into the story with `manage.py fold_votes`. Use this when popular stories get a lot of votes.
+BTELL_VOTE_COUNTER_SHARDS = 0
+
+# Number of comments returned in a single page.
+BTELL_COMMENTS_PER_PAGE = 20
+
+# How long (in seconds) pages of the story list are cached. Changes to stories and tags
+# invalidate the cached pages before that.
+BTELL_LISTING_CACHE_TIMEOUT = 600
+
+# Directory of the content-addressed image store (see `btell_main.util.image_store`).
+BTELL_UPLOADS_DIR = BASE_DIR / 'uploads'
+# Resized variants generated for every uploaded image: name -> maximum (width, height).
+BTELL_IMAGE_VARIANTS = {
+    'thumb': (160, 240),
+    'card': (400, 600),
+}
+# Number of background threads generating image variants.
+BTELL_IMAGE_WORKERS = 2
+# Uploaded images with more pixels than this are rejected, as resizing them would take too much memory.
+BTELL_IMAGE_MAX_PIXELS = 40_000_000
+
+# PRAGMA statements run on every new SQLite connection (see `btell_main.util.db`). WAL lets
+# readers continue while a write is in progress, which the default rollback journal does not.
+BTELL_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,
+}
+
+# For how long (in seconds) users read from the primary database after writing to it, so they see
+# their own changes even if the replicas lag behind.
+BTELL_REPLICA_PIN_SECONDS = 5
+
+# Buffer the progress of readers (their current chapter) in memory and write it in batches, instead
+# of writing every chapter transition right away (see `btell_main.util.progress_buffer`).
+BTELL_PROGRESS_WRITE_BEHIND = False
+# How often (in seconds) buffered progress is written, and how many readers may be waiting before
+# it is written early.
+BTELL_PROGRESS_FLUSH_SECONDS = 5
+BTELL_PROGRESS_BUFFER_SIZE = 500
+
+# Send the performance measurements of each request in a `Server-Timing` header, so they show up
+# in the developer tools of browsers (see `btell_main.util.instrumentation`).
+BTELL_SERVER_TIMING = DEBUG
+# Maximum number of database queries per request, by URL name. Going over budget is logged, and
+# fails the request in strict mode, which is always on in the tests.
+BTELL_QUERY_BUDGETS = {
+    'story_list': 6,
+    'story_list_json': 4,
+    'tag_autocomplete': 2,
+    'read_chapter': 8,
+    'follow_link': 15,
+    'story_comments': 8,
+    'vote_story': 10,
+    'story_graph_json': 6,
+    'story_export': 4,
+    'upload_cover': 8,
+    'image': 0,
+    'image_variant': 0,
+}
+BTELL_QUERY_BUDGETS_STRICT = TESTING
+
+# How long (in seconds) shared caches (e.g. a CDN) may keep published chapters, as shown to anonymous
+# readers. Logged-in readers get pages personalized by their story variables, which are never shared.
+BTELL_CHAPTER_CACHE_SECONDS = 300
+
+# How long (in seconds) rendered page fragments (header, footer, story cards) are cached. Fragments
+# are keyed by theme and login state, and story cards by the generation of the listing cache, which
+# changes with every saved story (see `util.listing_cache`).
+BTELL_FRAGMENT_CACHE_TIMEOUT = 3600
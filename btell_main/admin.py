@@ -2,6 +2,17 @@
 from django.contrib import admin
 from btell_main import models
 
+
+@admin.register(models.SiteSettings)
+class SiteSettingsAdmin(admin.ModelAdmin):
+    """The site settings are a singleton, which can only be edited."""
+
+    def has_add_permission(self, request):
+        return not models.SiteSettings.objects.exists()  # pylint:disable=no-member
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Register your models here.
 admin.site.register(models.Profile)
-admin.site.register(models.SiteSettings)
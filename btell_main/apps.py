@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BtellMainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'btell_main'
+
+    def ready(self):
+        # Per-connection database settings and instrumentation, and modules which keep derived data in sync through signal receivers.
+        from btell_main.util import comments, db, instrumentation, listing_cache, search, site_settings, story_graph, tags  # pylint:disable=import-outside-toplevel,unused-import
+        from btell_main.views import context  # pylint:disable=import-outside-toplevel,unused-import
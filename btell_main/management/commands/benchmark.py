@@ -0,0 +1,54 @@
+"""Benchmarks the hot paths of reading and listing stories, on synthetic data."""
+import json
+
+from django.core.management import base
+from django.db import transaction
+from django.test import utils as test_utils
+
+from btell_main.util import benchmark, listing_cache
+
+# The benchmarks clear the cache between runs, so they get one of their own, rather than wiping the
+# cache shared with the running site (and leaving pages of the synthetic stories in it).
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'btell_main.util.instrumentation.LocMemCache',
+        'LOCATION': 'btell-benchmark',
+    }
+}
+
+
+class Command(base.BaseCommand):
+    help = ('Generates synthetic stories, chapters, links and readers, times the operations on the reading '
+            'and listing paths, and prints the results as JSON. The data is removed afterwards.')
+
+    def add_arguments(self, parser):
+        defaults = benchmark.Scale()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--tags', type=int, default=defaults.tags)
+        parser.add_argument('--stories', type=int, default=defaults.stories)
+        parser.add_argument('--chapters', type=int, default=defaults.chapters, help='Chapters per story.')
+        parser.add_argument('--links', type=int, default=defaults.links, help='Links per chapter.')
+        parser.add_argument('--variables', type=int, default=defaults.variables, help='Story variables per reader.')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--repeat', type=int, default=20, help='Number of times each operation is timed.')
+        parser.add_argument('--output', '-o', help='Output file (default: standard output).')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data in the database.')
+
+    def handle(self, *args, **options):
+        scale = benchmark.Scale(**{name: options[name] for name in
+                                   ('users', 'tags', 'stories', 'chapters', 'links', 'variables', 'seed')})
+        if min(scale.users, scale.tags, scale.stories, scale.chapters, scale.variables, options['repeat']) < 1:
+            raise base.CommandError('The scale and --repeat must be at least 1 (--links may be 0).')
+        with test_utils.override_settings(CACHES=BENCHMARK_CACHES), transaction.atomic():
+            fixtures = benchmark.generate_fixtures(scale)
+            results = benchmark.run_benchmarks(fixtures, options['repeat'])
+            if not options['keep']:
+                transaction.set_rollback(True)
+        if options['keep']:
+            # Make the site list the kept stories.
+            listing_cache.invalidate()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,26 @@
+"""Exports a story as newline-delimited JSON."""
+import sys
+
+from django.core.management import base
+
+from btell_main import models
+from btell_main.util import story_export
+
+
+class Command(base.BaseCommand):
+    help = 'Exports a story, with its tags, chapters and links, as newline-delimited JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('story_id', type=int)
+        parser.add_argument('--output', '-o', help='Output file (default: standard output).')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+
+    def handle(self, *args, **options):
+        if not models.Story.objects.filter(pk=options['story_id']).exists():  # pylint:disable=no-member
+            raise base.CommandError(f"Story {options['story_id']} does not exist.")
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                story_export.write_export(options['story_id'], output, compress=options['gzip'])
+        else:
+            story_export.write_export(options['story_id'], sys.stdout.buffer, compress=options['gzip'])
+            sys.stdout.buffer.flush()
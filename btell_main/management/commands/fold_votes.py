@@ -0,0 +1,12 @@
+"""Moves pending like/dislike counter changes into the stories."""
+from django.core.management import base
+
+from btell_main.util import votes
+
+
+class Command(base.BaseCommand):
+    help = 'Folds the sharded vote counters into Story.likes and Story.dislikes (see BTELL_VOTE_COUNTER_SHARDS).'
+
+    def handle(self, *args, **options):
+        count = votes.fold_vote_shards()
+        self.stdout.write(f'Updated the vote counters of {count} stories.')
@@ -0,0 +1,26 @@
+"""Imports a story exported with `export_story`."""
+from django.contrib.auth import models as auth_models
+from django.core.management import base
+
+from btell_main.util import story_export
+
+
+class Command(base.BaseCommand):
+    help = 'Imports a story exported with export_story (plain or gzip-compressed) as a new story.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--author', help='Username of the new author (default: the exported author).')
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = auth_models.User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise base.CommandError(f"User {options['author']} does not exist.")
+        with story_export.open_export(options['path']) as source:
+            try:
+                story = story_export.import_story(story_export.read_records(source), author)
+            except ValueError as import_error:
+                raise base.CommandError(str(import_error)) from import_error
+        self.stdout.write(f'Imported story {story.pk}: {story.title}')
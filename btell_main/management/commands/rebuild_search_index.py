@@ -0,0 +1,12 @@
+"""Rebuilds the full-text search index of all stories."""
+from django.core.management import base
+
+from btell_main.util import search
+
+
+class Command(base.BaseCommand):
+    help = 'Rebuilds the full-text search index of all stories (e.g. after changing BTELL_SEARCH_CHAPTER_CONTENT).'
+
+    def handle(self, *args, **options):
+        count = search.rebuild_index()
+        self.stdout.write(f'Indexed {count} stories.')
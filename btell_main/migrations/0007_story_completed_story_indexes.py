@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 08:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0006_remove_story_draft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='completed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='last_update',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['published', 'last_update'], name='story_published_update_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['author', 'published'], name='story_author_published_idx'),
+        ),
+    ]
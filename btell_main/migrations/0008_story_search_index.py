@@ -0,0 +1,55 @@
+# Full-text search index for stories, see `btell_main.util.search`.
+
+from django.db import migrations
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE btell_main_story_fts USING fts5("
+    "title, description, content, tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_FILL = (
+    "INSERT INTO btell_main_story_fts (rowid, title, description, content) "
+    "SELECT id, title, description, '' FROM btell_main_story"
+)
+POSTGRES_CREATE = (
+    "CREATE TABLE btell_main_story_search ("
+    "story_id bigint PRIMARY KEY REFERENCES btell_main_story (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)"
+)
+POSTGRES_INDEX = "CREATE INDEX btell_main_story_search_gin ON btell_main_story_search USING GIN (document)"
+POSTGRES_FILL = (
+    "INSERT INTO btell_main_story_search (story_id, document) "
+    "SELECT id, setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', description), 'B') "
+    "FROM btell_main_story"
+)
+
+
+def create_search_index(apps, schema_editor):
+    del apps
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_CREATE)
+        schema_editor.execute(POSTGRES_INDEX)
+        schema_editor.execute(POSTGRES_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    del apps
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE btell_main_story_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE btell_main_story_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0007_story_completed_story_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
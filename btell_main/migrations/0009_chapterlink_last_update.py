@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0008_story_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapterlink',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
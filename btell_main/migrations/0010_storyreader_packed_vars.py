@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+def remove_duplicate_vars(apps, schema_editor):
+    """Keeps only the newest row of each (reader, variable_name), so the constraint can be added."""
+    del schema_editor
+    reader_vars = apps.get_model('btell_main', 'StoryReaderVars')
+    duplicates = (reader_vars.objects.values('reader', 'variable_name')
+                  .annotate(newest=models.Max('id'), count=models.Count('id'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        reader_vars.objects.filter(reader=duplicate['reader'], variable_name=duplicate['variable_name'],
+                                   id__lt=duplicate['newest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0009_chapterlink_last_update'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storyreader',
+            name='packed_vars',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(remove_duplicate_vars, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='storyreadervars',
+            constraint=models.UniqueConstraint(fields=('reader', 'variable_name'), name='reader_variable_unique'),
+        ),
+    ]
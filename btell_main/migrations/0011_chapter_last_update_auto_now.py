@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0010_storyreader_packed_vars'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chapter',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
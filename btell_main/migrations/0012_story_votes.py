@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-18 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('btell_main', '0011_chapter_last_update_auto_now'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryVoteShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('likes', models.IntegerField(default=0)),
+                ('dislikes', models.IntegerField(default=0)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='btell_main.story')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField()),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='btell_main.story')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='storyvoteshard',
+            constraint=models.UniqueConstraint(fields=('story', 'shard'), name='story_vote_shard_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='storyvote',
+            constraint=models.UniqueConstraint(fields=('user', 'story'), name='story_vote_unique'),
+        ),
+    ]
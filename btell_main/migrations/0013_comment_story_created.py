@@ -0,0 +1,30 @@
+# Comments get a direct reference to their story, replacing `Story.comments` (see 0014 and 0015).
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0012_story_votes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='story',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='btell_main.story'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Moves the comments from the `Story.comments` many-to-many table to `Comment.story`, in batches.
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def move_comments(apps, schema_editor):
+    del schema_editor
+    comment_model = apps.get_model('btell_main', 'Comment')
+    story_model = apps.get_model('btell_main', 'Story')
+    through = story_model.comments.through
+
+    last_id = 0
+    while True:
+        rows = list(through.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'story_id', 'comment_id')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        comments = comment_model.objects.in_bulk([comment_id for _, _, comment_id in rows])
+        updated = []
+        copies = []
+        for _, story_id, comment_id in rows:
+            comment = comments[comment_id]
+            if comment.story_id is None:
+                comment.story_id = story_id
+                updated.append(comment)
+            elif comment.story_id != story_id:
+                # The same comment was attached to several stories, so each story gets its own copy.
+                copies.append(comment_model(story_id=story_id, commenter_id=comment.commenter_id,
+                                            comment_text=comment.comment_text, created=comment.created))
+        comment_model.objects.bulk_update(updated, ['story'], batch_size=BATCH_SIZE)
+        comment_model.objects.bulk_create(copies, batch_size=BATCH_SIZE)
+
+    # Comments which were not attached to any story can't be shown anywhere.
+    comment_model.objects.filter(story__isnull=True).delete()
+
+    counts = comment_model.objects.values('story_id').annotate(count=models.Count('id'))
+    for row in counts.iterator():
+        story_model.objects.filter(pk=row['story_id']).update(comment_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0013_comment_story_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_comments, migrations.RunPython.noop),
+    ]
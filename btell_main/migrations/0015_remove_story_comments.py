@@ -0,0 +1,27 @@
+# Finishes moving comments to `Comment.story` (see 0013 and 0014).
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0014_move_story_comments'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='story',
+            name='comments',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='story',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='btell_main.story'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['story', 'created'], name='comment_story_created_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Normalizes tag names (merging tags which only differed in case or spacing), and counts the
+# published stories of each tag. The unique index follows in 0017.
+
+from django.db import migrations, models
+
+
+def normalize_tags(apps, schema_editor):
+    del schema_editor
+    tags_model = apps.get_model('btell_main', 'Tags')
+    through = apps.get_model('btell_main', 'Story').tags.through
+
+    keepers = {}
+    for tag in tags_model.objects.order_by('id'):
+        name = ' '.join(tag.tag_name.split()).lower()
+        keeper = keepers.get(name)
+        if keeper is None:
+            keepers[name] = tag
+            if tag.tag_name != name:
+                tag.tag_name = name
+                tag.save(update_fields=['tag_name'])
+            continue
+        # Move the stories of the duplicate over to the tag we keep.
+        tagged = set(through.objects.filter(tags_id=keeper.id).values_list('story_id', flat=True))
+        through.objects.bulk_create([
+            through(story_id=story_id, tags_id=keeper.id)
+            for story_id in through.objects.filter(tags_id=tag.id).values_list('story_id', flat=True)
+            if story_id not in tagged])
+        tag.delete()
+
+    for tag in tags_model.objects.all():
+        tag.story_count = through.objects.filter(tags_id=tag.id, story__published__isnull=False).count()
+        tag.save(update_fields=['story_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0015_remove_story_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tags',
+            name='story_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(normalize_tags, migrations.RunPython.noop),
+    ]
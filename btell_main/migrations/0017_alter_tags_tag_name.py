@@ -0,0 +1,18 @@
+# Tag names are unique once normalized (see 0016).
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0016_tags_story_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tags',
+            name='tag_name',
+            field=models.CharField(max_length=40, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0017_alter_tags_tag_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chapter',
+            name='chapter_image',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='cover_image_file',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
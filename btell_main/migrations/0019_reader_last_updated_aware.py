@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0018_image_hash_length'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storyreader',
+            name='last_updated',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Makes the site settings a singleton: the settings which were in effect (the first row) move to
+# id 1, and a check constraint keeps any other rows from being created.
+
+from django.db import migrations, models
+
+
+def collapse_site_settings(apps, schema_editor):
+    del schema_editor
+    site_settings_model = apps.get_model('btell_main', 'SiteSettings')
+    current = site_settings_model.objects.order_by('id').first()
+    if current is None or current.id == 1:
+        site_settings_model.objects.exclude(id=1).delete()
+        return
+    site_settings_model.objects.exclude(id=current.id).delete()
+    site_settings_model.objects.filter(id=current.id).update(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btell_main', '0019_reader_last_updated_aware'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='sitesettings',
+            options={'verbose_name_plural': 'site settings'},
+        ),
+        migrations.AlterField(
+            model_name='sitesettings',
+            name='default_theme',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(collapse_site_settings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sitesettings',
+            constraint=models.CheckConstraint(check=models.Q(('id', 1)), name='site_settings_singleton'),
+        ),
+    ]
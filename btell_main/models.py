@@ -1,4 +1,5 @@
 """Models for the BTell webpage."""
+from typing import Any, Dict, List
 import datetime
 
 from django.db import models
@@ -16,6 +17,32 @@ class Profile(models.Model):
     theme = models.CharField(verbose_name='website_theme',
                              max_length=100, default='DEFAULT')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_values = self._field_values()
+
+    def _field_values(self) -> Dict[str, Any]:
+        # Deferred fields are left out, since reading them would load them (and build another profile).
+        deferred = self.get_deferred_fields()
+        return {field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields if field.attname not in deferred}
+
+    def changed_fields(self) -> List[str]:
+        """Returns the names of the fields which changed since the profile was loaded or saved."""
+        return [name for name, value in self._field_values().items() if self._saved_values.get(name) != value]
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        # Reloaded fields, and deferred fields loaded on first access, are as in the database now.
+        loaded = self._field_values()
+        for field in self._meta.concrete_fields:
+            if field.attname in loaded and (fields is None or field.name in fields or field.attname in fields):
+                self._saved_values[field.attname] = loaded[field.attname]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_values = self._field_values()
+
     @dispatch.receiver(signals.post_save, sender=auth_models.User)
     def create_user_profile(sender: 'Profile', instance: auth_models.User, created: bool, **kwargs):  # pylint:disable=no-self-argument
         """Called when a new user is created, so we can attach a default profile."""
@@ -24,10 +51,20 @@ class Profile(models.Model):
             Profile.objects.create(user=instance)  # pylint:disable=no-member
 
     @dispatch.receiver(signals.post_save, sender=auth_models.User)
-    def save_user_profile(sender: 'Profile', instance: auth_models.User, **kwargs):  # pylint:disable=no-self-argument
-        """Called when a user object is saved, so we can make sure any changes to the profile are saved."""
+    def save_user_profile(sender: 'Profile', instance: auth_models.User, created: bool, **kwargs):  # pylint:disable=no-self-argument
+        """Called when a user object is saved, so we can make sure any changes to the profile are saved.
+
+        Only a profile which was already loaded through this user object can have changes, and only the
+        changed fields are written. Most user saves (e.g. `last_login` updates) don't touch the profile at all.
+        """
         del kwargs
-        instance.profile.save()  # type: ignore
+        if created:
+            return  # The profile was just created by `create_user_profile`.
+        profile = auth_models.User.profile.related.get_cached_value(instance, default=None)  # type: ignore pylint:disable=no-member
+        if profile is not None:
+            changed = profile.changed_fields()
+            if changed:
+                profile.save(update_fields=changed)
 
     @staticmethod
     def profile_from_user(user: auth_models.User) -> 'Profile':
@@ -48,10 +85,10 @@ class Profile(models.Model):
             pass
 
         # If we came here profile doesn't exist, or is the wrong type.
-        profile = Profile()
+        # The profile holds the relation, so saving it is enough.
+        profile = Profile(user=user)
         user.profile = profile  # type: ignore
         profile.save()
-        user.save()
         return profile
 
     def __str__(self):
@@ -59,20 +96,48 @@ class Profile(models.Model):
 
 
 class SiteSettings(models.Model):
-    """Site-specific configuration which applies to all users."""
+    """Site-specific configuration which applies to all users.
+
+    There is only ever one row, with `SINGLETON_ID`. Use `util.site_settings.get` to read it, which
+    caches it in memory.
+    """
+    SINGLETON_ID = 1
+
     # Theme, selected by setting a different CSS file for web templates.
-    default_theme = models.CharField(max_length=100)
+    default_theme = models.CharField(max_length=100, blank=True)
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        verbose_name_plural = 'site settings'
+        constraints = [
+            models.CheckConstraint(check=models.Q(id=1), name='site_settings_singleton'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.pk = self.SINGLETON_ID
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def load() -> 'SiteSettings':
+        """Loads the site settings from the database, or returns the defaults if they were never saved."""
+        site_settings = SiteSettings.objects.filter(pk=SiteSettings.SINGLETON_ID).first()  # pylint:disable=no-member
+        return site_settings or SiteSettings(pk=SiteSettings.SINGLETON_ID)
+
+
+def normalize_tag_name(tag_name: str) -> str:
+    """Returns the canonical form of a tag name: lowercase, with single spaces between words."""
+    return ' '.join(tag_name.split()).lower()
 
 
 class Tags(models.Model):
     """List of all known tags."""
-    tag_name = models.CharField(max_length=40)
+    # Always normalized (see `normalize_tag_name`), so the unique index also serves lookups and prefix searches.
+    tag_name = models.CharField(max_length=40, unique=True)
+    # Number of published stories with this tag, kept up to date by `util.tags`.
+    story_count = models.PositiveIntegerField(default=0)
 
-
-class Comment(models.Model):
-    """Stores all comments published to the webpage."""
-    commenter = models.ForeignKey(auth_models.User, on_delete=models.CASCADE)
-    comment_text = models.CharField(max_length=1000)
+    def save(self, *args, **kwargs):
+        self.tag_name = normalize_tag_name(self.tag_name)
+        super().save(*args, **kwargs)
 
 
 class Story(models.Model):
@@ -82,15 +147,25 @@ class Story(models.Model):
     published = models.DateTimeField(null=True)  # If null, story is not published.
     last_update = models.DateTimeField(
         null=False, default=timezone.now)
-    # Cover image file will be a sha256 hash (hex) from a specified uploads directory.
-    cover_image_file = models.CharField(max_length=32, null=True)
+    # Cover image file will be a sha256 hash (hex) from a specified uploads directory (see `util.image_store`).
+    cover_image_file = models.CharField(max_length=64, null=True)
     # A link to where the cover image is from, if applicable.
     cover_image_source = models.CharField(max_length=500, null=True)
     description = models.CharField(max_length=2000, null=False)
     tags = models.ManyToManyField(to=Tags)
-    comments = models.ManyToManyField(to=Comment)
+    # Number of comments on the story, kept up to date by `util.comments`.
+    comment_count = models.PositiveIntegerField(default=0)
     likes = models.PositiveIntegerField(default=0)
     dislikes = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)  # Set by the author once all branches are written.
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        indexes = [
+            # Story listings filter on published stories, and sort by last update by default.
+            models.Index(fields=['published', 'last_update'], name='story_published_update_idx'),
+            # Listings filtered by author (`author:someone`).
+            models.Index(fields=['author', 'published'], name='story_author_published_idx'),
+        ]
 
     def publish(self):
         """Publishes the story."""
@@ -102,6 +177,48 @@ class Story(models.Model):
         return self.published is not None
 
 
+class Comment(models.Model):
+    """Stores all comments published to the webpage."""
+    story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    commenter = models.ForeignKey(auth_models.User, on_delete=models.CASCADE)
+    comment_text = models.CharField(max_length=1000)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        indexes = [
+            # Comments of a story are listed newest first.
+            models.Index(fields=['story', 'created'], name='comment_story_created_idx'),
+        ]
+
+
+class StoryVote(models.Model):
+    """A like (+1) or dislike (-1) of a story, by a single user."""
+    user = models.ForeignKey(auth_models.User, on_delete=models.CASCADE)
+    story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    value = models.SmallIntegerField()
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'story'], name='story_vote_unique'),
+        ]
+
+
+class StoryVoteShard(models.Model):
+    """Pending changes of `Story.likes` and `Story.dislikes`, spread over several rows per story.
+
+    Only used when `BTELL_VOTE_COUNTER_SHARDS` is set, see `util.votes`.
+    """
+    story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    likes = models.IntegerField(default=0)
+    dislikes = models.IntegerField(default=0)
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        constraints = [
+            models.UniqueConstraint(fields=['story', 'shard'], name='story_vote_shard_unique'),
+        ]
+
+
 class Chapter(models.Model):
     """A single chapter in some story."""
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
@@ -109,8 +226,9 @@ class Chapter(models.Model):
     # Simplified story markdown
     content = models.TextField()
     published = models.DateTimeField(null=True)  # If null, chapter is not published
-    last_update = models.DateTimeField(null=False, default=datetime.datetime.utcnow)
-    chapter_image = models.CharField(max_length=32, null=True)
+    # Rendered content is cached by this timestamp (see `util.chapter_render`), so it changes with every edit.
+    last_update = models.DateTimeField(null=False, auto_now=True)
+    chapter_image = models.CharField(max_length=64, null=True)  # sha256 hash (hex), like `Story.cover_image_file`.
     chapter_image_source = models.CharField(max_length=500, null=True)
 
 
@@ -120,9 +238,11 @@ class ChapterLink(models.Model):
     from_chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE)
     to_chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='+')
     text = models.CharField(max_length=50, null=False)
-    # Expressed with story DSL.
+    # Expressed with story DSL (see `util.story_dsl`).
     condition = models.CharField(max_length=500, null=True)
     action = models.CharField(max_length=500, null=True)
+    # Compiled expressions are cached by this timestamp, so it has to change with every edit.
+    last_update = models.DateTimeField(auto_now=True)
 
 
 class StoryReader(models.Model):
@@ -135,7 +255,10 @@ class StoryReader(models.Model):
     user = models.ForeignKey(auth_models.User, on_delete=models.CASCADE)
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
     current_chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE)
-    last_updated = models.DateTimeField(null=False, default=datetime.datetime.utcnow)
+    last_updated = models.DateTimeField(null=False, default=timezone.now)
+    # Story variables packed into a blob, used instead of `StoryReaderVars` rows when
+    # `BTELL_READER_VARS_PACKED` is enabled (see `util.reader_state`).
+    packed_vars = models.BinaryField(null=True)
 
 
 class StoryReaderVars(models.Model):
@@ -143,3 +266,9 @@ class StoryReaderVars(models.Model):
     reader = models.ForeignKey(StoryReader, on_delete=models.CASCADE)
     variable_name = models.CharField(max_length=50, null=False)
     variable_value = models.SmallIntegerField(null=False, default=0)
+
+    class Meta:  # pylint:disable=missing-class-docstring,too-few-public-methods
+        constraints = [
+            # Needed so that reader state can be saved with a single upsert.
+            models.UniqueConstraint(fields=['reader', 'variable_name'], name='reader_variable_unique'),
+        ]
@@ -0,0 +1,55 @@
+from asgiref import sync
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+from django.utils import module_loading
+
+from btell import settings
+from btell_main import models
+from btell_main.views import reading, story_list
+
+
+class TestAsyncStack(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = auth_models.User.objects.create(username='alice')
+        self.reader = auth_models.User.objects.create(username='bob')
+        self.story = models.Story.objects.create(author=self.author, title='Dragons', description='')
+        self.story.publish()
+        self.first = models.Chapter.objects.create(story=self.story, title='Shop', content='Welcome.',
+                                                   published=self.story.published)
+        self.second = models.Chapter.objects.create(story=self.story, title='Cave', content='Dark.',
+                                                    published=self.story.published)
+        self.link = models.ChapterLink.objects.create(story=self.story, from_chapter=self.first,
+                                                      to_chapter=self.second, text='Enter the cave')
+
+    def test_views_are_async(self):
+        for view in (reading.read_chapter, reading.follow_link, story_list.story_list, story_list.story_list_json):
+            self.assertTrue(sync.iscoroutinefunction(view), view.__name__)
+
+    def test_middleware_is_async_capable(self):
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(module_loading.import_string(path), 'async_capable', False), path)
+
+    async def test_story_list(self):
+        response = await self.async_client.get(urls.reverse('story_list_json'))
+        self.assertEqual(['Dragons'], [story['title'] for story in response.json()['stories']])
+        response = await self.async_client.get(urls.reverse('story_list'))
+        self.assertContains(response, 'Dragons')
+
+    async def test_read_and_follow(self):
+        await sync.sync_to_async(self.async_client.force_login)(self.reader)
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.first.pk])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Enter the cave')
+        self.assertContains(response, 'Log out')
+        response = await self.async_client.post(urls.reverse('follow_link', args=[self.story.pk, self.link.pk]))
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(urls.reverse('read_chapter', args=[self.story.pk, self.second.pk]), response.url)
+        reader = await models.StoryReader.objects.aget(user=self.reader, story=self.story)
+        self.assertEqual(self.second.pk, reader.current_chapter_id)
+
+    async def test_missing_chapter(self):
+        response = await self.async_client.get(urls.reverse('read_chapter', args=[self.story.pk, 12345]))
+        self.assertEqual(404, response.status_code)
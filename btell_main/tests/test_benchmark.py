@@ -0,0 +1,45 @@
+import io
+import json
+
+from django import test
+from django.core import management
+from django.core.cache import cache
+
+from btell_main import models
+from btell_main.util import benchmark
+
+
+class TestBenchmark(test.TestCase):
+
+    def test_fixtures(self):
+        scale = benchmark.Scale(users=3, tags=4, stories=2, chapters=5, links=3, variables=6)
+        fixtures = benchmark.generate_fixtures(scale)
+        self.assertEqual(2, models.Story.objects.filter(pk__in=fixtures.story_ids, published__isnull=False).count())
+        self.assertEqual(10, models.Chapter.objects.count())
+        self.assertEqual(30, models.ChapterLink.objects.count())
+        self.assertEqual(3, len(fixtures.readers))
+        self.assertEqual(18, models.StoryReaderVars.objects.count())
+        # Every story gets (up to) five tags.
+        self.assertEqual(8, sum(tag.story_count for tag in models.Tags.objects.all()))
+        self.assertEqual([15, 15], [len(links) for links in fixtures.links])
+
+    def test_command(self):
+        cache.set('btell:unrelated', 'kept')
+        output = io.StringIO()
+        management.call_command('benchmark', users=2, tags=3, stories=2, chapters=4, links=2, variables=5,
+                                repeat=3, stdout=output)
+        results = json.loads(output.getvalue())
+        self.assertEqual(4, results['scale']['chapters'])
+        self.assertEqual({'prepare_stories_query', 'story_listing', 'chapter_render_cold', 'chapter_render_cached',
+                          'link_conditions_cold', 'link_conditions', 'reader_state_save'}, set(results['results']))
+        for timing in results['results'].values():
+            self.assertEqual(3, timing['runs'])
+            self.assertLessEqual(timing['min_ms'], timing['median_ms'])
+        # The generated data is removed again.
+        self.assertFalse(models.Story.objects.exists())
+        # The benchmarks ran on a cache of their own.
+        self.assertEqual('kept', cache.get('btell:unrelated'))
+
+    def test_invalid_scale(self):
+        with self.assertRaises(management.CommandError):
+            management.call_command('benchmark', stories=0)
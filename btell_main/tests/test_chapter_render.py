@@ -0,0 +1,161 @@
+from unittest import mock
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+
+from btell_main import models
+from btell_main.util import chapter_render, reader_state, story_dsl
+
+
+class TestCompileContent(test.SimpleTestCase):
+
+    def _render(self, content, **variables):
+        return chapter_render.fill_segments(chapter_render.compile_content(content), variables)
+
+    def test_paragraphs_and_headings(self):
+        self.assertEqual('<h2>Start</h2><p>First line<br />second line</p><p>Next</p>',
+                         self._render('# Start\n\nFirst line\nsecond line\n\n\nNext'))
+
+    def test_inline_markup(self):
+        self.assertEqual('<p><strong>bold</strong> and <em>italic</em></p>', self._render('**bold** and *italic*'))
+
+    def test_html_is_escaped(self):
+        self.assertEqual('<p>&lt;script&gt;</p>', self._render('<script>'))
+
+    def test_static_content_is_one_segment(self):
+        self.assertEqual(['<p>Just text.</p>'], chapter_render.compile_content('Just text.'))
+
+    def test_selective_text(self):
+        content = 'You are [[gold > 10 || lucky|*rich*|poor]].'
+        self.assertEqual('<p>You are <em>rich</em>.</p>', self._render(content, gold=20))
+        self.assertEqual('<p>You are <em>rich</em>.</p>', self._render(content, lucky=1))
+        self.assertEqual('<p>You are poor.</p>', self._render(content))
+
+    def test_selective_text_without_alternative(self):
+        self.assertEqual('<p>A sword.</p>', self._render('A[[has_sword| sword]].', has_sword=1))
+        self.assertEqual('<p>A.</p>', self._render('A[[has_sword| sword]].'))
+
+    def test_brackets_without_condition(self):
+        self.assertEqual('<p>[[not a slot]]</p>', self._render('[[not a slot]]'))
+
+    def test_deeply_nested_condition(self):
+        content = 'A[[' + '(' * 200 + 'gold' + ')' * 200 + '| sword| stick]].'
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual('<p>A stick.</p>', self._render(content, gold=1))
+
+
+class TestReadChapter(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        story_dsl.clear_cache()
+        self.author = auth_models.User.objects.create(username='alice')
+        self.reader = auth_models.User.objects.create(username='bob')
+        self.story = models.Story.objects.create(author=self.author, title='Dragons', description='')
+        self.story.publish()
+        self.first = models.Chapter.objects.create(
+            story=self.story, title='Shop', content='You have [[has_sword|a sword|no sword]].',
+            published=self.story.published)
+        self.second = models.Chapter.objects.create(story=self.story, title='Cave', content='Dark.',
+                                                    published=self.story.published)
+        self.buy = models.ChapterLink.objects.create(
+            story=self.story, from_chapter=self.first, to_chapter=self.first, text='Buy a sword',
+            condition='not has_sword', action='has_sword = 1')
+        models.ChapterLink.objects.create(story=self.story, from_chapter=self.first, to_chapter=self.second,
+                                          text='Enter the cave')
+
+    def test_compiled_once_per_version(self):
+        with mock.patch.object(chapter_render, 'compile_content', wraps=chapter_render.compile_content) as compile_content:
+            chapter_render.compiled_chapter(self.first)
+            chapter_render.compiled_chapter(self.first)
+        self.assertEqual(1, compile_content.call_count)
+        self.first.content = 'Changed.'
+        self.first.save()
+        self.assertEqual(['<p>Changed.</p>'], chapter_render.compiled_chapter(self.first))
+
+    def test_read_and_follow(self):
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.first.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'no sword')
+        self.assertContains(response, 'Buy a sword')
+
+        self.client.force_login(self.reader)
+        response = self.client.post(urls.reverse('follow_link', args=[self.story.pk, self.buy.pk]))
+        self.assertRedirects(response, url)
+        response = self.client.get(url)
+        self.assertContains(response, 'a sword')
+        self.assertNotContains(response, 'Buy a sword')
+        # The condition no longer holds, so the link can't be followed again.
+        response = self.client.post(urls.reverse('follow_link', args=[self.story.pk, self.buy.pk]))
+        self.assertEqual(403, response.status_code)
+
+    def test_follow_only_from_current_chapter(self):
+        pay = models.ChapterLink.objects.create(story=self.story, from_chapter=self.first, to_chapter=self.second,
+                                                text='Get paid', action='gold += 10')
+        onwards = models.ChapterLink.objects.create(story=self.story, from_chapter=self.second, to_chapter=self.first,
+                                                    text='Back to the shop')
+        self.client.force_login(self.reader)
+        # A new reader can't start in the middle of the story.
+        response = self.client.post(urls.reverse('follow_link', args=[self.story.pk, onwards.pk]))
+        self.assertEqual(409, response.status_code)
+        self.assertFalse(models.StoryReader.objects.exists())
+
+        second_url = urls.reverse('read_chapter', args=[self.story.pk, self.second.pk])
+        for _ in range(2):
+            # Submitted twice: the second time the reader is no longer on the chapter of the link.
+            response = self.client.post(urls.reverse('follow_link', args=[self.story.pk, pay.pk]))
+            self.assertRedirects(response, second_url)
+        reader = models.StoryReader.objects.get(user=self.reader)
+        self.assertEqual({'gold': 10}, reader_state.ReaderState.load(reader).variables)
+        self.assertEqual(self.second.pk, reader.current_chapter_id)
+
+    def test_unpublished_chapter(self):
+        self.second.published = None
+        self.second.save()
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.second.pk])
+        self.assertEqual(404, self.client.get(url).status_code)
+        self.client.force_login(self.author)
+        self.assertEqual(200, self.client.get(url).status_code)
+
+    def test_conditional_get_anonymous(self):
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.first.pk])
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertNotIn('csrftoken', response.cookies)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+        # Not everything on the page has a modification time, so only the ETag can be revalidated.
+        self.assertNotIn('Last-Modified', response)
+
+        etag = response['ETag']
+        self.first.content = 'Changed.'
+        self.first.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, 'Changed.')
+
+        etag = response['ETag']
+        models.Story.objects.filter(pk=self.story.pk).update(title='Wyverns')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, 'Wyverns')
+
+    def test_conditional_get_reader(self):
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.first.pk])
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        # Different story variables make it a different page.
+        self.client.post(urls.reverse('follow_link', args=[self.story.pk, self.buy.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        # A different reader gets a different page, too.
+        self.client.force_login(self.author)
+        self.assertEqual(200, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
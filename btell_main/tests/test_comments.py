@@ -0,0 +1,55 @@
+from django import test, urls
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import comments
+
+
+class TestComments(test.TestCase):
+
+    def setUp(self):
+        self.user = auth_models.User.objects.create(username='alice')
+        self.story = models.Story.objects.create(author=self.user, title='Dragons', description='')
+        self.story.publish()
+
+    def test_count_follows_comments(self):
+        first = comments.add_comment(self.user, self.story.pk, 'First!')
+        comments.add_comment(self.user, self.story.pk, 'Second.')
+        self.story.refresh_from_db()
+        self.assertEqual(2, self.story.comment_count)
+        comments.delete_comment(first)
+        comments.delete_comment(first)
+        self.story.refresh_from_db()
+        self.assertEqual(1, self.story.comment_count)
+
+    def test_count_follows_other_deletes(self):
+        bob = auth_models.User.objects.create(username='bob')
+        for i in range(2):
+            comments.add_comment(self.user, self.story.pk, f'Comment {i}')
+            comments.add_comment(bob, self.story.pk, f'Reply {i}')
+        # Deleting the commenter deletes their comments too.
+        bob.delete()
+        self.story.refresh_from_db()
+        self.assertEqual(2, self.story.comment_count)
+        models.Comment.objects.filter(story=self.story).delete()
+        self.story.refresh_from_db()
+        self.assertEqual(0, self.story.comment_count)
+
+    def test_pages_newest_first(self):
+        added = [comments.add_comment(self.user, self.story.pk, f'Comment {i}') for i in range(5)]
+        with self.assertNumQueries(1):
+            first = comments.comment_page(self.story.pk, 3)
+            self.assertEqual(['alice'] * 3, [comment.commenter.username for comment in first.items])
+        second = comments.comment_page(self.story.pk, 3, first.next_cursor)
+        self.assertEqual(added[::-1], first.items + second.items)
+        self.assertIsNone(second.next_cursor)
+
+    def test_view(self):
+        url = urls.reverse('story_comments', args=[self.story.pk])
+        self.assertEqual(403, self.client.post(url, {'text': 'Hi'}).status_code)
+        self.client.force_login(self.user)
+        self.assertEqual(201, self.client.post(url, {'text': 'Hi'}).status_code)
+        self.assertEqual(400, self.client.post(url, {'text': ' '}).status_code)
+        data = self.client.get(url).json()
+        self.assertEqual(1, data['comment_count'])
+        self.assertEqual(['Hi'], [comment['text'] for comment in data['comments']])
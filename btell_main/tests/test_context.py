@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django import http, test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+
+from btell_main import models
+from btell_main.util import listing_cache, paging
+from btell_main.views import context
+
+
+class TestUserInfo(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = auth_models.User.objects.create(username='someone', first_name='Some', last_name='One')
+
+    def _request(self, user):
+        request = http.HttpRequest()
+        request.user = user
+        return request
+
+    def test_anonymous(self):
+        ctx = {'btell_user': 'stale'}
+        context.context_add_user_info(self._request(auth_models.AnonymousUser()), ctx)
+        self.assertNotIn('btell_user', ctx)
+
+    def test_user_info(self):
+        info = context.user_info(self._request(self.user))
+        self.assertEqual('Some One', info['full_name'])
+        self.assertEqual('DEFAULT', info['profile']['theme'])
+
+    def test_resolved_once(self):
+        with self.assertNumQueries(1):
+            context.user_info(self._request(self.user))
+        with self.assertNumQueries(0):
+            request = self._request(self.user)
+            context.user_info(request)
+            ctx = {}
+            context.context_add_user_info(request, ctx)
+            self.assertEqual('someone', ctx['btell_user']['username'])
+
+    def test_profile_save_invalidates(self):
+        context.user_info(self._request(self.user))
+        profile = self.user.profile
+        profile.theme = 'dark'
+        profile.save()
+        self.assertEqual('dark', context.user_info(self._request(self.user))['profile']['theme'])
+
+    def test_theme(self):
+        models.SiteSettings.objects.create(default_theme='light')
+        self.assertEqual('light', context.theme(self._request(auth_models.AnonymousUser())))
+        self.assertEqual('light', context.theme(self._request(self.user)))
+        profile = self.user.profile
+        profile.theme = 'dark'
+        profile.save()
+        self.assertEqual('dark', context.theme(self._request(self.user)))
+
+
+class TestFragmentCache(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        author = auth_models.User.objects.create(username='alice')
+        self.story = models.Story.objects.create(author=author, title='Dragons', description='')
+        self.story.publish()
+
+    def test_story_cards(self):
+        self.assertContains(self.client.get(urls.reverse('story_list')), 'Dragons')
+        self.story.title = 'Wyverns'
+        self.story.save()
+        response = self.client.get(urls.reverse('story_list'))
+        self.assertContains(response, 'Wyverns')
+        self.assertNotContains(response, 'Dragons')
+
+    def test_story_cards_are_cached(self):
+        self.client.get(urls.reverse('story_list'))
+        # Within the same generation, the card isn't rendered again, even from a different story object.
+        models.Story.objects.filter(pk=self.story.pk).update(title='Wyverns')
+        renamed = models.Story.objects.select_related('author').get(pk=self.story.pk)
+        with mock.patch.object(listing_cache, 'story_page', return_value=paging.Page(items=[renamed])):
+            self.assertContains(self.client.get(urls.reverse('story_list')), 'Dragons')
+
+    def test_keyed_by_theme_and_login(self):
+        user = auth_models.User.objects.create(username='bob')
+        profile = user.profile
+        profile.theme = 'dark'
+        profile.save()
+        response = self.client.get(urls.reverse('story_list'))
+        self.assertContains(response, 'data-bs-theme="light"')
+        self.assertContains(response, 'Sign-up')
+        self.client.force_login(user)
+        response = self.client.get(urls.reverse('story_list'))
+        self.assertContains(response, 'data-bs-theme="dark"')
+        self.assertContains(response, 'Log out')
+        self.assertNotContains(response, 'Sign-up')
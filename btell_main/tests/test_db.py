@@ -0,0 +1,48 @@
+import os
+import tempfile
+from unittest import mock
+
+from django import test
+from django.db import connections
+from django.db.backends.sqlite3 import base as sqlite_base
+
+from btell import settings
+from btell_main.util import db
+
+
+class TestSqlitePragmas(test.SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint:disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _connect(self):
+        wrapper = sqlite_base.DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(self.tmp_dir.name, 'test.sqlite3'),
+        }, alias='pragma_test')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_are_tuned(self):
+        wrapper = self._connect()
+        self.assertEqual('wal', self._pragma(wrapper, 'journal_mode'))
+        self.assertEqual(1, self._pragma(wrapper, 'synchronous'))  # NORMAL
+        self.assertEqual(settings.BTELL_SQLITE_PRAGMAS['busy_timeout'], self._pragma(wrapper, 'busy_timeout'))
+
+    def test_pragmas_come_from_settings(self):
+        with mock.patch.object(settings, 'BTELL_SQLITE_PRAGMAS', {'synchronous': 'FULL'}):
+            wrapper = self._connect()
+            self.assertEqual(2, self._pragma(wrapper, 'synchronous'))  # FULL
+            self.assertEqual('delete', self._pragma(wrapper, 'journal_mode'))
+
+    def test_in_memory_databases_skip_journal_mode(self):
+        self.assertIn('PRAGMA journal_mode = WAL', db.sqlite_pragmas())
+        self.assertNotIn('PRAGMA journal_mode = WAL', db.sqlite_pragmas(in_memory=True))
+        self.assertIn('PRAGMA synchronous = NORMAL', db.sqlite_pragmas(in_memory=True))
@@ -0,0 +1,110 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from PIL import Image
+
+from btell import settings
+from btell_main import models
+from btell_main.util import image_store
+
+
+def _png(width=800, height=1200, color='red'):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    output.seek(0)
+    return output
+
+
+class TestImageStore(test.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint:disable=consider-using-with
+        patcher = mock.patch.object(settings, 'BTELL_UPLOADS_DIR', self.tmp_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        # Background variant generation has to finish before the directory is removed.
+        self.futures = []
+        patcher = mock.patch.object(image_store, 'generate_variants_async',
+                                    side_effect=self._track(image_store.generate_variants_async))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._wait_for_variants)
+        # The same images are stored in every test, under the same names.
+        image_store._original_content_type.cache_clear()  # pylint:disable=protected-access
+
+    def _track(self, generate):
+        def wrapper(digest):
+            future = generate(digest)
+            self.futures.append(future)
+            return future
+        return wrapper
+
+    def _wait_for_variants(self):
+        for future in self.futures:
+            future.result()
+
+    def test_store_is_content_addressed(self):
+        digest = image_store.store_image(_png())
+        self.assertEqual(digest, image_store.store_image(_png()))
+        self.assertNotEqual(digest, image_store.store_image(_png(color='blue')))
+        path = image_store.image_path(digest)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.path.join(self.tmp_dir.name, digest[:2], digest[2:4], digest), path)
+        # No temporary files are left behind.
+        self.assertFalse([name for name in os.listdir(self.tmp_dir.name) if name.startswith('.upload-')])
+
+    def test_variants(self):
+        digest = image_store.store_image(_png())
+        image_store.generate_variants_async(digest).result()
+        with Image.open(image_store.image_path(digest, 'thumb')) as thumb:
+            self.assertEqual('WEBP', thumb.format)
+            self.assertEqual((160, 240), thumb.size)
+
+    def test_rejects_non_images(self):
+        with self.assertRaises(image_store.InvalidImage):
+            image_store.store_image(io.BytesIO(b'not an image'))
+        self.assertEqual([], os.listdir(self.tmp_dir.name))
+
+    def test_rejects_huge_images(self):
+        with mock.patch.object(settings, 'BTELL_IMAGE_MAX_PIXELS', 800 * 1200 - 1), \
+                self.assertRaises(image_store.InvalidImage):
+            image_store.store_image(_png())
+        self.assertFalse([name for name in os.listdir(self.tmp_dir.name) if name.startswith('.upload-')])
+
+    def test_bad_names(self):
+        for digest, variant in [('../etc/passwd', image_store.ORIGINAL), ('a' * 64, 'huge')]:
+            with self.subTest(digest=digest, variant=variant), self.assertRaises(ValueError):
+                image_store.image_path(digest, variant)
+
+    def test_serving(self):
+        digest = image_store.store_image(_png())
+        url = urls.reverse('image_variant', args=[digest, 'card'])
+        self._wait_for_variants()
+        with mock.patch.object(Image, 'open', wraps=Image.open) as image_open:
+            response = self.client.get(url)
+            self.assertEqual('image/webp', response['Content-Type'])
+            response.close()
+            original = self.client.get(urls.reverse('image', args=[digest]))
+            self.assertEqual('image/png', original['Content-Type'])
+            original.close()
+            self.client.get(urls.reverse('image', args=[digest])).close()
+        # Only the format of the original is read, and only once.
+        self.assertEqual(1, image_open.call_count)
+        self.assertIn('immutable', response['Cache-Control'])
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+        self.assertEqual(404, self.client.get(urls.reverse('image', args=['0' * 64])).status_code)
+
+    def test_upload_cover(self):
+        author = auth_models.User.objects.create(username='alice')
+        story = models.Story.objects.create(author=author, title='Dragons', description='')
+        url = urls.reverse('upload_cover', args=[story.pk])
+        self.client.force_login(author)
+        response = self.client.post(url, {'image': _png()})
+        story.refresh_from_db()
+        self.assertEqual(response.json()['digest'], story.cover_image_file)
@@ -0,0 +1,77 @@
+import json
+from unittest import mock
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+
+from btell import settings
+from btell_main import models
+from btell_main.util import instrumentation
+
+
+class TestPerformanceMiddleware(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tags = [models.Tags.objects.create(tag_name=f'tag {i}') for i in range(3)]
+        for i in range(15):
+            author = auth_models.User.objects.create(username=f'author{i}')
+            story = models.Story.objects.create(author=author, title=f'Story {i}', description='')
+            story.tags.add(*self.tags)
+            story.publish()
+        self.story = story
+        self.chapter = models.Chapter.objects.create(story=story, title='One', content='Hello.',
+                                                     published=story.published)
+
+    def _records(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records if record.levelname == 'INFO']
+
+    def test_requests_are_logged(self):
+        with self.assertLogs('btell_main.performance', level='INFO') as logs:
+            self.client.get(urls.reverse('story_list'))
+            self.client.get(urls.reverse('story_list'))
+        first, second = self._records(logs)
+        self.assertEqual('story_list', first['url_name'])
+        self.assertEqual(200, first['status'])
+        self.assertGreater(first['queries'], 0)
+        self.assertGreater(first['template_ms'], 0)
+        # The second page comes from the listing cache.
+        self.assertEqual(0, second['queries'])
+        self.assertEqual(1.0, second['cache_hit_rate'])
+
+    def test_async_views_are_measured(self):
+        url = urls.reverse('read_chapter', args=[self.story.pk, self.chapter.pk])
+        with self.assertLogs('btell_main.performance', level='INFO') as logs:
+            self.client.get(url)
+        record, = self._records(logs)
+        self.assertEqual('read_chapter', record['url_name'])
+        self.assertGreater(record['queries'], 0)
+
+    def test_server_timing(self):
+        with mock.patch.object(settings, 'BTELL_SERVER_TIMING', True):
+            response = self.client.get(urls.reverse('story_list_json'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", ')
+        with mock.patch.object(settings, 'BTELL_SERVER_TIMING', False):
+            response = self.client.get(urls.reverse('story_list_json'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_listing_stays_within_budget(self):
+        # The query count must not grow with the number of stories, authors or tags shown.
+        self.assertTrue(settings.BTELL_QUERY_BUDGETS_STRICT)
+        for name in ('story_list', 'story_list_json'):
+            cache.clear()
+            self.assertEqual(200, self.client.get(urls.reverse(name), {'filter': 'tag:"tag 1" dragons'}).status_code)
+
+    def test_over_budget(self):
+        url = urls.reverse('tag_autocomplete')
+        with mock.patch.dict(settings.BTELL_QUERY_BUDGETS, {'tag_autocomplete': 0}):
+            with self.assertRaisesMessage(instrumentation.QueryBudgetExceeded, "View 'tag_autocomplete' made 1 queries"):
+                self.client.get(url, {'prefix': 'ta'})
+            with mock.patch.object(settings, 'BTELL_QUERY_BUDGETS_STRICT', False):
+                with self.assertLogs('btell_main.performance', level='WARNING'):
+                    self.assertEqual(200, self.client.get(url, {'prefix': 'ta'}).status_code)
+
+    def test_no_stats_outside_requests(self):
+        self.assertIsNone(instrumentation.current_stats())
+        self.assertEqual(15, models.Story.objects.count())
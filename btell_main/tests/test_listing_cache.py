@@ -0,0 +1,64 @@
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+
+from btell_main import models
+from btell_main.util import filter_query, listing_cache
+
+
+class TestListingCache(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = auth_models.User.objects.create(username='alice')
+        self.fantasy = models.Tags.objects.create(tag_name='fantasy')
+        self.stories = []
+        for i in range(3):
+            story = models.Story.objects.create(author=self.author, title=f'Story {i}', description='')
+            story.tags.add(self.fantasy)
+            story.publish()
+            self.stories.append(story)
+
+    def _page(self, filter_str, cursor=None):
+        return listing_cache.story_page(filter_query.prepare_stories_query(filter_str), 2, cursor)
+
+    def test_cached_page_needs_no_queries(self):
+        first = self._page('tag:fantasy')
+        with self.assertNumQueries(0):
+            cached = self._page('tag:fantasy')
+            self.assertEqual(['alice', 'alice'], [story.author.username for story in cached.items])
+        self.assertEqual(first.items, cached.items)
+        self.assertEqual(first.next_cursor, cached.next_cursor)
+
+    def test_equivalent_filters_share_entries(self):
+        self._page('tag:fantasy author:alice')
+        with self.assertNumQueries(0):
+            self._page('author:alice tag:Fantasy')
+
+    def test_missing_stories_are_hydrated_in_bulk(self):
+        self._page('')
+        cache.delete(listing_cache.STORY_KEY.format(generation=listing_cache.current_generation(),
+                                                    story_id=self.stories[2].pk))
+        with self.assertNumQueries(1):
+            self.assertEqual([self.stories[2], self.stories[1]], self._page('').items)
+
+    def test_story_changes_invalidate(self):
+        self._page('')
+        self.stories[2].title = 'Renamed'
+        self.stories[2].save()
+        self.stories[1].delete()
+        page = self._page('')
+        self.assertEqual([self.stories[2], self.stories[0]], page.items)
+        self.assertEqual('Renamed', page.items[0].title)
+
+    def test_tag_changes_invalidate(self):
+        self.assertEqual(2, len(self._page('tag:fantasy').items))
+        self.stories[1].tags.remove(self.fantasy)
+        self.stories[2].tags.remove(self.fantasy)
+        self.assertEqual([self.stories[0]], self._page('tag:fantasy').items)
+
+    def test_view_uses_cache(self):
+        url = urls.reverse('story_list_json')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(3, len(self.client.get(url).json()['stories']))
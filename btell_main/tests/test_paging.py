@@ -0,0 +1,71 @@
+import datetime
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import paging, story_query
+
+
+class TestKeysetPage(test.TestCase):
+
+    def setUp(self):
+        author = auth_models.User.objects.create(username='alice')
+        base = datetime.datetime(2023, 5, 1, tzinfo=datetime.timezone.utc)
+        # Pairs of stories share their update times, so the id has to break the ties.
+        for i in range(7):
+            models.Story.objects.create(author=author, title=f'Story {i}', description='',
+                                        published=base, last_update=base + datetime.timedelta(days=i // 2))
+        self.ordering = story_query.SORT_ORDERS['-last_update']
+        self.expected = list(models.Story.objects.order_by(*self.ordering))
+
+    def test_pages_cover_everything_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = paging.keyset_page(models.Story.objects.all(), self.ordering, 2, cursor)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(self.expected, seen)
+
+    def test_last_page_has_no_cursor(self):
+        page = paging.keyset_page(models.Story.objects.all(), self.ordering, 7)
+        self.assertEqual(self.expected, page.items)
+        self.assertIsNone(page.next_cursor)
+
+    def test_page_is_single_query(self):
+        first = paging.keyset_page(models.Story.objects.all(), self.ordering, 2)
+        with self.assertNumQueries(1):
+            paging.keyset_page(models.Story.objects.all(), self.ordering, 2, first.next_cursor)
+
+    def test_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            paging.keyset_page(models.Story.objects.all(), self.ordering, 2, 'not a cursor')
+        with self.assertRaises(ValueError):
+            paging.keyset_page(models.Story.objects.all(), self.ordering, 2, paging.encode_cursor([1]))
+
+
+class TestStoryListJson(test.TestCase):
+
+    def setUp(self):
+        author = auth_models.User.objects.create(username='alice')
+        models.Story.objects.create(author=author, title='Dragons', description='Big lizards.').publish()
+
+    def test_returns_stories(self):
+        response = self.client.get(urls.reverse('story_list_json'), {'filter': 'author:alice'})
+        data = response.json()
+        self.assertEqual(['Dragons'], [story['title'] for story in data['stories']])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_bad_cursor(self):
+        response = self.client.get(urls.reverse('story_list_json'), {'cursor': '!!'})
+        self.assertEqual(400, response.status_code)
+
+    def test_cursor_with_wrong_types(self):
+        for values in [[[1], 2], [{'a': 1}, 2], [True, 'x'], [float('inf'), 1], ['2023-01-01T00:00:00', 'x']]:
+            cursor = paging.encode_cursor(values)
+            with self.subTest(values=values):
+                response = self.client.get(urls.reverse('story_list_json'), {'cursor': cursor})
+                self.assertEqual(400, response.status_code)
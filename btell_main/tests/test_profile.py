@@ -20,4 +20,45 @@ class TestProfileRetrieve(test.TestCase):
         profile.delete()
 
         profile = models.Profile.profile_from_user(user)
-        self.assertIsNotNone(profile)
\ No newline at end of file
+        self.assertIsNotNone(profile)
+
+
+class TestProfileWrites(test.TestCase):
+
+    def setUp(self):
+        auth_models.User.objects.create(username='some_user')
+
+    def test_create_user_inserts_profile_once(self):
+        # One INSERT for the user, and one for the profile.
+        with self.assertNumQueries(2):
+            auth_models.User.objects.create(username='new_user')
+
+    def test_user_save_skips_unchanged_profile(self):
+        user = auth_models.User.objects.get(username='some_user')
+        self.assertIsNotNone(user.profile)  # type: ignore
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+
+    def test_user_save_without_loaded_profile(self):
+        user = auth_models.User.objects.get(username='some_user')
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_user_save_writes_changed_profile(self):
+        user = auth_models.User.objects.get(username='some_user')
+        user.profile.theme = 'dark'  # type: ignore
+        self.assertEqual(['theme'], user.profile.changed_fields())  # type: ignore
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual('dark', models.Profile.objects.get(user=user).theme)
+        self.assertEqual([], user.profile.changed_fields())  # type: ignore
+
+    def test_deferred_fields(self):
+        user = auth_models.User.objects.get(username='some_user')
+        profile = models.Profile.objects.only('id').get(user=user)
+        self.assertEqual('DEFAULT', profile.theme)
+        self.assertEqual([], profile.changed_fields())
+        profile.theme = 'dark'
+        self.assertEqual(['theme'], profile.changed_fields())
+        profile.refresh_from_db()
+        self.assertEqual([], profile.changed_fields())
@@ -0,0 +1,144 @@
+import datetime
+import threading
+from unittest import mock
+
+from django import test
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+from django.utils import timezone
+
+from btell import settings
+from btell_main import models
+from btell_main.util import progress_buffer, reader_state, story_dsl
+
+
+class TestProgressBuffer(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        story_dsl.clear_cache()
+        for name, value in [('BTELL_PROGRESS_WRITE_BEHIND', True), ('BTELL_PROGRESS_FLUSH_SECONDS', 0)]:
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(progress_buffer.flush)
+        author = auth_models.User.objects.create(username='alice')
+        story = models.Story.objects.create(author=author, title='Dragons', description='')
+        self.first = models.Chapter.objects.create(story=story, title='One', content='')
+        self.second = models.Chapter.objects.create(story=story, title='Two', content='')
+        self.third = models.Chapter.objects.create(story=story, title='Three', content='')
+        self.walk = models.ChapterLink.objects.create(story=story, from_chapter=self.first,
+                                                      to_chapter=self.second, text='Walk on')
+        self.onwards = models.ChapterLink.objects.create(story=story, from_chapter=self.second,
+                                                         to_chapter=self.third, text='Onwards')
+        self.buy = models.ChapterLink.objects.create(story=story, from_chapter=self.first, to_chapter=self.second,
+                                                     text='Buy a sword', action='has_sword = 1')
+        self.reader = models.StoryReader.objects.create(user=author, story=story, current_chapter=self.first)
+
+    def _load(self):
+        return reader_state.ReaderState.load(models.StoryReader.objects.get(pk=self.reader.pk))
+
+    def _stored_chapter(self):
+        return models.StoryReader.objects.get(pk=self.reader.pk).current_chapter_id
+
+    def test_moves_are_buffered(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        with self.assertNumQueries(0):
+            state.flush()
+        self.assertFalse(state.is_dirty())
+        self.assertEqual(self.first.pk, self._stored_chapter())
+        # Readers see their own progress before it is written.
+        self.assertEqual(self.second.pk, self._load().reader.current_chapter_id)
+
+        progress_buffer.flush()
+        self.assertEqual(0, progress_buffer.pending_count())
+        self.assertEqual(self.second.pk, self._stored_chapter())
+
+    def test_flushes_wait_for_each_other(self):
+        written = []
+        writing, release = threading.Event(), threading.Event()
+
+        def write_batch(batch):
+            if not writing.is_set():  # Only the first batch is slow.
+                writing.set()
+                release.wait(timeout=5)
+            written.append({reader_id: progress.chapter_id for reader_id, progress in batch.items()})
+
+        self.reader.current_chapter = self.second
+        progress_buffer.record(self.reader)
+        with mock.patch.object(progress_buffer, '_write_batch', side_effect=write_batch):
+            in_flight = threading.Thread(target=progress_buffer.flush)
+            in_flight.start()
+            self.assertTrue(writing.wait(timeout=5))
+            self.reader.current_chapter = self.third
+            progress_buffer.record(self.reader)
+            # E.g. the flush at exit, while the background thread is still writing its batch.
+            final = threading.Thread(target=progress_buffer.flush)
+            final.start()
+            final.join(timeout=0.1)
+            self.assertTrue(final.is_alive())
+            release.set()
+            in_flight.join()
+            final.join()
+        self.assertEqual([{self.reader.pk: self.second.pk}, {self.reader.pk: self.third.pk}], written)
+
+    def test_moves_are_coalesced(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        state.flush()
+        state.follow_link(self.onwards)
+        state.flush()
+        self.assertEqual(1, progress_buffer.pending_count())
+        with self.assertNumQueries(1):  # A single conditional update.
+            progress_buffer.flush()
+        self.assertEqual(self.third.pk, self._stored_chapter())
+
+    def test_read_back_from_another_process(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        state.flush()
+        # Another process only has the shared cache.
+        with mock.patch.dict(progress_buffer._pending, clear=True):  # pylint:disable=protected-access
+            self.assertEqual(self.second.pk, self._load().reader.current_chapter_id)
+
+    def test_newest_progress_wins(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        state.flush()
+        # Another process buffered a later move of the reader in the shared cache.
+        later = progress_buffer.Progress(chapter_id=self.third.pk,
+                                         last_updated=timezone.now() + datetime.timedelta(seconds=1))
+        cache.set(progress_buffer.CACHE_KEY.format(reader_id=self.reader.pk), later)
+        self.assertEqual(self.third.pk, self._load().reader.current_chapter_id)
+
+    def test_variable_changes_are_written_directly(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        state.flush()
+        state = self._load()
+        state.reader.current_chapter = self.first
+        state.follow_link(self.buy)
+        state.flush()
+        self.assertEqual(0, progress_buffer.pending_count())
+        self.assertEqual(self.second.pk, self._stored_chapter())
+        self.assertEqual({'has_sword': 1}, self._load().variables)
+
+    def test_newer_direct_writes_win(self):
+        state = self._load()
+        state.follow_link(self.walk)
+        state.flush()
+        # Written by another process, after the progress was buffered here.
+        models.StoryReader.objects.filter(pk=self.reader.pk).update(
+            current_chapter=self.third, last_updated=timezone.now() + datetime.timedelta(seconds=1))
+        progress_buffer.flush()
+        self.assertEqual(self.third.pk, self._stored_chapter())
+        self.assertEqual(self.third.pk, self._load().reader.current_chapter_id)
+
+    def test_disabled(self):
+        with mock.patch.object(settings, 'BTELL_PROGRESS_WRITE_BEHIND', False):
+            state = self._load()
+            state.follow_link(self.walk)
+            state.flush()
+        self.assertEqual(0, progress_buffer.pending_count())
+        self.assertEqual(self.second.pk, self._stored_chapter())
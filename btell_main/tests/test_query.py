@@ -1,4 +1,5 @@
 from typing import List
+import dataclasses
 
 from django import test
 
@@ -130,6 +131,15 @@ class TestFilterQueryTokenizer(test.TestCase):
         ]
         self.assertEqual(expected, result)
 
+    def test_unterminated_quote(self):
+        with self.assertRaises(SyntaxError):
+            filter_query.tokenize_query('author:"Some Fancypants')
+
+    def test_tokens_are_immutable(self):
+        token = filter_query.FilterToken.literal('word')
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            token.contents = 'other'  # type: ignore
+
 # TODO: More tests for incorrect syntax
 
 
@@ -180,4 +190,15 @@ class TestFilterQuery(test.TestCase):
             freeform=['extra', 'text', 'more text'])
         self.assertEqual(expected, q)
 
+    def test_unterminated_quote(self):
+        q = filter_query.prepare_stories_query('"extra text')
+        self.assertEqual('Missing \'"\' in filter!', q.filter_error)
+
+    def test_cached_result_is_a_copy(self):
+        q = filter_query.prepare_stories_query('tag:bla text')
+        q.tags.append('other')
+        q.freeform.clear()
+        expected = filter_query.StoryFilter(tags=['bla'], freeform=['text'])
+        self.assertEqual(expected, filter_query.prepare_stories_query('tag:bla text'))
+
 # TODO: Add tests for some incorrect syntax
\ No newline at end of file
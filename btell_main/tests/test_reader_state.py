@@ -0,0 +1,90 @@
+from django import test
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import reader_state, story_dsl
+
+
+class TestPackVariables(test.SimpleTestCase):
+
+    def test_round_trip(self):
+        variables = {'gold': 12, 'has_sword': 1, 'debt': -32768, 'čarovnik': 32767}
+        self.assertEqual(variables, reader_state.unpack_variables(reader_state.pack_variables(variables)))
+
+    def test_empty(self):
+        self.assertEqual(b'', reader_state.pack_variables({}))
+        self.assertEqual({}, reader_state.unpack_variables(b''))
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            reader_state.unpack_variables(b'\x05ab')
+
+
+class TestReaderState(test.TestCase):
+
+    def setUp(self):
+        story_dsl.clear_cache()
+        author = auth_models.User.objects.create(username='alice')
+        story = models.Story.objects.create(author=author, title='Dragons', description='')
+        self.first = models.Chapter.objects.create(story=story, title='One', content='')
+        self.second = models.Chapter.objects.create(story=story, title='Two', content='')
+        self.link = models.ChapterLink.objects.create(
+            story=story, from_chapter=self.first, to_chapter=self.second, text='Buy a sword',
+            action='gold -= 10; has_sword = 1')
+        self.reader = models.StoryReader.objects.create(user=author, story=story, current_chapter=self.first)
+        for name, value in [('gold', 15), ('visits', 3), ('luck', 2)]:
+            models.StoryReaderVars.objects.create(reader=self.reader, variable_name=name, variable_value=value)
+
+    def _stored(self):
+        rows = models.StoryReaderVars.objects.filter(reader=self.reader)
+        return dict(rows.values_list('variable_name', 'variable_value'))
+
+    def test_load_is_one_query(self):
+        with self.assertNumQueries(1):
+            state = reader_state.ReaderState.load(self.reader, packed=False)
+        self.assertEqual({'gold': 15, 'visits': 3, 'luck': 2}, state.variables)
+
+    def test_follow_link_and_flush(self):
+        state = reader_state.ReaderState.load(self.reader, packed=False)
+        state.follow_link(self.link)
+        del state.variables['luck']
+        # Upsert, delete and the reader update, wrapped in a transaction (savepoint here).
+        with self.assertNumQueries(5):
+            state.flush()
+        self.assertEqual({'gold': 5, 'visits': 3, 'has_sword': 1}, self._stored())
+        self.reader.refresh_from_db()
+        self.assertEqual(self.second, self.reader.current_chapter)
+
+    def test_clean_state_does_not_write(self):
+        state = reader_state.ReaderState.load(self.reader, packed=False)
+        with self.assertNumQueries(0):
+            state.flush()
+
+    def test_packed_mode(self):
+        state = reader_state.ReaderState.load(self.reader, packed=True)
+        self.assertEqual({'gold': 15, 'visits': 3, 'luck': 2}, state.variables)
+        state.follow_link(self.link)
+        state.flush()
+
+        reader = models.StoryReader.objects.get(pk=self.reader.pk)
+        with self.assertNumQueries(0):
+            state = reader_state.ReaderState.load(reader, packed=True)
+        self.assertEqual({'gold': 5, 'visits': 3, 'luck': 2, 'has_sword': 1}, state.variables)
+        self.assertEqual(self.second, reader.current_chapter)
+
+    def test_switching_modes(self):
+        state = reader_state.ReaderState.load(self.reader, packed=True)
+        state.follow_link(self.link)
+        state.flush()
+        # The rows are gone once the variables are packed.
+        self.assertEqual({}, self._stored())
+
+        reader = models.StoryReader.objects.get(pk=self.reader.pk)
+        state = reader_state.ReaderState.load(reader, packed=False)
+        self.assertEqual({'gold': 5, 'visits': 3, 'luck': 2, 'has_sword': 1}, state.variables)
+        state.variables['gold'] = 7
+        state.flush()
+        self.assertEqual({'gold': 7, 'visits': 3, 'luck': 2, 'has_sword': 1}, self._stored())
+        reader = models.StoryReader.objects.get(pk=self.reader.pk)
+        self.assertIsNone(reader.packed_vars)
+        self.assertEqual(self._stored(), reader_state.ReaderState.load(reader, packed=False).variables)
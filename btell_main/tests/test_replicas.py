@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from asgiref import sync
+from django import http, test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+from django.db import connections
+
+from btell import settings
+from btell_main import models
+from btell_main.util import replicas
+
+
+def _tag_names(using=None):
+    return sorted(models.Tags.objects.using(using).values_list('tag_name', flat=True))
+
+
+class TestReplicaRouting(test.TestCase):
+    """Uses a second SQLite file as the replica, with different tags than the primary."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint:disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(tmp_dir.name, 'replica.sqlite3'),
+        }
+        self.addCleanup(connections.settings.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(models.Tags)
+        models.Tags.objects.using('replica').create(tag_name='fantasy')
+        models.Tags.objects.create(tag_name='fairy tale')
+        patcher = mock.patch.object(settings, 'BTELL_DB_REPLICAS', ['replica'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _autocomplete(self):
+        response = self.client.get(urls.reverse('tag_autocomplete'), {'prefix': 'fa'})
+        return [tag['name'] for tag in response.json()['tags']]
+
+    def test_reading_views_use_the_replica(self):
+        self.assertEqual(['fantasy'], self._autocomplete())
+        # Only the decorated views read from the replica.
+        self.assertEqual(['fairy tale'], _tag_names())
+
+    def test_without_replicas_reads_use_the_primary(self):
+        with mock.patch.object(settings, 'BTELL_DB_REPLICAS', []):
+            self.assertEqual(['fairy tale'], self._autocomplete())
+
+    def test_pinned_users_read_from_the_primary(self):
+        self.client.cookies[replicas.PIN_COOKIE] = str(time.time() + 60)
+        self.assertEqual(['fairy tale'], self._autocomplete())
+        # The pin expires.
+        self.client.cookies[replicas.PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(['fantasy'], self._autocomplete())
+
+    def test_writes_pin_to_the_primary(self):
+        seen = {}
+
+        @replicas.read_from_replica
+        def view(request):  # pylint:disable=unused-argument
+            seen['before'] = _tag_names()
+            models.Tags.objects.create(tag_name='fable')
+            # The rest of the request reads its own writes.
+            seen['after'] = _tag_names()
+            return http.HttpResponse()
+
+        response = replicas.PrimaryPinningMiddleware(view)(test.RequestFactory().get('/'))
+        self.assertEqual(['fantasy'], seen['before'])
+        self.assertEqual(['fable', 'fairy tale'], seen['after'])
+        self.assertGreater(float(response.cookies[replicas.PIN_COOKIE].value), time.time())
+
+    def test_reads_do_not_pin(self):
+        response = self.client.get(urls.reverse('tag_autocomplete'), {'prefix': 'fa'})
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_unsafe_requests_pin_in_async_middleware(self):
+        async def view(request):  # pylint:disable=unused-argument
+            return http.HttpResponse()
+
+        middleware = replicas.PrimaryPinningMiddleware(view)
+        response = sync.async_to_sync(middleware)(test.RequestFactory().post('/'))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        response = sync.async_to_sync(middleware)(test.RequestFactory().get('/'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_primary_reads(self):
+        seen = {}
+
+        @replicas.read_from_replica
+        def view(request):  # pylint:disable=unused-argument
+            with replicas.primary_reads():
+                seen['primary'] = _tag_names()
+            seen['replica'] = _tag_names()
+            return http.HttpResponse()
+
+        replicas.PrimaryPinningMiddleware(view)(test.RequestFactory().get('/'))
+        self.assertEqual({'primary': ['fairy tale'], 'replica': ['fantasy']}, seen)
+
+    def test_listing_cache_is_filled_from_the_primary(self):
+        # The replica has no stories table at all, so any story read from it would fail.
+        story = models.Story.objects.create(author=auth_models.User.objects.create(username='alice'),
+                                            title='Dragons', description='')
+        story.publish()
+        cache.clear()
+        for _ in range(2):
+            response = self.client.get(urls.reverse('story_list_json'))
+            self.assertEqual(['Dragons'], [item['title'] for item in response.json()['stories']])
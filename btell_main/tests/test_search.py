@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django import test
+from django.contrib.auth import models as auth_models
+
+from btell import settings
+from btell_main import models
+from btell_main.util import filter_query, paging, search, story_query
+
+
+class TestFts5MatchExpression(test.SimpleTestCase):
+
+    def test_literals_are_quoted(self):
+        self.assertEqual('"dragon" OR "big lizard"', search.fts5_match_expression(['dragon', 'big lizard']))
+
+    def test_quotes_are_escaped(self):
+        self.assertEqual('"say ""hi"""', search.fts5_match_expression(['say "hi"']))
+
+
+class TestSearchStories(test.TestCase):
+
+    def setUp(self):
+        self.author = auth_models.User.objects.create(username='alice')
+        self.in_title = models.Story.objects.create(author=self.author, title='The dragon', description='A tale.')
+        self.in_description = models.Story.objects.create(
+            author=self.author, title='A tale', description='Once there was a big red dragon.')
+        self.unrelated = models.Story.objects.create(author=self.author, title='Ghosts', description='Red herrings.')
+        for story in (self.in_title, self.in_description, self.unrelated):
+            story.publish()
+
+    def _query(self, filter_str):
+        story_filter = filter_query.prepare_stories_query(filter_str)
+        return list(story_query.build_story_queryset(story_filter).order_by(*story_query.story_ordering(story_filter)))
+
+    def test_ranked_by_relevance(self):
+        self.assertEqual([self.in_title, self.in_description], self._query('dragon'))
+
+    def test_any_term_matches(self):
+        self.assertCountEqual([self.in_title, self.in_description, self.unrelated], self._query('dragon herrings'))
+
+    def test_quoted_literal_is_phrase(self):
+        self.assertEqual([self.in_description], self._query('"red dragon"'))
+        self.assertEqual([], self._query('"dragon red"'))
+
+    def test_index_follows_updates(self):
+        self.unrelated.title = 'Dragon ghosts'
+        self.unrelated.save()
+        self.assertIn(self.unrelated, self._query('dragon'))
+        self.unrelated.delete()
+        self.assertNotIn(self.unrelated, self._query('ghosts'))
+
+    def test_chapter_content(self):
+        with mock.patch.object(settings, 'BTELL_SEARCH_CHAPTER_CONTENT', True):
+            models.Chapter.objects.create(story=self.unrelated, title='One', content='A wyvern appears.')
+            self.assertEqual([self.unrelated], self._query('wyvern'))
+
+    def test_chapter_content_disabled(self):
+        with mock.patch.object(settings, 'BTELL_SEARCH_CHAPTER_CONTENT', False):
+            models.Chapter.objects.create(story=self.unrelated, title='One', content='A wyvern appears.')
+            self.assertEqual([], self._query('wyvern'))
+
+    def test_pages_by_relevance(self):
+        story_filter = filter_query.prepare_stories_query('dragon')
+        stories = story_query.build_story_queryset(story_filter)
+        ordering = story_query.story_ordering(story_filter)
+        first = paging.keyset_page(stories, ordering, 1)
+        second = paging.keyset_page(stories, ordering, 1, first.next_cursor)
+        self.assertEqual([self.in_title], first.items)
+        self.assertEqual([self.in_description], second.items)
+        self.assertIsNone(second.next_cursor)
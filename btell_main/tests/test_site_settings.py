@@ -0,0 +1,71 @@
+import time
+from unittest import mock
+
+from django import test
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from btell_main import models
+from btell_main.util import replicas, site_settings
+
+
+class TestSingleton(test.TestCase):
+
+    def test_defaults(self):
+        defaults = models.SiteSettings.load()
+        self.assertEqual('', defaults.default_theme)
+        self.assertEqual(0, models.SiteSettings.objects.count())
+        defaults.default_theme = 'light'
+        defaults.save()
+        self.assertEqual('light', models.SiteSettings.load().default_theme)
+
+    def test_save_overwrites(self):
+        models.SiteSettings(default_theme='light').save()
+        models.SiteSettings(default_theme='dark').save()
+        self.assertEqual(1, models.SiteSettings.objects.count())
+        self.assertEqual('dark', models.SiteSettings.load().default_theme)
+
+    def test_constraint(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.SiteSettings.objects.bulk_create([models.SiteSettings(pk=2, default_theme='dark')])
+
+
+class TestCache(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        models.SiteSettings(default_theme='light').save()
+
+    def test_cached_in_process(self):
+        self.assertEqual('light', site_settings.get().default_theme)
+        with self.assertNumQueries(0):
+            self.assertEqual('light', site_settings.get().default_theme)
+
+    async def test_async(self):
+        loaded = await site_settings.aget()
+        self.assertEqual('light', loaded.default_theme)
+        self.assertIs(loaded, await site_settings.aget())
+
+    def test_save_invalidates_on_commit(self):
+        site_settings.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            models.SiteSettings(default_theme='dark').save()
+            # Not committed yet, so other processes keep the old settings.
+            self.assertEqual('light', site_settings.get().default_theme)
+        for callback in callbacks:
+            callback()
+        self.assertEqual('dark', site_settings.get().default_theme)
+
+    def test_other_process_saved(self):
+        site_settings.get()
+        # Another worker saved the settings: the row changed, and so did the version in the shared cache.
+        models.SiteSettings.objects.filter(pk=models.SiteSettings.SINGLETON_ID).update(default_theme='dark')
+        with self.assertNumQueries(0):
+            self.assertEqual('light', site_settings.get().default_theme)
+        cache.set(site_settings.VERSION_KEY, time.time_ns(), timeout=None)
+        self.assertEqual('dark', site_settings.get().default_theme)
+
+    def test_loaded_from_the_primary(self):
+        with mock.patch.object(replicas, 'primary_reads', wraps=replicas.primary_reads) as primary_reads:
+            site_settings.get()
+        primary_reads.assert_called_once_with()
@@ -0,0 +1,120 @@
+import logging
+
+from django import test
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import reader_state, story_dsl
+
+
+class TestCompileCondition(test.SimpleTestCase):
+
+    def _eval(self, source, **variables):
+        return story_dsl.compile_condition(source)(variables)
+
+    def test_unset_variables_are_zero(self):
+        self.assertEqual(0, self._eval('missing'))
+        self.assertEqual(1, self._eval('missing == 0'))
+
+    def test_logic(self):
+        condition = 'has_sword and (gold >= 10 or not guard_awake)'
+        self.assertTrue(self._eval(condition, has_sword=1, gold=10, guard_awake=1))
+        self.assertTrue(self._eval(condition, has_sword=1, gold=0, guard_awake=0))
+        self.assertFalse(self._eval(condition, has_sword=1, gold=0, guard_awake=1))
+        self.assertFalse(self._eval(condition, has_sword=0, gold=100))
+
+    def test_symbolic_operators(self):
+        self.assertTrue(self._eval('a && !b || false', a=1))
+
+    def test_precedence(self):
+        self.assertEqual(7, self._eval('1 + 2 * 3'))
+        self.assertEqual(9, self._eval('(1 + 2) * 3'))
+        self.assertEqual(1, self._eval('1 + 1 == 2'))
+        self.assertEqual(-4, self._eval('-x * 2', x=2))
+
+    def test_division_by_zero(self):
+        self.assertEqual(0, self._eval('5 / x'))
+        self.assertEqual(2, self._eval('5 / x', x=2))
+
+    def test_syntax_errors(self):
+        for source in ['a ==', '(a', 'a = 1', 'a $ b', '1 2']:
+            with self.subTest(source=source), self.assertRaises(SyntaxError):
+                story_dsl.compile_condition(source)
+
+    def test_limits(self):
+        self.assertEqual(1, self._eval('(' * story_dsl.MAX_NESTING + 'a' + ')' * story_dsl.MAX_NESTING, a=1))
+        deep = ['(' * 120 + 'a' + ')' * 120, '!' * 400 + 'a', '-' * 400 + 'a', ' + '.join(['1'] * 1000)]
+        for source in deep:
+            with self.subTest(source=source[:20]), self.assertRaises(SyntaxError):
+                story_dsl.compile_condition(source)
+
+
+class TestCompileAction(test.SimpleTestCase):
+
+    def test_assignments(self):
+        variables = {'gold': 15}
+        story_dsl.compile_action('gold -= 10; has_sword = 1; visits += 1;')(variables)
+        self.assertEqual({'gold': 5, 'has_sword': 1, 'visits': 1}, variables)
+
+    def test_assignments_see_earlier_ones(self):
+        variables = {}
+        story_dsl.compile_action('a = 2; b = a * 3')(variables)
+        self.assertEqual({'a': 2, 'b': 6}, variables)
+
+    def test_values_are_clamped(self):
+        variables = {'a': 32000}
+        story_dsl.compile_action('a += 1000')(variables)
+        self.assertEqual(story_dsl.MAX_VALUE, variables['a'])
+
+    def test_syntax_errors(self):
+        for source in ['a', 'a = ', '1 = a', 'a = 1 b = 2']:
+            with self.subTest(source=source), self.assertRaises(SyntaxError):
+                story_dsl.compile_action(source)
+
+
+class TestChapterLinkEvaluation(test.TestCase):
+
+    def setUp(self):
+        story_dsl.clear_cache()
+        author = auth_models.User.objects.create(username='alice')
+        story = models.Story.objects.create(author=author, title='Dragons', description='')
+        first = models.Chapter.objects.create(story=story, title='One', content='')
+        second = models.Chapter.objects.create(story=story, title='Two', content='')
+        self.link = models.ChapterLink.objects.create(
+            story=story, from_chapter=first, to_chapter=second, text='Buy a sword',
+            condition='gold >= 10', action='gold -= 10; has_sword = 1')
+        self.reader = models.StoryReader.objects.create(user=author, story=story, current_chapter=first)
+
+    def test_evaluate_with_reader_variables(self):
+        models.StoryReaderVars.objects.create(reader=self.reader, variable_name='gold', variable_value=12)
+        variables = reader_state.ReaderState.load(self.reader).variables
+        self.assertEqual([self.link], story_dsl.visible_links([self.link], variables))
+        story_dsl.apply_action(self.link, variables)
+        self.assertEqual({'gold': 2, 'has_sword': 1}, variables)
+        self.assertEqual([], story_dsl.visible_links([self.link], variables))
+
+    def test_edits_invalidate_cache(self):
+        self.assertFalse(story_dsl.evaluate_condition(self.link, {}))
+        self.link.condition = 'gold < 10'
+        self.link.save()
+        self.assertTrue(story_dsl.evaluate_condition(self.link, {}))
+
+    def test_empty_condition_is_always_visible(self):
+        self.link.condition = None
+        self.assertTrue(story_dsl.evaluate_condition(self.link, {}))
+
+    def test_malformed_condition_hides_link(self):
+        self.link.condition = 'gold >='
+        self.link.save()
+        logging.disable(logging.CRITICAL)
+        visible = story_dsl.evaluate_condition(self.link, {'gold': 100})
+        logging.disable(logging.NOTSET)
+        self.assertFalse(visible)
+
+    def test_deeply_nested_condition_hides_link(self):
+        self.link.condition = '(' * 120 + 'gold' + ')' * 120
+        self.link.save()
+        logging.disable(logging.CRITICAL)
+        visible = story_dsl.evaluate_condition(self.link, {'gold': 100})
+        logging.disable(logging.NOTSET)
+        self.assertFalse(visible)
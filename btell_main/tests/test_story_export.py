@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core import management
+
+from btell_main import models
+from btell_main.util import story_export
+
+
+class TestStoryExport(test.TestCase):
+
+    def setUp(self):
+        self.author = auth_models.User.objects.create(username='alice')
+        self.other = auth_models.User.objects.create(username='bob')
+        self.story = models.Story.objects.create(author=self.author, title='Dragons', description='Big lizards.')
+        self.story.tags.add(models.Tags.objects.create(tag_name='fantasy'))
+        self.story.publish()
+        chapters = [models.Chapter.objects.create(story=self.story, title=f'Chapter {i}', content=f'Text {i}')
+                    for i in range(3)]
+        for from_chapter, to_chapter in [(0, 1), (0, 2), (1, 2)]:
+            models.ChapterLink.objects.create(story=self.story, from_chapter=chapters[from_chapter],
+                                              to_chapter=chapters[to_chapter], text='Go', condition='x > 1')
+
+    def _structure(self, story):
+        links = models.ChapterLink.objects.filter(story=story).order_by('id')
+        return sorted((link.from_chapter.title, link.to_chapter.title, link.condition) for link in links)
+
+    def _round_trip(self, compress):
+        output = io.BytesIO()
+        story_export.write_export(self.story.pk, output, compress=compress)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'export')
+            with open(path, 'wb') as export_file:
+                export_file.write(output.getvalue())
+            with story_export.open_export(path) as source:
+                return story_export.import_story(story_export.read_records(source), self.other)
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                imported = self._round_trip(compress)
+                self.assertNotEqual(self.story.pk, imported.pk)
+                self.assertEqual(self.other, imported.author)
+                self.assertEqual(('Dragons', 'Big lizards.'), (imported.title, imported.description))
+                self.assertEqual(self.story.published, imported.published)
+                self.assertEqual(['fantasy'], [tag.tag_name for tag in imported.tags.all()])
+                self.assertEqual(3, models.Chapter.objects.filter(story=imported).count())
+                self.assertEqual(self._structure(self.story), self._structure(imported))
+
+    def test_import_rejects_garbage(self):
+        with self.assertRaises(ValueError):
+            story_export.import_story([{'type': 'chapter'}])
+        header = next(story_export.export_story(self.story.pk))
+        with self.assertRaises(ValueError):
+            story_export.import_story([header, {'type': 'link', 'from_chapter_id': 1, 'to_chapter_id': 2, 'text': 'Go'}])
+
+    def test_import_rejects_incomplete_records(self):
+        header, chapter, *_ = story_export.export_story(self.story.pk)
+        del chapter['id']
+        for records in [[header, chapter], [header, 'chapter'], [{**header, 'title': None}],
+                        [{**header, 'last_update': 'yesterday'}]]:
+            with self.subTest(records=records), self.assertRaises(ValueError):
+                story_export.import_story(records, self.other)
+        self.assertEqual(1, models.Story.objects.count())
+
+    def test_import_rejects_malformed_values(self):
+        header, chapter, _, _, link, *_ = story_export.export_story(self.story.pk)
+        for records, index in [([{**header, 'completed': 'maybe'}], 0), ([{**header, 'tags': [1]}], 0),
+                               ([{**header, 'tags': 'abc'}], 0), ([header, {**chapter, 'id': [1]}], 1),
+                               ([header, {**chapter, 'id': True}], 1), ([header, {**chapter, 'title': 7}], 1),
+                               ([header, chapter, {**link, 'from_chapter_id': [1]}], 2)]:
+            with self.subTest(records=records), self.assertRaisesRegex(ValueError, f'^Record {index}: '):
+                story_export.import_story(records, self.other)
+        self.assertEqual(1, models.Story.objects.count())
+        self.assertFalse(models.Tags.objects.filter(tag_name__in=['a', 'b', 'c']).exists())
+
+    def test_commands(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'story.ndjson.gz')
+            management.call_command('export_story', self.story.pk, output=path, gzip=True)
+            stdout = io.StringIO()
+            management.call_command('import_story', path, stdout=stdout)
+        self.assertEqual(2, models.Story.objects.filter(title='Dragons', author=self.author).count())
+        self.assertIn('Imported story', stdout.getvalue())
+
+    def test_view_streams_to_author(self):
+        url = urls.reverse('story_export', args=[self.story.pk])
+        self.assertEqual(404, self.client.get(url).status_code)
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(1 + 3 + 3, len(lines))
@@ -0,0 +1,59 @@
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+
+from btell_main import models
+from btell_main.util import story_graph
+
+
+class TestStoryGraph(test.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = auth_models.User.objects.create(username='alice')
+        self.story = models.Story.objects.create(author=self.author, title='Dragons', description='')
+        # start -> a -> b -> a (cycle), start -> end, plus an orphan chapter.
+        self.start, self.a, self.b, self.end, self.orphan = [
+            models.Chapter.objects.create(story=self.story, title=title, content='')
+            for title in ['start', 'a', 'b', 'end', 'orphan']]
+        for from_chapter, to_chapter in [(self.start, self.a), (self.a, self.b), (self.b, self.a),
+                                         (self.start, self.end)]:
+            self._link(from_chapter, to_chapter)
+
+    def _link(self, from_chapter, to_chapter):
+        return models.ChapterLink.objects.create(story=self.story, from_chapter=from_chapter,
+                                                 to_chapter=to_chapter, text='Go')
+
+    def test_analysis(self):
+        graph = story_graph.story_graph(self.story.pk)
+        self.assertEqual(self.start.pk, graph.start_chapter)
+        self.assertEqual([self.start.pk, self.a.pk, self.b.pk, self.end.pk], graph.reachable)
+        self.assertEqual([self.orphan.pk], graph.unreachable)
+        self.assertEqual([self.end.pk, self.orphan.pk], graph.dead_ends)
+        self.assertEqual([[self.a.pk, self.b.pk]], graph.cycles)
+
+    def test_self_loop_is_cycle(self):
+        self._link(self.end, self.end)
+        self.assertIn([self.end.pk], story_graph.story_graph(self.story.pk).cycles)
+
+    def test_cached_until_links_change(self):
+        story_graph.story_graph(self.story.pk)
+        with self.assertNumQueries(0):
+            story_graph.story_graph(self.story.pk)
+        self._link(self.end, self.orphan)
+        graph = story_graph.story_graph(self.story.pk)
+        self.assertEqual([], graph.unreachable)
+
+    def test_empty_story(self):
+        story = models.Story.objects.create(author=self.author, title='Empty', description='')
+        graph = story_graph.story_graph(story.pk)
+        self.assertIsNone(graph.start_chapter)
+        self.assertEqual([], graph.edges())
+
+    def test_graph_json_only_for_author(self):
+        url = urls.reverse('story_graph_json', args=[self.story.pk])
+        self.assertEqual(404, self.client.get(url).status_code)
+        self.client.force_login(self.author)
+        data = self.client.get(url).json()
+        self.assertEqual(4, len(data['links']))
+        self.assertEqual([self.orphan.pk], data['unreachable'])
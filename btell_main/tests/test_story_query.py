@@ -0,0 +1,69 @@
+from django import test, urls
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import filter_query, story_query
+
+
+class TestBuildStoryQueryset(test.TestCase):
+
+    def setUp(self):
+        self.alice = auth_models.User.objects.create(username='alice')
+        self.bob = auth_models.User.objects.create(username='bob')
+        self.fantasy = models.Tags.objects.create(tag_name='fantasy')
+        self.horror = models.Tags.objects.create(tag_name='horror')
+
+        self.dragons = models.Story.objects.create(author=self.alice, title='Dragons', description='Big lizards.')
+        self.dragons.tags.add(self.fantasy)
+        self.dragons.publish()
+        self.ghosts = models.Story.objects.create(author=self.bob, title='Ghosts', description='Spooky dragons.')
+        self.ghosts.tags.add(self.fantasy, self.horror)
+        self.ghosts.publish()
+        # Never published, so it should never be listed.
+        models.Story.objects.create(author=self.alice, title='Draft', description='Not yet.')
+
+    def _query(self, filter_str):
+        return list(story_query.build_story_queryset(filter_query.prepare_stories_query(filter_str)))
+
+    def test_lists_only_published(self):
+        self.assertCountEqual([self.dragons, self.ghosts], self._query(''))
+
+    def test_filter_by_author(self):
+        self.assertEqual([self.dragons], self._query('author:alice'))
+
+    def test_filter_requires_all_tags(self):
+        self.assertCountEqual([self.dragons, self.ghosts], self._query('tag:fantasy'))
+        self.assertEqual([self.ghosts], self._query('tag:fantasy tag:horror'))
+
+    def test_freeform_matches_title_or_description(self):
+        self.assertCountEqual([self.dragons, self.ghosts], self._query('dragons'))
+        self.assertEqual([self.ghosts], self._query('spooky'))
+
+    def test_filter_is_completed(self):
+        self.ghosts.completed = True
+        self.ghosts.save()
+        self.assertEqual([self.ghosts], self._query('is:completed'))
+
+    def test_default_order_is_newest_first(self):
+        self.assertEqual([self.ghosts, self.dragons], self._query(''))
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            stories = self._query('author:bob tag:fantasy tag:horror spooky')
+            # Accessing the author must not issue another query.
+            self.assertEqual(['bob'], [story.author.username for story in stories])
+
+
+class TestStoryListView(test.TestCase):
+
+    def setUp(self):
+        author = auth_models.User.objects.create(username='alice')
+        models.Story.objects.create(author=author, title='Dragons', description='Big lizards.').publish()
+
+    def test_lists_stories(self):
+        response = self.client.get(urls.reverse('story_list'), {'filter': 'author:alice'})
+        self.assertContains(response, 'Dragons')
+
+    def test_shows_filter_error(self):
+        response = self.client.get(urls.reverse('story_list'), {'filter': 'author:'})
+        self.assertContains(response, 'Field author specified without value!')
@@ -0,0 +1,66 @@
+from django import db, test, urls
+from django.contrib.auth import models as auth_models
+
+from btell_main import models
+from btell_main.util import filter_query, story_query, tags
+
+
+class TestTags(test.TestCase):
+
+    def setUp(self):
+        self.author = auth_models.User.objects.create(username='alice')
+        self.fantasy = models.Tags.objects.create(tag_name='Fantasy')
+        self.fairy = models.Tags.objects.create(tag_name='fairy  tale')
+        self.horror = models.Tags.objects.create(tag_name='horror')
+        self.story = models.Story.objects.create(author=self.author, title='Dragons', description='')
+
+    def _counts(self):
+        return {tag.tag_name: tag.story_count for tag in models.Tags.objects.all()}
+
+    def test_names_are_normalized_and_unique(self):
+        self.assertEqual(['fairy tale', 'fantasy', 'horror'],
+                         sorted(models.Tags.objects.values_list('tag_name', flat=True)))
+        with self.assertRaises(db.IntegrityError):
+            models.Tags.objects.create(tag_name='FANTASY ')
+
+    def test_counts_only_published(self):
+        self.story.tags.add(self.fantasy, self.horror)
+        self.assertEqual({'fantasy': 0, 'fairy tale': 0, 'horror': 0}, self._counts())
+        self.story.publish()
+        self.assertEqual({'fantasy': 1, 'fairy tale': 0, 'horror': 1}, self._counts())
+
+    def test_counts_follow_tag_changes(self):
+        self.story.publish()
+        self.story.tags.add(self.fantasy, self.horror)
+        self.story.tags.remove(self.horror)
+        self.assertEqual({'fantasy': 1, 'fairy tale': 0, 'horror': 0}, self._counts())
+        self.fairy.story_set.add(self.story)
+        self.assertEqual({'fantasy': 1, 'fairy tale': 1, 'horror': 0}, self._counts())
+        self.story.tags.clear()
+        self.assertEqual({'fantasy': 0, 'fairy tale': 0, 'horror': 0}, self._counts())
+
+    def test_counts_follow_story_delete(self):
+        self.story.publish()
+        self.story.tags.add(self.fantasy)
+        self.story.delete()
+        self.assertEqual(0, models.Tags.objects.get(pk=self.fantasy.pk).story_count)
+
+    def test_all_tags_intersection(self):
+        other = models.Story.objects.create(author=self.author, title='Ghosts', description='')
+        for story in (self.story, other):
+            story.publish()
+            story.tags.add(self.fantasy)
+        other.tags.add(self.horror)
+        story_filter = filter_query.prepare_stories_query('tag:Fantasy tag:HORROR')
+        self.assertEqual([other], list(story_query.build_story_queryset(story_filter)))
+
+    def test_autocomplete(self):
+        self.story.publish()
+        self.story.tags.add(self.fantasy)
+        self.assertEqual([self.fantasy, self.fairy], tags.autocomplete('FA'))
+        self.assertEqual([self.fairy], tags.autocomplete('fairy t'))
+        self.assertEqual([], tags.autocomplete('x'))
+
+    def test_autocomplete_view(self):
+        response = self.client.get(urls.reverse('tag_autocomplete'), {'prefix': 'hor'})
+        self.assertEqual({'tags': [{'name': 'horror', 'stories': 0}]}, response.json())
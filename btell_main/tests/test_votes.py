@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django import test, urls
+from django.contrib.auth import models as auth_models
+from django.db.models import QuerySet
+
+from btell import settings
+from btell_main import models
+from btell_main.util import votes
+
+
+class TestCastVote(test.TestCase):
+
+    def setUp(self):
+        self.alice = auth_models.User.objects.create(username='alice')
+        self.bob = auth_models.User.objects.create(username='bob')
+        self.story = models.Story.objects.create(author=self.alice, title='Dragons', description='')
+        self.story.publish()
+
+    def _counts(self):
+        self.story.refresh_from_db()
+        return (self.story.likes, self.story.dislikes)
+
+    def test_votes_are_idempotent(self):
+        votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+        votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+        votes.cast_vote(self.bob, self.story.pk, votes.LIKE)
+        self.assertEqual((2, 0), self._counts())
+
+    def test_change_and_remove_vote(self):
+        votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+        votes.cast_vote(self.alice, self.story.pk, votes.DISLIKE)
+        self.assertEqual((0, 1), self._counts())
+        votes.cast_vote(self.alice, self.story.pk, votes.NO_VOTE)
+        self.assertEqual((0, 0), self._counts())
+        self.assertFalse(models.StoryVote.objects.exists())
+
+    def test_concurrent_first_votes(self):
+        votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+        # The second click of a double click didn't see the vote of the first one, which was still being written.
+        first = QuerySet.first
+        lookups = []
+
+        def first_after_race(queryset):
+            lookups.append(queryset)
+            return None if len(lookups) == 1 else first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', first_after_race):
+            votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+        self.assertEqual(2, len(lookups))
+        self.assertEqual((1, 0), self._counts())
+        self.assertEqual(1, models.StoryVote.objects.count())
+
+    def test_invalid_vote(self):
+        with self.assertRaises(ValueError):
+            votes.cast_vote(self.alice, self.story.pk, 2)
+
+    def test_sharded_counters(self):
+        with mock.patch.object(settings, 'BTELL_VOTE_COUNTER_SHARDS', 4):
+            votes.cast_vote(self.alice, self.story.pk, votes.LIKE)
+            votes.cast_vote(self.bob, self.story.pk, votes.DISLIKE)
+            votes.cast_vote(self.bob, self.story.pk, votes.LIKE)
+        self.assertEqual((0, 0), self._counts())
+        self.assertEqual({'likes': 2, 'dislikes': 0}, votes.vote_counts(self.story.pk))
+
+        self.assertEqual(1, votes.fold_vote_shards())
+        self.assertEqual((2, 0), self._counts())
+        self.assertFalse(models.StoryVoteShard.objects.exists())
+        self.assertEqual({'likes': 2, 'dislikes': 0}, votes.vote_counts(self.story.pk))
+
+
+class TestVoteView(test.TestCase):
+
+    def setUp(self):
+        self.user = auth_models.User.objects.create(username='alice')
+        self.story = models.Story.objects.create(author=self.user, title='Dragons', description='')
+        self.story.publish()
+        self.url = urls.reverse('vote_story', args=[self.story.pk])
+
+    def test_requires_login(self):
+        self.assertEqual(403, self.client.post(self.url, {'vote': 'like'}).status_code)
+
+    def test_vote(self):
+        self.client.force_login(self.user)
+        self.assertEqual({'likes': 1, 'dislikes': 0}, self.client.post(self.url, {'vote': 'like'}).json())
+        self.assertEqual(400, self.client.post(self.url, {'vote': 'love'}).status_code)
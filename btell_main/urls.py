@@ -3,7 +3,14 @@ from django import urls
 from django.contrib.auth import views as auth_views
 
 from btell_main.views import index as index_view
+from btell_main.views import comments
+from btell_main.views import images
+from btell_main.views import reading
+from btell_main.views import story_export
+from btell_main.views import story_graph
 from btell_main.views import story_list
+from btell_main.views import tags
+from btell_main.views import votes
 
 from btell_main.forms import login, register
 
@@ -11,6 +18,17 @@ from btell_main.forms import login, register
 urls = [
     urls.path('', index_view.index, name='btell_index'),
     urls.path('stories', story_list.story_list, name='story_list'),
+    urls.path('stories.json', story_list.story_list_json, name='story_list_json'),
+    urls.path('tags.json', tags.tag_autocomplete, name='tag_autocomplete'),
+    urls.path('story/<int:story_id>/chapter/<int:chapter_id>', reading.read_chapter, name='read_chapter'),
+    urls.path('story/<int:story_id>/link/<int:link_id>', reading.follow_link, name='follow_link'),
+    urls.path('story/<int:story_id>/comments', comments.story_comments, name='story_comments'),
+    urls.path('story/<int:story_id>/cover', images.upload_cover, name='upload_cover'),
+    urls.path('story/<int:story_id>/vote', votes.vote_story, name='vote_story'),
+    urls.path('story/<int:story_id>/graph.json', story_graph.story_graph_json, name='story_graph_json'),
+    urls.path('story/<int:story_id>/export.ndjson', story_export.story_export, name='story_export'),
+    urls.path('img/<str:digest>', images.image, name='image'),
+    urls.path('img/<str:digest>/<str:variant>', images.image, name='image_variant'),
     # Authentication views
     urls.path('a/login.html/', login.LoginPage.as_view(), name='login'),
     urls.path('a/register.html/', register.RegisterPage.as_view(), name='register'),
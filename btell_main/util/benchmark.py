@@ -0,0 +1,223 @@
+"""Benchmarks of the hot paths of reading and listing stories, on synthetic data.
+
+`generate_fixtures` fills the database with a configurable amount of synthetic users, tags,
+stories with many chapters and densely linked chapter graphs, and readers with large sets of story
+variables. Everything is inserted with `bulk_create`, so generating even large fixtures is quick.
+
+`run_benchmarks` then times the operations which every page view depends on, and returns the
+results as a dictionary which can be saved as JSON and compared between commits (see the
+`benchmark` management command).
+"""
+from typing import Any, Callable, Dict, List
+import dataclasses
+import platform
+import random
+import statistics
+import time
+import uuid
+
+import django
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from btell_main import models
+from btell_main.util import (chapter_render, filter_query, listing_cache, reader_state, search, story_dsl,
+                             tags as tags_util)
+
+BATCH_SIZE = 1000
+
+
+@dataclasses.dataclass
+class Scale:
+    """How much synthetic data to generate."""
+    users: int = 50
+    tags: int = 100
+    stories: int = 10
+    chapters: int = 1000  # Per story.
+    links: int = 4  # Per chapter.
+    variables: int = 200  # Per reader.
+    seed: int = 1
+
+
+@dataclasses.dataclass
+class Fixtures:
+    """The synthetic data, as needed by the benchmarks."""
+    scale: Scale
+    story_ids: List[int]
+    # Story filters for the listing benchmarks: plain listing, tags, freeform search, and a mix.
+    filters: List[str]
+    # The first chapter of each story, and all links of each story.
+    chapters: List[models.Chapter]
+    links: List[List[models.ChapterLink]]
+    readers: List[models.StoryReader]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    words = ['dragon', 'cave', 'dark', 'sword', 'river', 'castle', 'king', 'forest', 'night', 'gold']
+    return ' '.join(rng.choice(words) for _ in range(count))
+
+
+def _chapter_content(rng: random.Random, variables: int) -> str:
+    paragraphs = []
+    for _ in range(5):
+        variable = f'v{rng.randrange(variables)}'
+        paragraphs.append(f'{_words(rng, 40)} [[{variable} > 2|*{_words(rng, 3)}*|{_words(rng, 3)}]] {_words(rng, 20)}')
+    return '\n\n'.join(paragraphs)
+
+
+def _link_expressions(rng: random.Random, variables: int):
+    first, second = f'v{rng.randrange(variables)}', f'v{rng.randrange(variables)}'
+    condition = rng.choice([None, f'{first} > 2', f'{first} + {second} < 10 and not v0', f'{first} == {second}'])
+    action = rng.choice([None, f'{first} += 1', f'{first} = {second} * 2; v0 = 1'])
+    return condition, action
+
+
+def generate_fixtures(scale: Scale) -> Fixtures:
+    """Generates the synthetic data, with names unique to this run."""
+    rng = random.Random(scale.seed)
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+
+    auth_models.User.objects.bulk_create(
+        [auth_models.User(username=f'bench{run}_{i}') for i in range(scale.users)], batch_size=BATCH_SIZE)
+    users = list(auth_models.User.objects.filter(username__startswith=f'bench{run}_').order_by('id'))
+    models.Tags.objects.bulk_create(  # pylint:disable=no-member
+        [models.Tags(tag_name=f'tag{i}-{run}') for i in range(scale.tags)], batch_size=BATCH_SIZE)
+    tag_ids = list(models.Tags.objects.filter(tag_name__endswith=f'-{run}').values_list('id', flat=True))  # pylint:disable=no-member
+
+    models.Story.objects.bulk_create([  # pylint:disable=no-member
+        models.Story(author=rng.choice(users), title=f'{_words(rng, 3)} {run} {i}', description=_words(rng, 30),
+                     published=now, last_update=now, completed=rng.random() < 0.5)
+        for i in range(scale.stories)], batch_size=BATCH_SIZE)
+    stories = list(models.Story.objects.filter(title__contains=f' {run} ').order_by('id'))  # pylint:disable=no-member
+    story_ids = [story.pk for story in stories]
+    Through = models.Story.tags.through  # pylint:disable=invalid-name,no-member
+    Through.objects.bulk_create([
+        Through(story_id=story_id, tags_id=tag_id)
+        for story_id in story_ids for tag_id in rng.sample(tag_ids, min(len(tag_ids), 5))], batch_size=BATCH_SIZE)
+    tags_util.refresh_story_counts(tag_ids)
+
+    models.Chapter.objects.bulk_create([  # pylint:disable=no-member
+        models.Chapter(story_id=story_id, title=f'Chapter {i}', content=_chapter_content(rng, scale.variables),
+                       published=now)
+        for story_id in story_ids for i in range(scale.chapters)], batch_size=BATCH_SIZE)
+    chapter_ids: Dict[int, List[int]] = {story_id: [] for story_id in story_ids}
+    for chapter_id, story_id in models.Chapter.objects.filter(  # pylint:disable=no-member
+            story_id__in=story_ids).order_by('id').values_list('id', 'story_id'):
+        chapter_ids[story_id].append(chapter_id)
+    links = []
+    for story_id, ids in chapter_ids.items():
+        for from_id in ids:
+            for _ in range(scale.links):
+                condition, action = _link_expressions(rng, scale.variables)
+                links.append(models.ChapterLink(story_id=story_id, from_chapter_id=from_id,
+                                                to_chapter_id=rng.choice(ids), text=_words(rng, 3),
+                                                condition=condition, action=action))
+    models.ChapterLink.objects.bulk_create(links, batch_size=BATCH_SIZE)  # pylint:disable=no-member
+
+    models.StoryReader.objects.bulk_create([  # pylint:disable=no-member
+        models.StoryReader(user=user, story_id=story_ids[0], current_chapter_id=chapter_ids[story_ids[0]][0])
+        for user in users], batch_size=BATCH_SIZE)
+    readers = list(models.StoryReader.objects.filter(user__in=users).order_by('id'))  # pylint:disable=no-member
+    models.StoryReaderVars.objects.bulk_create([  # pylint:disable=no-member
+        models.StoryReaderVars(reader=reader, variable_name=f'v{i}', variable_value=rng.randrange(-5, 10))
+        for reader in readers for i in range(scale.variables)], batch_size=BATCH_SIZE)
+
+    for story in stories:
+        search.index_story(story, chapter_text='')
+    listing_cache.invalidate()
+
+    first_chapters = models.Chapter.objects.filter(  # pylint:disable=no-member
+        pk__in=[ids[0] for ids in chapter_ids.values()]).order_by('story_id')
+    return Fixtures(
+        scale=scale,
+        story_ids=story_ids,
+        filters=['', f'tag:tag0-{run}', f'tag:tag1-{run} tag:tag2-{run}', 'dragon',
+                 f'tag:tag0-{run} "dark cave" is:completed', f'author:{users[0].username}'],
+        chapters=list(first_chapters),
+        links=[list(models.ChapterLink.objects.filter(story_id=story_id).order_by('id')) for story_id in story_ids],  # pylint:disable=no-member
+        readers=readers,
+    )
+
+
+def _time(operation: Callable[[int], Any], repeat: int) -> Dict[str, Any]:
+    """Runs the operation `repeat` times (with the run number), and summarizes the timings."""
+    timings = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        operation(run)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+    }
+
+
+def run_benchmarks(fixtures: Fixtures, repeat: int = 20) -> Dict[str, Any]:
+    """Times the hot operations on the fixtures.
+
+    Caches are cleared before each run where the operation would otherwise be served from them, so
+    the results show the cost of a cache miss. This clears the whole default cache, so it should be
+    a private one (as in the `benchmark` command), not the cache of the running site.
+    """
+    readers = fixtures.readers
+    variables = [reader_state.ReaderState.load(reader).variables for reader in readers[:repeat]] or [{}]
+
+    filters = fixtures.filters
+
+    def prepare_query(run):
+        filter_query._parse_stories_query.cache_clear()  # pylint:disable=protected-access
+        filter_query.prepare_stories_query(filters[run % len(filters)])
+
+    def story_listing(run):
+        cache.clear()
+        story_filter = filter_query.prepare_stories_query(filters[run % len(filters)])
+        listing_cache.story_page(story_filter, 20)
+
+    def chapter_render_cold(run):
+        cache.clear()
+        chapter = fixtures.chapters[run % len(fixtures.chapters)]
+        chapter_render.render_chapter(chapter, variables[run % len(variables)])
+
+    def chapter_render_cached(run):
+        chapter = fixtures.chapters[run % len(fixtures.chapters)]
+        chapter_render.render_chapter(chapter, variables[run % len(variables)])
+
+    def link_conditions(run):
+        # All links of a story, as if a reader was shown every chapter once.
+        story_dsl.visible_links(fixtures.links[run % len(fixtures.links)], variables[run % len(variables)])
+
+    def link_conditions_cold(run):
+        story_dsl.clear_cache()
+        link_conditions(run)
+
+    def reader_state_save(run):
+        reader = readers[run % len(readers)]
+        state = reader_state.ReaderState.load(reader)
+        state.variables[f'v{run % fixtures.scale.variables}'] = run
+        state.reader.current_chapter_id = fixtures.chapters[0].pk
+        state.flush()
+
+    results = {
+        'prepare_stories_query': _time(prepare_query, repeat),
+        'story_listing': _time(story_listing, repeat),
+        'chapter_render_cold': _time(chapter_render_cold, repeat),
+        'chapter_render_cached': _time(chapter_render_cached, repeat),
+        'link_conditions_cold': _time(link_conditions_cold, repeat),
+        'link_conditions': _time(link_conditions, repeat),
+    }
+    if readers:
+        results['reader_state_save'] = _time(reader_state_save, repeat)
+    return {
+        'scale': dataclasses.asdict(fixtures.scale),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'results': results,
+    }
@@ -0,0 +1,127 @@
+"""Renders the simplified story markdown of chapters into HTML.
+
+The simplified markdown supports:
+
+- Paragraphs, separated by empty lines. Single line breaks are kept.
+- Headings, with lines starting with `#`, `##` or `###`.
+- `**bold**` and `*italic*` text.
+- Selective text, written as `[[condition|shown if true|shown if false]]`, where the condition
+  is a story DSL expression (see `story_dsl`) and the last part is optional. Conditions can use
+  `||`, since only a single `|` separates the parts.
+
+Any HTML in the content is escaped. A chapter is compiled once into a list of segments, which
+are either static HTML strings or `(condition, true_html, false_html)` slots, and the compiled
+form is kept in the Django cache keyed by the chapter's `last_update`. Rendering for a reader
+then only needs to evaluate the slots.
+"""
+from typing import List, Mapping, Tuple, Union
+import html
+import logging
+import re
+
+from django.core.cache import cache
+from django.utils import safestring
+
+from btell import settings
+from btell_main import models
+from btell_main.util import lru, story_dsl
+
+Slot = Tuple[str, str, str]
+Segment = Union[str, Slot]
+
+CACHE_KEY = 'btell:chapter_html:{chapter_id}:{version}'
+
+_SLOT_RE = re.compile(r'\[\[(.+?)\]\]', re.DOTALL)
+_SLOT_SEPARATOR_RE = re.compile(r'(?<!\|)\|(?!\|)')
+_HEADING_RE = re.compile(r'^(#{1,3})\s+(.*)$')
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*', re.DOTALL)
+_ITALIC_RE = re.compile(r'\*(.+?)\*', re.DOTALL)
+
+# Compiled slot conditions, by their source.
+_conditions = lru.LRUCache(settings.BTELL_SLOT_CONDITION_CACHE_SIZE)
+
+
+def _inline(text: str) -> str:
+    """Escapes the text and applies the inline markup."""
+    text = html.escape(text, quote=False)
+    text = _BOLD_RE.sub(r'<strong>\1</strong>', text)
+    text = _ITALIC_RE.sub(r'<em>\1</em>', text)
+    return text.replace('\n', '<br />')
+
+
+def _inline_segments(text: str) -> List[Segment]:
+    """Splits inline text into static HTML and selective text slots."""
+    segments: List[Segment] = []
+    pos = 0
+    for match in _SLOT_RE.finditer(text):
+        segments.append(_inline(text[pos:match.start()]))
+        parts = _SLOT_SEPARATOR_RE.split(match.group(1), maxsplit=2)
+        if len(parts) < 2:
+            # Not selective text after all, keep it as it was written.
+            segments.append(_inline(match.group(0)))
+        else:
+            segments.append((parts[0].strip(), _inline(parts[1]), _inline(parts[2]) if len(parts) > 2 else ''))
+        pos = match.end()
+    segments.append(_inline(text[pos:]))
+    return segments
+
+
+def compile_content(content: str) -> List[Segment]:
+    """Compiles simplified story markdown into segments, merging adjacent static HTML."""
+    segments: List[Segment] = []
+    for block in re.split(r'\n\s*\n', content.replace('\r\n', '\n').strip()):
+        if not block.strip():
+            continue
+        heading = _HEADING_RE.match(block.strip())
+        if heading:
+            tag = f'h{len(heading.group(1)) + 1}'  # The chapter title is the h1 of the page.
+            segments.extend([f'<{tag}>', *_inline_segments(heading.group(2)), f'</{tag}>'])
+        else:
+            segments.extend(['<p>', *_inline_segments(block.strip()), '</p>'])
+
+    merged: List[Segment] = []
+    for segment in segments:
+        if isinstance(segment, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += segment
+        elif segment != '':
+            merged.append(segment)
+    return merged
+
+
+def compiled_chapter(chapter: models.Chapter) -> List[Segment]:
+    """Returns the compiled content of the chapter, from the cache if possible."""
+    key = CACHE_KEY.format(chapter_id=chapter.pk, version=chapter.last_update.timestamp())
+    segments = cache.get(key)
+    if segments is None:
+        segments = compile_content(chapter.content)
+        cache.set(key, segments, timeout=None)
+    return segments
+
+
+def _condition_holds(source: str, variables: Mapping[str, int]) -> bool:
+    condition = _conditions.get(source)
+    if condition is None:
+        try:
+            condition = story_dsl.compile_condition(source)
+        except SyntaxError as syntax_error:
+            logging.warning("Malformed story DSL in selective text '%s': %s", source, syntax_error)
+            condition = lambda variables: 0  # pylint:disable=unnecessary-lambda-assignment
+        _conditions.put(source, condition)
+    return bool(condition(variables))
+
+
+def fill_segments(segments: List[Segment], variables: Mapping[str, int]) -> str:
+    """Joins compiled segments into HTML, picking the selective text for the given variables."""
+    parts = []
+    for segment in segments:
+        if isinstance(segment, str):
+            parts.append(segment)
+        else:
+            condition, if_true, if_false = segment
+            parts.append(if_true if _condition_holds(condition, variables) else if_false)
+    return ''.join(parts)
+
+
+def render_chapter(chapter: models.Chapter, variables: Mapping[str, int]) -> str:
+    """Renders the chapter content to HTML for a reader with the given story variables."""
+    return safestring.mark_safe(fill_segments(compiled_chapter(chapter), variables))  # nosec: content is escaped
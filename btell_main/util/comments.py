@@ -0,0 +1,57 @@
+"""Comments on stories.
+
+Comments are listed newest first, using keyset pagination over the `(story, created)` index, and
+the number of comments of each story is kept in `Story.comment_count`, so neither listing nor
+counting needs to look at all the comments of a story. The count is kept up to date by signal
+receivers, so it also follows comments deleted in other ways (in the admin, by deleting their
+commenter, or in bulk).
+"""
+from typing import Optional
+
+from django import dispatch
+from django.contrib.auth import models as auth_models
+from django.db import transaction
+from django.db.models import F, signals
+
+from btell_main import models
+from btell_main.util import paging
+
+COMMENT_ORDER = ('-created', '-id')
+
+
+def add_comment(user: auth_models.User, story_id: int, text: str) -> models.Comment:
+    """Adds a comment to the story, and updates its comment count."""
+    with transaction.atomic():
+        return models.Comment.objects.create(  # pylint:disable=no-member
+            story_id=story_id, commenter=user, comment_text=text)
+
+
+def delete_comment(comment: models.Comment):
+    """Deletes the comment, and updates the comment count of its story (unless it was already deleted)."""
+    with transaction.atomic():
+        models.Comment.objects.filter(pk=comment.pk).delete()  # pylint:disable=no-member
+
+
+@dispatch.receiver(signals.post_save, sender=models.Comment)
+def _comment_saved(sender, instance: models.Comment, created: bool, **kwargs):
+    del sender, kwargs
+    if created:
+        models.Story.objects.filter(pk=instance.story_id).update(  # type: ignore pylint:disable=no-member
+            comment_count=F('comment_count') + 1)
+
+
+@dispatch.receiver(signals.post_delete, sender=models.Comment)
+def _comment_deleted(sender, instance: models.Comment, **kwargs):
+    del sender, kwargs
+    models.Story.objects.filter(pk=instance.story_id).update(  # type: ignore pylint:disable=no-member
+        comment_count=F('comment_count') - 1)
+
+
+def comment_page(story_id: int, page_size: int, cursor: Optional[str] = None) -> paging.Page:
+    """Returns a page of the comments of the story, newest first, with their commenters joined in.
+
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    comments = models.Comment.objects.filter(story_id=story_id).select_related('commenter')  # pylint:disable=no-member
+    return paging.keyset_page(comments, COMMENT_ORDER, page_size, cursor)
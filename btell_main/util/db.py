@@ -0,0 +1,33 @@
+"""Per-connection database tuning.
+
+SQLite settings like the journal mode and the busy timeout are set with PRAGMA statements, and
+(except for the journal mode) only last as long as the connection. They are applied by a receiver
+of `connection_created`, from the `BTELL_SQLITE_PRAGMAS` setting.
+"""
+from typing import List
+
+from django import dispatch
+from django.db.backends import signals
+
+from btell import settings
+
+
+def sqlite_pragmas(in_memory: bool = False) -> List[str]:
+    """Returns the PRAGMA statements to run on a new SQLite connection.
+
+    In-memory databases (e.g. in tests) always use an in-memory journal, so the journal mode is
+    left out for them.
+    """
+    return [f'PRAGMA {name} = {value}' for name, value in settings.BTELL_SQLITE_PRAGMAS.items()
+            if not (in_memory and name == 'journal_mode')]
+
+
+@dispatch.receiver(signals.connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Applies `BTELL_SQLITE_PRAGMAS` to every new SQLite connection."""
+    del sender, kwargs
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragmas(connection.is_in_memory_db()):
+            cursor.execute(statement)
@@ -2,6 +2,8 @@
 from typing import ClassVar, Dict, List, Optional
 import dataclasses
 import enum
+import functools
+import re
 
 
 @dataclasses.dataclass
@@ -65,7 +67,7 @@ class TokenType(enum.Enum):
     FIELD = enum.auto()
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class FilterToken:
     """Describes each individual filter token from the query string."""
     contents: str
@@ -98,63 +100,44 @@ class FilterToken:
             return f"UNKNOWN({self.contents})"
 
 
+# Scans one piece of the filter at a time: a quoted literal (possibly missing its closing quote),
+# a word (which is a field name if a colon follows it), or a single separator.
+_TOKEN_RE = re.compile(r'"(?P<quoted>[^"]*)(?P<closed>")?|(?P<word>[^:" ]+)(?P<colon>:)?|[: ]')
+
+
 def tokenize_query(filter_str: str) -> List[FilterToken]:
     """Lex-analyses the filter and returns distinct tokens as a list of strings."""
-    cpos = 0
-    ppos = 0
     tokens = []
-    in_literal = False
-    while cpos < len(filter_str):
-        # Literal takes precedence over special symbol parsing.
-        if in_literal:
-            if filter_str[cpos] == '"':  # Closing quote
-                in_literal = False
-                tok = filter_str[ppos:cpos].strip()
-                if tok:
-                    tokens.append(FilterToken.literal(tok))  # Skip the final quote, we only want the contents
-                ppos = cpos + 1
-            cpos += 1
-            # Skip normal processing while in literal
-            continue
-        if filter_str[cpos] in [':', ' ']:
-            # grab current token
-            if ppos < cpos:
-                tok = filter_str[ppos:cpos].strip()
-                if tok:
-                    if filter_str[cpos] == ':':
-                        tokens.append(FilterToken.field(tok))
-                    else:
-                        tokens.append(FilterToken.literal(tok))
-
-            cpos += 1  # Skip the separator
-            ppos = cpos
-            continue
-        if filter_str[cpos] == '"':
-            # Start of literal
-            # We may have some token preceding
-            if ppos < cpos:
-                tok = filter_str[ppos:cpos].strip()
-                if tok:
-                    tokens.append(FilterToken.literal(tok))
-            in_literal = True
-            cpos += 1  # We are only interested in the contents of the literal
-            ppos = cpos
+    for match in _TOKEN_RE.finditer(filter_str):
+        quoted = match.group('quoted')
+        if quoted is not None:
+            if match.group('closed') is None:
+                raise SyntaxError('Missing \'"\' in filter!')
+            tok = quoted.strip()
+            if tok:
+                tokens.append(FilterToken.literal(tok))
             continue
-        # if we came this far, nothing special happened
-        cpos += 1
-    # Note: We may still be in_literal here, if a quote was not terminated.
-    if in_literal:
-        raise SyntaxError('Missing \'"\' in filter!')
-    # When we've reached the end of the filter string, we may still have something pending
-    if ppos < cpos:
-        tok = filter_str[ppos:cpos].strip()
-        if tok:
-            tokens.append(FilterToken.literal(tok))
+        word = match.group('word')
+        if word is not None:
+            tok = word.strip()
+            if tok:
+                tokens.append(FilterToken.field(tok) if match.group('colon') else FilterToken.literal(tok))
     return tokens
 
 
 def prepare_stories_query(filter_str: Optional[str]) -> StoryFilter:
-    """Parses the given stories filter and returns a query set with those conditions."""
+    """Parses the given stories filter and returns a query set with those conditions.
+
+    Parsed filters are cached (popular filters come from links, and repeat a lot), so the
+    result is a copy which the caller is free to modify.
+    """
+    parsed = _parse_stories_query(filter_str or '')
+    return dataclasses.replace(parsed, tags=list(parsed.tags), freeform=list(parsed.freeform))
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_stories_query(filter_str: str) -> StoryFilter:
+    """Parses the given stories filter. The result is shared, so it must not be modified."""
     # Filter is like 'author:a tags:b,c,d freeform text'
     # - field:value
     # - space separated
@@ -167,9 +150,13 @@ def prepare_stories_query(filter_str: Optional[str]) -> StoryFilter:
     #   - tag:a,b,c  # same as a above
     if not filter_str:
         return StoryFilter()  #  Basically everything
-    tokens = tokenize_query(filter_str)
-    ctoken = 0
     query = StoryFilter()
+    try:
+        tokens = tokenize_query(filter_str)
+    except SyntaxError as syntax_error:
+        query.filter_error = str(syntax_error)
+        return query
+    ctoken = 0
     while ctoken < len(tokens):
         tok = tokens[ctoken]
         if tok.is_field():
@@ -0,0 +1,150 @@
+"""Content-addressed store for uploaded images (story covers and chapter images).
+
+Every image is stored once, under the sha256 hash of its contents, so uploading the same image
+twice costs nothing. Files are sharded into directories by the first two bytes of the hash:
+
+    BTELL_UPLOADS_DIR/ab/cd/abcd...ef                 The original upload.
+    BTELL_UPLOADS_DIR/ab/cd/abcd...ef.<variant>.webp  Resized variants (see `BTELL_IMAGE_VARIANTS`).
+
+Variants are generated in a background thread pool right after upload (and on demand, if one
+is requested before it's ready). Since the content under a name never changes, everything can
+be served with a strong ETag and as immutable, and the content type of an original only needs to
+be read once.
+"""
+from typing import BinaryIO, Optional
+import concurrent.futures
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from PIL import Image
+
+from btell import settings
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+ORIGINAL = 'original'
+VARIANT_CONTENT_TYPE = 'image/webp'
+_CHUNK_SIZE = 64 * 1024
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    """Raised when an upload is not an image we can handle."""
+
+
+def _shard_dir(digest: str) -> str:
+    return os.path.join(settings.BTELL_UPLOADS_DIR, digest[0:2], digest[2:4])
+
+
+def image_path(digest: str, variant: str = ORIGINAL) -> str:
+    """Returns the path of the original image, or of one of its variants."""
+    if not DIGEST_RE.match(digest):
+        raise ValueError(f'Not an image hash: {digest}')
+    if variant == ORIGINAL:
+        return os.path.join(_shard_dir(digest), digest)
+    if variant not in settings.BTELL_IMAGE_VARIANTS:
+        raise ValueError(f'Unknown image variant: {variant}')
+    return os.path.join(_shard_dir(digest), f'{digest}.{variant}.webp')
+
+
+@functools.lru_cache(maxsize=1024)
+def _original_content_type(digest: str) -> str:
+    with Image.open(image_path(digest)) as image:
+        return image.get_format_mimetype() or 'application/octet-stream'
+
+
+def content_type(digest: str, variant: str = ORIGINAL) -> str:
+    """Returns the MIME type of the image (or variant), which must exist.
+
+    Variants are always WebP. The format of an original is read from its file once per process.
+    """
+    if variant != ORIGINAL:
+        return VARIANT_CONTENT_TYPE
+    return _original_content_type(digest)
+
+
+def _write_atomically(path: str, write):
+    """Calls `write` with a temporary file, which is then moved to the path."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+    try:
+        with os.fdopen(handle, 'wb') as tmp_file:
+            write(tmp_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def generate_variant(digest: str, variant: str) -> str:
+    """Generates a resized WebP variant of the image, unless it exists already. Returns its path."""
+    path = image_path(digest, variant)
+    if os.path.exists(path):
+        return path
+    with Image.open(image_path(digest)) as image:
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        image.thumbnail(settings.BTELL_IMAGE_VARIANTS[variant], Image.Resampling.LANCZOS)
+        _write_atomically(path, lambda out: image.save(out, format='WEBP', quality=80, method=4))
+    return path
+
+
+def generate_variants(digest: str):
+    """Generates all the variants of the image."""
+    for variant in settings.BTELL_IMAGE_VARIANTS:
+        generate_variant(digest, variant)
+
+
+def generate_variants_async(digest: str) -> concurrent.futures.Future:
+    """Queues the generation of all the variants of the image on the worker pool."""
+    global _executor  # pylint:disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.BTELL_IMAGE_WORKERS, thread_name_prefix='btell-images')
+    return _executor.submit(generate_variants, digest)
+
+
+def store_image(upload: BinaryIO) -> str:
+    """Stores an uploaded image, and queues the generation of its variants.
+
+    Returns:
+        The sha256 hash (hex) of the image, which is its name in the store.
+
+    Raises:
+        InvalidImage: if the upload is not an image, or has more than `BTELL_IMAGE_MAX_PIXELS` pixels.
+    """
+    hasher = hashlib.sha256()
+    os.makedirs(settings.BTELL_UPLOADS_DIR, exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=settings.BTELL_UPLOADS_DIR, prefix='.upload-')
+    try:
+        with os.fdopen(handle, 'wb') as tmp_file:
+            for chunk in iter(lambda: upload.read(_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+        try:
+            with Image.open(tmp_path) as image:
+                image.verify()
+                pixels = image.width * image.height
+        except Exception as image_error:  # Pillow raises many different errors for broken files.
+            raise InvalidImage('The upload is not a supported image.') from image_error
+        if pixels > settings.BTELL_IMAGE_MAX_PIXELS:
+            raise InvalidImage(f'The image is too large (over {settings.BTELL_IMAGE_MAX_PIXELS} pixels).')
+
+        digest = hasher.hexdigest()
+        path = image_path(digest)
+        if os.path.exists(path):
+            os.unlink(tmp_path)  # Already stored.
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    generate_variants_async(digest)
+    return digest
@@ -0,0 +1,210 @@
+"""Per-request performance instrumentation, and query budgets for views.
+
+`PerformanceMiddleware` measures every request: the wall time, the number and duration of database
+queries, the time spent rendering templates, and the cache hits and misses. The measurements are
+logged (as JSON, on the `btell_main.performance` logger) and, if `BTELL_SERVER_TIMING` is enabled,
+sent to the browser in a `Server-Timing` header.
+
+Views can have a query budget in `BTELL_QUERY_BUDGETS` (by URL name). Requests going over budget
+are logged as warnings, or fail with `QueryBudgetExceeded` if `BTELL_QUERY_BUDGETS_STRICT` is set
+(as it is in the tests), so N+1 queries are caught before they are deployed.
+
+Measurements are collected in a context variable, so they also work for async views, whose queries
+run in a different thread (and connection) than the middleware. For that reason the query wrapper
+is installed on every database connection when it is created, rather than around each request.
+"""
+import contextvars
+import dataclasses
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from asgiref import sync
+from django import dispatch, http
+from django.core.cache.backends import filebased, locmem
+from django.db.backends import signals
+from django.template.backends import django as django_backend
+
+from btell import settings
+
+logger = logging.getLogger('btell_main.performance')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (in strict mode) when a view makes more queries than its budget allows."""
+
+
+@dataclasses.dataclass
+class RequestStats:
+    """Measurements of a single request."""
+    queries: int = 0
+    query_seconds: float = 0.0
+    template_seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar('btell_request_stats', default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Returns the measurements of the current request, or `None` outside of requests."""
+    return _stats.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - start
+
+
+@dispatch.receiver(signals.connection_created)
+def _instrument_connection(sender, connection, **kwargs):  # pylint:disable=unused-argument
+    # The wrappers stay on the connection object, which can reconnect several times.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class _TimedTemplate:
+    """Wraps a template of the Django template backend, to measure how long rendering takes."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _stats.get()
+        if stats is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with render times measured for `PerformanceMiddleware`.
+
+    Only templates loaded directly are measured; included templates count towards their parent.
+    """
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+_MISSING = object()
+
+
+class _CountingCacheMixin:
+    """Counts cache hits and misses for `PerformanceMiddleware`. Batch lookups count every key."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)  # type: ignore
+        stats = _stats.get()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+
+
+class LocMemCache(_CountingCacheMixin, locmem.LocMemCache):
+    """The local memory cache, with hits and misses counted."""
+
+
+class FileBasedCache(_CountingCacheMixin, filebased.FileBasedCache):
+    """The file based cache, with hits and misses counted."""
+
+
+def _server_timing(stats: RequestStats, total_seconds: float) -> str:
+    metrics = [
+        f'total;dur={total_seconds * 1000:.1f}',
+        f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries"',
+        f'tpl;dur={stats.template_seconds * 1000:.1f}',
+        f'cache;desc="{stats.cache_hits} hits, {stats.cache_misses} misses"',
+    ]
+    return ', '.join(metrics)
+
+
+def _log_record(request: http.HttpRequest, response: http.HttpResponse, url_name: Optional[str],
+                stats: RequestStats, total_seconds: float) -> Dict[str, Any]:
+    lookups = stats.cache_hits + stats.cache_misses
+    return {
+        'method': request.method,
+        'path': request.path,
+        'url_name': url_name,
+        'status': response.status_code,
+        'total_ms': round(total_seconds * 1000, 2),
+        'queries': stats.queries,
+        'query_ms': round(stats.query_seconds * 1000, 2),
+        'template_ms': round(stats.template_seconds * 1000, 2),
+        'cache_hits': stats.cache_hits,
+        'cache_misses': stats.cache_misses,
+        'cache_hit_rate': round(stats.cache_hits / lookups, 3) if lookups else None,
+    }
+
+
+def _finish(request: http.HttpRequest, response: http.HttpResponse, stats: RequestStats,
+            start: float) -> http.HttpResponse:
+    """Reports the measurements of the request, and checks its query budget."""
+    total_seconds = time.perf_counter() - start
+    match = getattr(request, 'resolver_match', None)
+    url_name = match.url_name if match else None
+    logger.info('%s', json.dumps(_log_record(request, response, url_name, stats, total_seconds)))
+    if settings.BTELL_SERVER_TIMING:
+        response['Server-Timing'] = _server_timing(stats, total_seconds)
+
+    budget = settings.BTELL_QUERY_BUDGETS.get(url_name) if url_name else None
+    if budget is not None and stats.queries > budget:
+        message = f"View '{url_name}' made {stats.queries} queries, over its budget of {budget}."
+        if settings.BTELL_QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+class PerformanceMiddleware:
+    """Measures each request, see the module documentation. Should be the first middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if sync.iscoroutinefunction(get_response):
+            sync.markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if sync.iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return _finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return _finish(request, response, stats, start)
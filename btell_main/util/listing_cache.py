@@ -0,0 +1,110 @@
+"""Cache of story list pages.
+
+A cached page is the ordered list of story ids on it (plus the cursor of the next page), keyed by
+the canonical form of the story filter and the page cursor. Stories are hydrated from their own
+cache entries, and only the missing ones are loaded from the database, with a single query. So
+a popular page which is already cached is served without touching the database at all.
+
+All entries carry the current generation in their key. Saving or deleting a story, changing its
+tags (which includes publishing it), or saving a tag starts a new generation, which makes all
+the older entries unreachable; they simply expire from the cache.
+
+Entries are always filled from the primary database. A lagging replica would otherwise fill the new
+generation with the pages from before the change, and everyone would be served those.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import time
+
+from django import dispatch
+from django.core.cache import cache
+from django.db.models import signals
+
+from btell import settings
+from btell_main import models
+from btell_main.util import filter_query, paging, replicas, story_query
+
+GENERATION_KEY = 'btell:listing:generation'
+PAGE_KEY = 'btell:listing:{generation}:page:{digest}'
+STORY_KEY = 'btell:listing:{generation}:story:{story_id}'
+
+
+def current_generation() -> int:
+    """Returns the current generation. Anything derived from the listed stories can be keyed by it."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Never reuse an older generation, even if the key was evicted.
+        generation = time.time_ns()
+        cache.add(GENERATION_KEY, generation, timeout=None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def invalidate():
+    """Starts a new generation, so all cached pages and stories are reloaded."""
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def canonical_filter(story_filter: filter_query.StoryFilter) -> Dict[str, Any]:
+    """Returns the canonical form of the filter: filters which select the same stories are equal."""
+    return {
+        'author': story_filter.author,
+        'tags': sorted({models.normalize_tag_name(tag) for tag in story_filter.tags}),
+        'completed': story_filter.completed,
+        'freeform': sorted(set(story_filter.freeform)),
+        'ordering': story_query.story_ordering(story_filter),
+    }
+
+
+def _page_digest(story_filter: filter_query.StoryFilter, cursor: Optional[str], page_size: int) -> str:
+    key = json.dumps([canonical_filter(story_filter), cursor, page_size], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def hydrate(story_ids: List[int], generation: int) -> List[models.Story]:
+    """Returns the stories with the given ids (in that order), loading those not cached with one query."""
+    keys = {story_id: STORY_KEY.format(generation=generation, story_id=story_id) for story_id in story_ids}
+    cached = cache.get_many(list(keys.values()))
+    stories = {story_id: cached[key] for story_id, key in keys.items() if key in cached}
+    missing = [story_id for story_id in story_ids if story_id not in stories]
+    if missing:
+        with replicas.primary_reads():
+            loaded = story_query.published_stories().in_bulk(missing)
+        cache.set_many({keys[story_id]: story for story_id, story in loaded.items()},
+                       timeout=settings.BTELL_LISTING_CACHE_TIMEOUT)
+        stories.update(loaded)
+    # Stories deleted since the page was cached are left out.
+    return [stories[story_id] for story_id in story_ids if story_id in stories]
+
+
+def story_page(story_filter: filter_query.StoryFilter, page_size: int, cursor: Optional[str] = None) -> paging.Page:
+    """Returns a page of the stories matching the filter, from the cache if possible.
+
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    generation = current_generation()
+    page_key = PAGE_KEY.format(generation=generation, digest=_page_digest(story_filter, cursor, page_size))
+    cached = cache.get(page_key)
+    if cached is not None:
+        return paging.Page(items=hydrate(cached['ids'], generation), next_cursor=cached['next_cursor'])
+
+    with replicas.primary_reads():
+        stories = story_query.build_story_queryset(story_filter)
+        page = paging.keyset_page(stories, story_query.story_ordering(story_filter), page_size, cursor)
+    cache.set(page_key, {'ids': [story.pk for story in page.items], 'next_cursor': page.next_cursor},
+              timeout=settings.BTELL_LISTING_CACHE_TIMEOUT)
+    cache.set_many({STORY_KEY.format(generation=generation, story_id=story.pk): story for story in page.items},
+                   timeout=settings.BTELL_LISTING_CACHE_TIMEOUT)
+    return page
+
+
+@dispatch.receiver(signals.post_save, sender=models.Story)
+@dispatch.receiver(signals.post_delete, sender=models.Story)
+@dispatch.receiver(signals.post_save, sender=models.Tags)
+@dispatch.receiver(signals.post_delete, sender=models.Tags)
+@dispatch.receiver(signals.m2m_changed, sender=models.Story.tags.through)  # pylint:disable=no-member
+def _listing_changed(sender, **kwargs):
+    del sender, kwargs
+    invalidate()
@@ -0,0 +1,38 @@
+"""A small, thread-safe, bounded LRU mapping."""
+from typing import Any, Hashable, Optional
+import collections
+import threading
+
+
+class LRUCache:
+    """Maps keys to values, dropping the least recently used entries past `max_size`."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Returns the value for the key (and marks it as recently used), or the default."""
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        """Stores the value for the key, evicting the oldest entry if the cache is full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
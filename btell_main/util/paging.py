@@ -0,0 +1,115 @@
+"""Keyset (cursor) pagination over ordered QuerySets.
+
+Instead of skipping `OFFSET` rows, each page remembers the sort key of its last row, and the next
+page continues with rows strictly after that key. This keeps deep pages as cheap as the first one,
+provided the ordering is backed by an index and ends with a unique field (such as the primary key).
+"""
+from typing import Any, List, Optional, Sequence
+import base64
+import binascii
+import dataclasses
+import datetime
+import json
+import math
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core import exceptions
+from django.db.models import Q, QuerySet
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder which keeps the full precision of datetimes (Django's drops the microseconds)."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+@dataclasses.dataclass
+class Page:
+    """A single page of results."""
+    items: List[Any]
+    # Opaque cursor for the next page, or `None` if this is the last page.
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encodes the sort key values into an opaque, URL-safe cursor string."""
+    raw = json.dumps(list(values), cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decodes a cursor created with `encode_cursor` into the list of (JSON) sort key values.
+
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as decode_error:
+        raise ValueError('Malformed page cursor.') from decode_error
+    if not isinstance(values, list):
+        raise ValueError('Malformed page cursor.')
+    return values
+
+
+def _after_key_filter(queryset: QuerySet, ordering: Sequence[str], cursor: str) -> Q:
+    """Builds the condition which selects rows strictly after the cursor, for the given ordering.
+
+    For the ordering `(-a, -b)` and the cursor `(x, y)` this is `a < x OR (a = x AND b < y)`.
+    """
+    values = decode_cursor(cursor)
+    if len(values) != len(ordering):
+        raise ValueError('Page cursor does not match the ordering.')
+
+    condition = Q()
+    equal_prefix = Q()
+    for order, raw_value in zip(ordering, values):
+        name = order.lstrip('-')
+        # Sort keys are always strings or finite numbers. Anything else was not created by us.
+        if (isinstance(raw_value, bool) or not isinstance(raw_value, (str, int, float))
+                or (isinstance(raw_value, float) and not math.isfinite(raw_value))):
+            raise ValueError('Malformed page cursor.')
+        try:
+            value = queryset.model._meta.get_field(name).to_python(raw_value)  # pylint:disable=protected-access
+        except exceptions.FieldDoesNotExist:
+            # Annotations (e.g. search rank) are plain JSON values.
+            value = raw_value
+        except (exceptions.ValidationError, TypeError, ValueError, OverflowError) as validation_error:
+            raise ValueError('Malformed page cursor.') from validation_error
+        lookup = 'lt' if order.startswith('-') else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def keyset_page(queryset: QuerySet, ordering: Sequence[str], page_size: int,
+                cursor: Optional[str] = None) -> Page:
+    """Returns a single page of the queryset, starting after the given cursor.
+
+    Args:
+        queryset: The rows to page through.
+        ordering: The `order_by` arguments for the queryset. These must be field or annotation names,
+            and the last one must be unique (usually `id` or `-id`), or rows may be skipped.
+        page_size: Maximum number of rows in the page.
+        cursor: The `next_cursor` of the previous page, or `None` for the first page.
+
+    Returns:
+        The requested page, evaluated with a single query.
+
+    Raises:
+        ValueError: if the cursor is malformed, or was created for a different ordering.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after_key_filter(queryset, ordering, cursor))
+    # Fetch one extra row, so we know if there is a next page without counting.
+    items = list(queryset[:page_size + 1])
+    page = Page(items=items[:page_size])
+    if len(items) > page_size:
+        last = page.items[-1]
+        page.next_cursor = encode_cursor([getattr(last, order.lstrip('-')) for order in ordering])
+    return page
@@ -0,0 +1,150 @@
+"""Write-behind buffer for the progress of readers (their current chapter).
+
+Most chapter transitions only move the reader, without changing any story variables. With
+`BTELL_PROGRESS_WRITE_BEHIND` enabled, `ReaderState.flush` doesn't write those to the database
+right away, but records them here. A background thread of each process then writes the buffered
+progress every `BTELL_PROGRESS_FLUSH_SECONDS` (or as soon as `BTELL_PROGRESS_BUFFER_SIZE` readers
+are waiting), with one bulk update per batch. Several moves of the same reader are coalesced into
+one update.
+
+The buffer is flushed when the process exits, so no progress is lost on a graceful shutdown. Only
+one flush runs at a time, so this final flush also waits for a batch the background thread is
+still writing.
+
+Until it is flushed, the progress is also kept in the cache, and `apply_pending` lays it over
+readers loaded from the database. With a cache shared between processes (see `BTELL_CACHE_DIR`),
+readers see their own progress even if their next request goes to another worker.
+"""
+import atexit
+import dataclasses
+import datetime
+import logging
+import threading
+from typing import Dict, Optional
+
+from django import db
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, IntegerField, Value, When
+from django.utils import timezone
+
+from btell import settings
+from btell_main import models
+
+CACHE_KEY = 'btell:reader_progress:{reader_id}'
+# How long buffered progress stays in the cache. Only needs to outlive the next flush.
+CACHE_TIMEOUT = 3600
+# Number of readers written by a single bulk update.
+BATCH_SIZE = 500
+
+
+@dataclasses.dataclass(frozen=True)
+class Progress:
+    """Progress of a reader which was not written to the database yet."""
+    chapter_id: int
+    last_updated: datetime.datetime
+
+
+_lock = threading.Lock()
+# Held for the whole of a flush, which takes progress out of `_pending` before writing it.
+_flush_lock = threading.Lock()
+_pending: Dict[int, Progress] = {}
+_wake_up = threading.Event()
+_flusher: Optional[threading.Thread] = None
+
+
+def _ensure_flusher():
+    """Starts the background flusher of this process, if it doesn't run yet. Called with `_lock` held."""
+    global _flusher  # pylint:disable=global-statement
+    if _flusher is None and settings.BTELL_PROGRESS_FLUSH_SECONDS:
+        _flusher = threading.Thread(target=_flush_periodically, name='btell-progress-flusher', daemon=True)
+        _flusher.start()
+
+
+def record(reader: models.StoryReader):
+    """Buffers the current chapter of the reader (and sets its `last_updated`)."""
+    progress = Progress(chapter_id=reader.current_chapter_id, last_updated=timezone.now())  # type: ignore
+    reader.last_updated = progress.last_updated
+    with _lock:
+        _pending[reader.pk] = progress
+        _ensure_flusher()
+        full = len(_pending) >= settings.BTELL_PROGRESS_BUFFER_SIZE
+    cache.set(CACHE_KEY.format(reader_id=reader.pk), progress, timeout=CACHE_TIMEOUT)
+    if full:
+        _wake_up.set()
+
+
+def discard(reader_id: int):
+    """Drops the buffered progress of the reader, because it is being written directly."""
+    with _lock:
+        _pending.pop(reader_id, None)
+    cache.delete(CACHE_KEY.format(reader_id=reader_id))
+
+
+def apply_pending(reader: models.StoryReader):
+    """Updates the reader with its buffered progress, if there is any newer than the database.
+
+    The progress may have been buffered by this process, or (more recently) by another one, so the
+    newest of the two is used.
+    """
+    with _lock:
+        local = _pending.get(reader.pk)
+    shared = cache.get(CACHE_KEY.format(reader_id=reader.pk))
+    for progress in (local, shared):
+        if progress is not None and progress.last_updated > reader.last_updated:
+            reader.current_chapter_id = progress.chapter_id  # type: ignore
+            reader.last_updated = progress.last_updated
+
+
+def pending_count() -> int:
+    """Returns the number of readers whose progress is waiting to be written."""
+    with _lock:
+        return len(_pending)
+
+
+def flush():
+    """Writes all the buffered progress of this process to the database.
+
+    Waits for a flush which is already running (e.g. in the background thread) to finish first.
+    """
+    with _flush_lock:
+        with _lock:
+            batch = dict(_pending)
+            _pending.clear()
+        reader_ids = list(batch)
+        for start in range(0, len(reader_ids), BATCH_SIZE):
+            chunk = {reader_id: batch[reader_id] for reader_id in reader_ids[start:start + BATCH_SIZE]}
+            try:
+                _write_batch(chunk)
+            except Exception:
+                # Keep what wasn't written for the next flush, unless the readers moved on since.
+                with _lock:
+                    for reader_id in reader_ids[start:]:
+                        _pending.setdefault(reader_id, batch[reader_id])
+                raise
+
+
+def _write_batch(batch: Dict[int, Progress]):
+    # A single UPDATE, which skips readers saved directly (with newer progress) in the meantime. The
+    # check is part of the statement, so a direct write can't slip in between and be overwritten.
+    chapters = Case(*[When(pk=reader_id, then=Value(progress.chapter_id)) for reader_id, progress in batch.items()],
+                    output_field=IntegerField())
+    times = Case(*[When(pk=reader_id, then=Value(progress.last_updated)) for reader_id, progress in batch.items()],
+                 output_field=DateTimeField())
+    models.StoryReader.objects.filter(pk__in=batch, last_updated__lt=times).update(  # pylint:disable=no-member
+        current_chapter=chapters, last_updated=times)
+
+
+def _flush_periodically():
+    while True:
+        _wake_up.wait(timeout=settings.BTELL_PROGRESS_FLUSH_SECONDS)
+        _wake_up.clear()
+        try:
+            flush()
+        except Exception:  # pylint:disable=broad-except
+            logging.exception('Writing buffered reader progress failed.')
+        finally:
+            # This thread only wakes up every few seconds, so it shouldn't hold on to a connection.
+            db.connection.close()
+
+
+atexit.register(flush)
@@ -0,0 +1,183 @@
+"""Loads and saves the whole state of a reader (current chapter and story variables) at once.
+
+Story variables are kept in a plain dictionary while a request works with them. Loading takes one
+query, and `ReaderState.flush` writes only the variables which changed, with a single upsert (plus
+one `DELETE` if variables were removed), inside one transaction.
+
+If `BTELL_READER_VARS_PACKED` is enabled, the variables are instead stored as a compact blob on the
+`StoryReader` row itself (see `pack_variables`), so loading them needs no extra query and saving
+them is part of the reader update. Readers saved before the packed mode was enabled are read from
+their `StoryReaderVars` rows once, and packed on their next flush, which also deletes the rows. The
+same works the other way around when the packed mode is turned off again.
+"""
+from typing import Dict, Optional
+import struct
+
+from asgiref import sync
+from django.db import transaction
+from django.utils import timezone
+
+from btell import settings
+from btell_main import models
+from btell_main.util import progress_buffer, story_dsl
+
+# Each packed variable is the length of its (UTF-8) name, the name, and the value as a signed short.
+_PACKED_HEADER = struct.Struct('<B')
+_PACKED_VALUE = struct.Struct('<h')
+
+
+def pack_variables(variables: Dict[str, int]) -> bytes:
+    """Packs story variables into a compact blob."""
+    parts = []
+    for name, value in sorted(variables.items()):
+        encoded = name.encode('utf-8')
+        parts.append(_PACKED_HEADER.pack(len(encoded)))
+        parts.append(encoded)
+        parts.append(_PACKED_VALUE.pack(value))
+    return b''.join(parts)
+
+
+def unpack_variables(blob: bytes) -> Dict[str, int]:
+    """Unpacks story variables packed with `pack_variables`.
+
+    Raises:
+        ValueError: if the blob is malformed.
+    """
+    variables = {}
+    pos = 0
+    blob = bytes(blob)
+    try:
+        while pos < len(blob):
+            (length,) = _PACKED_HEADER.unpack_from(blob, pos)
+            pos += _PACKED_HEADER.size
+            name = blob[pos:pos + length].decode('utf-8')
+            pos += length
+            (variables[name],) = _PACKED_VALUE.unpack_from(blob, pos)
+            pos += _PACKED_VALUE.size
+    except (struct.error, UnicodeDecodeError) as unpack_error:
+        raise ValueError('Malformed packed story variables.') from unpack_error
+    return variables
+
+
+class ReaderState:
+    """The state of a reader, with all of their story variables loaded into `variables`."""
+
+    def __init__(self, reader: models.StoryReader, variables: Dict[str, int], packed: bool):
+        self.reader = reader
+        self.variables = variables
+        self.packed = packed
+        # Values as they are in the database, to find out what changed.
+        self._saved = dict(variables)
+        self._moved = False
+        # Whether the variables are stored in the other mode, and have to be moved on the next flush.
+        self._convert = False
+
+    @staticmethod
+    def load(reader: models.StoryReader, packed: Optional[bool] = None) -> 'ReaderState':
+        """Loads the variables of the reader.
+
+        Args:
+            reader: The reader whose state we want.
+            packed: Whether to use the packed storage mode. Defaults to `BTELL_READER_VARS_PACKED`.
+        """
+        if packed is None:
+            packed = settings.BTELL_READER_VARS_PACKED
+        if settings.BTELL_PROGRESS_WRITE_BEHIND:
+            progress_buffer.apply_pending(reader)
+        if reader.packed_vars is not None:
+            return ReaderState._loaded(reader, unpack_variables(reader.packed_vars), packed, stored_packed=True)
+        rows = models.StoryReaderVars.objects.filter(reader=reader)  # pylint:disable=no-member
+        variables = dict(rows.values_list('variable_name', 'variable_value'))
+        return ReaderState._loaded(reader, variables, packed, stored_packed=False)
+
+    @staticmethod
+    async def aload(reader: models.StoryReader, packed: Optional[bool] = None) -> 'ReaderState':
+        """Async version of `load`."""
+        if packed is None:
+            packed = settings.BTELL_READER_VARS_PACKED
+        if settings.BTELL_PROGRESS_WRITE_BEHIND:
+            progress_buffer.apply_pending(reader)
+        if reader.packed_vars is not None:
+            return ReaderState._loaded(reader, unpack_variables(reader.packed_vars), packed, stored_packed=True)
+        rows = models.StoryReaderVars.objects.filter(reader=reader)  # pylint:disable=no-member
+        variables = {name: value async for name, value in rows.values_list('variable_name', 'variable_value')}
+        return ReaderState._loaded(reader, variables, packed, stored_packed=False)
+
+    @staticmethod
+    def _loaded(reader: models.StoryReader, variables: Dict[str, int], packed: bool,
+                stored_packed: bool) -> 'ReaderState':
+        state = ReaderState(reader, variables, packed)
+        if packed != stored_packed:
+            # Stored in the other mode, so make sure the next flush moves the variables over.
+            state._saved = {}  # pylint:disable=protected-access
+            state._moved = True  # pylint:disable=protected-access
+            state._convert = True  # pylint:disable=protected-access
+        return state
+
+    def follow_link(self, link: models.ChapterLink):
+        """Moves the reader along the link, applying its action to the variables."""
+        story_dsl.apply_action(link, self.variables)
+        self.reader.current_chapter_id = link.to_chapter_id  # type: ignore
+        self._moved = True
+
+    def is_dirty(self) -> bool:
+        """Returns `True` if there are changes which were not flushed yet."""
+        return self._moved or self.variables != self._saved
+
+    def flush(self):
+        """Writes all changes to the database, in a single transaction.
+
+        If only the current chapter changed and `BTELL_PROGRESS_WRITE_BEHIND` is enabled, the change
+        goes to the write-behind buffer (`util.progress_buffer`) instead.
+        """
+        if not self.is_dirty():
+            return
+        if settings.BTELL_PROGRESS_WRITE_BEHIND:
+            if self.variables == self._saved and not self._convert:
+                progress_buffer.record(self.reader)
+                self._moved = False
+                return
+            # Written right away, so older buffered progress must not overwrite it later.
+            progress_buffer.discard(self.reader.pk)
+        with transaction.atomic():
+            update_fields = ['current_chapter', 'last_updated']
+            if self._convert:
+                # Whatever stays behind in the old mode would be read back if the mode is switched again.
+                models.StoryReaderVars.objects.filter(reader=self.reader).delete()  # pylint:disable=no-member
+                self.reader.packed_vars = None
+                update_fields.append('packed_vars')
+            if self.packed:
+                self.reader.packed_vars = pack_variables(self.variables)
+                if 'packed_vars' not in update_fields:
+                    update_fields.append('packed_vars')
+            else:
+                self._flush_rows()
+            self.reader.last_updated = timezone.now()
+            self.reader.save(update_fields=update_fields)
+        self._saved = dict(self.variables)
+        self._moved = False
+        self._convert = False
+
+    async def aflush(self):
+        """Async version of `flush`. Transactions have no async API, so it runs in the database thread."""
+        if not self.is_dirty():
+            return
+        if settings.BTELL_PROGRESS_WRITE_BEHIND and self.variables == self._saved and not self._convert:
+            self.flush()  # Only buffers the progress, without touching the database.
+        else:
+            await sync.sync_to_async(self.flush)()
+
+    def _flush_rows(self):
+        """Upserts changed variables and deletes removed ones, as `StoryReaderVars` rows."""
+        changed = [
+            models.StoryReaderVars(reader=self.reader, variable_name=name, variable_value=value)
+            for name, value in self.variables.items() if self._saved.get(name) != value
+        ]
+        if changed:
+            models.StoryReaderVars.objects.bulk_create(  # pylint:disable=no-member
+                changed, update_conflicts=True, unique_fields=['reader', 'variable_name'],
+                update_fields=['variable_value'])
+        removed = [name for name in self._saved if name not in self.variables]
+        if removed:
+            models.StoryReaderVars.objects.filter(  # pylint:disable=no-member
+                reader=self.reader, variable_name__in=removed).delete()
@@ -0,0 +1,159 @@
+"""Routing reads of the reading and listing views to database replicas.
+
+Only views decorated with `read_from_replica` read from a replica (one of `BTELL_DB_REPLICAS`, picked
+once per request), and only for safe (GET, HEAD, OPTIONS) requests. All other queries, and every write, go
+to the primary (`default`) database.
+
+Replicas lag behind the primary, so a user who just wrote something (posted a comment, followed a
+link, logged in) might not see it on the next page. To avoid that, `PrimaryPinningMiddleware`
+sets a cookie after any request which wrote to the database, and all requests carrying that cookie
+read from the primary for the next `BTELL_REPLICA_PIN_SECONDS`.
+
+Reads whose results outlive the request, such as pages stored in the shared cache, must not be
+stale either, so they are made from the primary with `primary_reads`.
+"""
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import random
+import time
+from typing import Callable, Optional
+
+from asgiref import sync
+from django import http
+
+from btell import settings
+
+PIN_COOKIE = 'btell_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@dataclasses.dataclass
+class _RequestState:
+    """Routing state of the current request."""
+    pinned: bool
+    replica: Optional[str] = None
+    wrote: bool = False
+
+
+_request_state: contextvars.ContextVar[Optional[_RequestState]] = contextvars.ContextVar(
+    'btell_replica_state', default=None)
+
+
+def _is_pinned(request: http.HttpRequest) -> bool:
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    """Database router which sends the reads of replica-enabled views to the replica of the request."""
+
+    def db_for_read(self, model, **hints):  # pylint:disable=unused-argument
+        state = _request_state.get()
+        if state is None or state.wrote:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):  # pylint:disable=unused-argument
+        state = _request_state.get()
+        if state is not None:
+            # Read our own writes for the rest of the request, and pin the following requests.
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint:disable=unused-argument
+        # The replicas hold the same data as the primary.
+        databases = {'default', *settings.BTELL_DB_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:  # pylint:disable=protected-access
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):  # pylint:disable=unused-argument
+        # Replicas get their schema from the primary.
+        if db in settings.BTELL_DB_REPLICAS:
+            return False
+        return None
+
+
+def _use_replica(request: http.HttpRequest) -> None:
+    state = _request_state.get()
+    if state is None or state.pinned or request.method not in SAFE_METHODS or not settings.BTELL_DB_REPLICAS:
+        return
+    state.replica = random.choice(settings.BTELL_DB_REPLICAS)
+
+
+def read_from_replica(view: Callable) -> Callable:
+    """Decorator for views whose reads may be served by a replica (on safe requests)."""
+    if sync.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            _use_replica(request)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _use_replica(request)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Sends the reads inside the block to the primary, even in views decorated with `read_from_replica`."""
+    state = _request_state.get()
+    if state is None or state.replica is None:
+        yield
+        return
+    replica, state.replica = state.replica, None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+def _pin_writer(request: http.HttpRequest, state: _RequestState,
+                response: http.HttpResponse) -> http.HttpResponse:
+    """Pins the user to the primary database, if the request wrote to it (or could have)."""
+    if state.wrote or request.method not in SAFE_METHODS:
+        seconds = settings.BTELL_REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+class PrimaryPinningMiddleware:
+    """Tracks writes of each request for `ReplicaRouter`, and pins writers to the primary database.
+
+    Must come before the session middleware, so that session writes are noticed too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if sync.iscoroutinefunction(get_response):
+            sync.markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if sync.iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState(pinned=_is_pinned(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return _pin_writer(request, state, response)
+
+    async def __acall__(self, request):
+        state = _RequestState(pinned=_is_pinned(request))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return _pin_writer(request, state, response)
@@ -0,0 +1,147 @@
+"""Full-text search over stories, for the freeform terms of a story filter.
+
+Each story gets one document in a full-text index, made from its title, description and (if
+`BTELL_SEARCH_CHAPTER_CONTENT` is enabled) the contents of its chapters. The index itself is
+backend-specific:
+
+- SQLite: an FTS5 virtual table, `btell_main_story_fts`, with the story id as the rowid.
+- PostgreSQL: a `btell_main_story_search` table holding a `tsvector` per story, with a GIN index.
+
+Both tables are created by migrations, and kept in sync by the signal receivers at the bottom of
+this module. Other database backends fall back to plain `icontains` matching, without ranking.
+"""
+from typing import List, Optional, Tuple
+
+from django import dispatch
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, QuerySet, signals
+from django.db.models.expressions import RawSQL
+
+from btell import settings
+from btell_main import models
+
+SQLITE_TABLE = 'btell_main_story_fts'
+POSTGRES_TABLE = 'btell_main_story_search'
+# Relative weights of title, description and chapter content matches in the SQLite ranking.
+SQLITE_WEIGHTS = '10.0, 5.0, 1.0'
+
+
+def supports_ranking() -> bool:
+    """Returns `True` if the database has a full-text index we can rank results with."""
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def fts5_match_expression(literals: List[str]) -> str:
+    """Builds an FTS5 MATCH expression which matches any of the literals.
+
+    Every literal is quoted, so literals with several words (from quoted filter terms) become
+    phrase queries, and none of the FTS5 query syntax can leak in from user input.
+    """
+    return ' OR '.join('"' + literal.replace('"', '""') + '"' for literal in literals)
+
+
+def _postgres_tsquery(literals: List[str]) -> Tuple[str, List[str]]:
+    """Builds a tsquery expression which matches any of the literals, as phrases."""
+    sql = ' || '.join(["phraseto_tsquery('simple', %s)"] * len(literals))
+    return f'({sql})', list(literals)
+
+
+def search_stories(stories: QuerySet, literals: List[str]) -> QuerySet:
+    """Restricts the stories to those matching any of the literals.
+
+    On backends with a full-text index, the matches are looked up in the index, and each story is
+    annotated with `search_rank` (higher is more relevant). The result is still a single query.
+    """
+    if connection.vendor == 'sqlite':
+        match = fts5_match_expression(literals)
+        story_ids = RawSQL(f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT -bm25({SQLITE_TABLE}, {SQLITE_WEIGHTS}) FROM {SQLITE_TABLE} '
+            f'WHERE {SQLITE_TABLE} MATCH %s AND {SQLITE_TABLE}.rowid = btell_main_story.id',
+            [match], output_field=FloatField())
+        return stories.filter(pk__in=story_ids).annotate(search_rank=rank)
+    if connection.vendor == 'postgresql':
+        tsquery, params = _postgres_tsquery(literals)
+        story_ids = RawSQL(f'SELECT story_id FROM {POSTGRES_TABLE} WHERE document @@ {tsquery}', params)
+        rank = RawSQL(
+            f'SELECT ts_rank(document, {tsquery}) FROM {POSTGRES_TABLE} '
+            f'WHERE story_id = btell_main_story.id', params, output_field=FloatField())
+        return stories.filter(pk__in=story_ids).annotate(search_rank=rank)
+
+    # No full-text index, so any of the words may match, either in the title or in the description.
+    words = Q()
+    for literal in literals:
+        words |= Q(title__icontains=literal) | Q(description__icontains=literal)
+    return stories.filter(words)
+
+
+def _chapter_text(story_id: int) -> str:
+    """Returns the text of all the chapters in the story, if chapter content should be searchable."""
+    if not settings.BTELL_SEARCH_CHAPTER_CONTENT:
+        return ''
+    chapters = models.Chapter.objects.filter(story_id=story_id)  # pylint:disable=no-member
+    return '\n'.join(chapters.order_by('id').values_list('content', flat=True))
+
+
+def index_story(story: models.Story, chapter_text: Optional[str] = None):
+    """Writes (or replaces) the search document of a story.
+
+    Args:
+        story: The story to index.
+        chapter_text: The searchable chapter content. If `None`, it is loaded from the database.
+    """
+    if chapter_text is None:
+        chapter_text = _chapter_text(story.pk)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [story.pk])
+            cursor.execute(f'INSERT INTO {SQLITE_TABLE} (rowid, title, description, content) VALUES (%s, %s, %s, %s)',
+                           [story.pk, story.title, story.description, chapter_text])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {POSTGRES_TABLE} (story_id, document) VALUES (%s, '
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'D')) "
+                'ON CONFLICT (story_id) DO UPDATE SET document = EXCLUDED.document',
+                [story.pk, story.title, story.description, chapter_text])
+
+
+def remove_story(story_id: int):
+    """Removes the search document of a story."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [story_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE story_id = %s', [story_id])
+
+
+def rebuild_index() -> int:
+    """Re-indexes every story. Returns the number of indexed stories."""
+    count = 0
+    with transaction.atomic():
+        for story in models.Story.objects.all().iterator():  # pylint:disable=no-member
+            index_story(story)
+            count += 1
+    return count
+
+
+@dispatch.receiver(signals.post_save, sender=models.Story)
+def _story_saved(sender, instance: models.Story, **kwargs):
+    del sender, kwargs
+    index_story(instance)
+
+
+@dispatch.receiver(signals.post_delete, sender=models.Story)
+def _story_deleted(sender, instance: models.Story, **kwargs):
+    del sender, kwargs
+    remove_story(instance.pk)
+
+
+@dispatch.receiver(signals.post_save, sender=models.Chapter)
+@dispatch.receiver(signals.post_delete, sender=models.Chapter)
+def _chapter_changed(sender, instance: models.Chapter, **kwargs):
+    del sender, kwargs
+    if settings.BTELL_SEARCH_CHAPTER_CONTENT:
+        story = models.Story.objects.filter(pk=instance.story_id).first()  # type: ignore pylint:disable=no-member
+        if story:
+            index_story(story)
@@ -0,0 +1,87 @@
+"""In-process cache of the site settings (the `SiteSettings` singleton).
+
+The site settings are needed on every page (to resolve the default theme), but they hardly ever
+change. Each process keeps the settings in memory, together with the version they were loaded at.
+The current version lives in the shared cache, so checking that the settings are still fresh is a
+single cache lookup, and the database is only read again after the settings have been saved.
+
+Saving (or deleting) the settings starts a new version once the change is committed, which makes
+every process reload them (from the primary database) on its next request. With a cache shared
+between processes (see `BTELL_CACHE_DIR`), this applies to all workers; otherwise each worker only
+notices its own changes.
+"""
+import threading
+import time
+from typing import Optional, Tuple
+
+from asgiref import sync
+from django import dispatch
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import signals
+
+from btell_main import models
+from btell_main.util import replicas
+
+VERSION_KEY = 'btell:site_settings:version'
+
+_lock = threading.Lock()
+# The settings of this process, with the version they were loaded at.
+_loaded: Optional[Tuple[int, models.SiteSettings]] = None
+
+
+def _version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Never reuse an older version, even if the key was evicted.
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _current(version: int) -> Optional[models.SiteSettings]:
+    with _lock:
+        if _loaded is not None and _loaded[0] == version:
+            return _loaded[1]
+    return None
+
+
+def _load(version: int) -> models.SiteSettings:
+    """Loads the settings from the database, and keeps them as those of `version`."""
+    global _loaded  # pylint:disable=global-statement
+    # The version was read before loading, so a concurrent save can only make us reload needlessly.
+    # A lagging replica could still have the old settings, which we would then keep for good.
+    with replicas.primary_reads():
+        site_settings = models.SiteSettings.load()
+    with _lock:
+        _loaded = (version, site_settings)
+    return site_settings
+
+
+def get() -> models.SiteSettings:
+    """Returns the site settings, which must not be modified (load them with `SiteSettings.load` for that)."""
+    version = _version()
+    return _current(version) or _load(version)
+
+
+async def aget() -> models.SiteSettings:
+    """Async version of `get`. Only touches the database (in a thread) if the settings changed."""
+    version = await sync.sync_to_async(_version)()
+    return _current(version) or await sync.sync_to_async(_load)(version)
+
+
+def invalidate():
+    """Starts a new version, so all processes reload the settings."""
+    global _loaded  # pylint:disable=global-statement
+    with _lock:
+        _loaded = None
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+@dispatch.receiver(signals.post_save, sender=models.SiteSettings)
+@dispatch.receiver(signals.post_delete, sender=models.SiteSettings)
+def _site_settings_changed(sender, **kwargs):
+    del sender, kwargs
+    # Until the change is committed, other processes would load the old settings for the new version.
+    transaction.on_commit(invalidate)
@@ -0,0 +1,287 @@
+"""Parser and evaluator for the story DSL used by `ChapterLink.condition` and `ChapterLink.action`.
+
+The DSL works on the integer story variables of a reader (see `StoryReaderVars`). Variables which
+were never set evaluate to 0.
+
+Conditions are expressions, for example:
+
+    has_sword and (gold >= 10 or not guard_awake)
+
+Actions are assignments separated by semicolons, for example:
+
+    gold -= 10; has_sword = 1
+
+Expressions support integers, `true`/`false`, variable names, the arithmetic operators
+`+ - * / %` (`/` is integer division, and dividing by zero gives 0), the comparisons
+`== != < <= > >=`, and the logical operators `and`, `or` and `not` (also written as `&&`, `||`
+and `!`). Comparisons and logical operators evaluate to 1 or 0.
+Expressions nested more than `MAX_NESTING` levels deep, or longer than `MAX_TERMS` terms, are
+rejected as malformed.
+
+Variables of a reader are loaded with `reader_state.ReaderState`. Each expression is parsed once and compiled into a tree of closures, which is cached per link in
+a bounded LRU keyed by `(link id, last_update)`, so editing a link invalidates its entry.
+"""
+from typing import Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional, Tuple
+import logging
+import operator
+import re
+
+from btell import settings
+from btell_main import models
+from btell_main.util import lru
+
+Variables = Mapping[str, int]
+Expression = Callable[[Variables], int]
+Action = Callable[[MutableMapping[str, int]], None]
+
+# Story variables are stored as `SmallIntegerField`s, so assignments are clamped to that range.
+MIN_VALUE = -32768
+MAX_VALUE = 32767
+
+# Limits on expressions, so that parsing and evaluating them (both recursive) stays well within the
+# recursion limit of Python, whatever authors write. Nesting counts parentheses and unary operators.
+MAX_NESTING = 32
+MAX_TERMS = 256
+
+_TOKEN_RE = re.compile(r'\s*(?:(\d+)|([A-Za-z_][A-Za-z0-9_]*)|(==|!=|<=|>=|\+=|-=|&&|\|\||[-+*/%()<>=!;]))')
+_KEYWORDS = {'and': '&&', 'or': '||', 'not': '!'}
+_CONSTANTS = {'true': 1, 'false': 0}
+
+_BINARY_OPERATORS: Dict[str, Callable[[int, int], int]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': lambda a, b: a // b if b else 0,
+    '%': lambda a, b: a % b if b else 0,
+    '==': lambda a, b: int(a == b),
+    '!=': lambda a, b: int(a != b),
+    '<': lambda a, b: int(a < b),
+    '<=': lambda a, b: int(a <= b),
+    '>': lambda a, b: int(a > b),
+    '>=': lambda a, b: int(a >= b),
+}
+# Binary operator precedence levels, from loosest to tightest binding.
+_PRECEDENCE: List[Tuple[str, ...]] = [
+    ('||',),
+    ('&&',),
+    ('==', '!='),
+    ('<', '<=', '>', '>='),
+    ('+', '-'),
+    ('*', '/', '%'),
+]
+
+
+def _tokenize(source: str) -> List[Tuple[str, str]]:
+    """Splits the source into `(kind, text)` tokens, where kind is 'num', 'name' or 'op'."""
+    tokens = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = _TOKEN_RE.match(source, pos)
+        if not match:
+            raise SyntaxError(f"Unexpected character in story expression: '{source[pos:].strip()[0]}'")
+        number, name, symbol = match.groups()
+        if number is not None:
+            tokens.append(('num', number))
+        elif name is not None:
+            lowered = name.lower()
+            if lowered in _KEYWORDS:
+                tokens.append(('op', _KEYWORDS[lowered]))
+            elif lowered in _CONSTANTS:
+                tokens.append(('num', str(_CONSTANTS[lowered])))
+            else:
+                tokens.append(('name', name))
+        else:
+            tokens.append(('op', symbol))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser, which compiles straight into closures."""
+
+    def __init__(self, source: str):
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.nesting = 0
+        self.terms = 0
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _accept(self, *ops: str) -> Optional[str]:
+        token = self._peek()
+        if token and token[0] == 'op' and token[1] in ops:
+            self.pos += 1
+            return token[1]
+        return None
+
+    def _expect_end(self):
+        token = self._peek()
+        if token:
+            raise SyntaxError(f"Unexpected '{token[1]}' in story expression.")
+
+    def _enter(self):
+        self.nesting += 1
+        if self.nesting > MAX_NESTING:
+            raise SyntaxError(f'Story expression is nested more than {MAX_NESTING} levels deep.')
+
+    def _term(self):
+        self.terms += 1
+        if self.terms > MAX_TERMS:
+            raise SyntaxError(f'Story expression has more than {MAX_TERMS} terms.')
+
+    def expression(self, level: int = 0) -> Expression:
+        """Parses a binary expression at the given precedence level."""
+        if level == len(_PRECEDENCE):
+            return self._unary()
+        left = self.expression(level + 1)
+        while True:
+            op = self._accept(*_PRECEDENCE[level])
+            if not op:
+                return left
+            right = self.expression(level + 1)
+            self._term()
+            left = _binary(op, left, right)
+
+    def _unary(self) -> Expression:
+        if self._accept('!'):
+            self._enter()
+            operand = self._unary()
+            self.nesting -= 1
+            return lambda variables: int(not operand(variables))
+        if self._accept('-'):
+            self._enter()
+            negated = self._unary()
+            self.nesting -= 1
+            return lambda variables: -negated(variables)
+        return self._atom()
+
+    def _atom(self) -> Expression:
+        token = self._peek()
+        if token is None:
+            raise SyntaxError('Unexpected end of story expression.')
+        self.pos += 1
+        self._term()
+        kind, text = token
+        if kind == 'num':
+            value = int(text)
+            return lambda variables: value
+        if kind == 'name':
+            return lambda variables: variables.get(text, 0)
+        if text == '(':
+            self._enter()
+            inner = self.expression()
+            if not self._accept(')'):
+                raise SyntaxError("Missing ')' in story expression.")
+            self.nesting -= 1
+            return inner
+        raise SyntaxError(f"Unexpected '{text}' in story expression.")
+
+    def condition(self) -> Expression:
+        """Parses a whole condition."""
+        result = self.expression()
+        self._expect_end()
+        return result
+
+    def actions(self) -> Action:
+        """Parses a whole list of assignments."""
+        assignments: List[Tuple[str, str, Expression]] = []
+        while self._peek():
+            if self._accept(';'):
+                continue
+            token = self._peek()
+            if token is None or token[0] != 'name':
+                raise SyntaxError('Expected a variable name to assign to.')
+            self.pos += 1
+            op = self._accept('=', '+=', '-=')
+            if not op:
+                raise SyntaxError(f"Expected '=', '+=' or '-=' after '{token[1]}'.")
+            self.terms = 0
+            assignments.append((token[1], op, self.expression()))
+            if self._peek() and not self._accept(';'):
+                raise SyntaxError(f"Expected ';' between assignments, found '{self.tokens[self.pos][1]}'.")
+        return _assignments(assignments)
+
+
+def _binary(op: str, left: Expression, right: Expression) -> Expression:
+    if op == '&&':
+        return lambda variables: int(bool(left(variables)) and bool(right(variables)))
+    if op == '||':
+        return lambda variables: int(bool(left(variables)) or bool(right(variables)))
+    func = _BINARY_OPERATORS[op]
+    return lambda variables: func(left(variables), right(variables))
+
+
+def _assignments(assignments: List[Tuple[str, str, Expression]]) -> Action:
+    def run(variables: MutableMapping[str, int]):
+        for name, op, expression in assignments:
+            value = expression(variables)
+            if op == '+=':
+                value = variables.get(name, 0) + value
+            elif op == '-=':
+                value = variables.get(name, 0) - value
+            variables[name] = max(MIN_VALUE, min(MAX_VALUE, value))
+    return run
+
+
+def compile_condition(source: str) -> Expression:
+    """Compiles a condition. Raises `SyntaxError` if it is malformed."""
+    return _Parser(source).condition()
+
+
+def compile_action(source: str) -> Action:
+    """Compiles a list of assignments. Raises `SyntaxError` if it is malformed."""
+    return _Parser(source).actions()
+
+
+def _always_true(variables: Variables) -> int:
+    del variables
+    return 1
+
+
+def _no_action(variables: MutableMapping[str, int]):
+    del variables
+
+
+_compiled_links = lru.LRUCache(settings.BTELL_DSL_CACHE_SIZE)
+
+
+def _compiled_link(link: models.ChapterLink) -> Tuple[Expression, Action]:
+    """Returns the compiled condition and action of the link, from the cache if possible.
+
+    Links with malformed expressions are logged once (per version) and compiled into a condition
+    which hides them, so a broken link can't crash the chapter that shows it.
+    """
+    key = (link.pk, link.last_update)
+    compiled = _compiled_links.get(key)
+    if compiled is None:
+        try:
+            condition = compile_condition(link.condition) if link.condition else _always_true
+            action = compile_action(link.action) if link.action else _no_action
+        except SyntaxError as syntax_error:
+            logging.warning("Malformed story DSL in chapter link %s: %s", link.pk, syntax_error)
+            condition, action = (lambda variables: 0), _no_action
+        compiled = (condition, action)
+        _compiled_links.put(key, compiled)
+    return compiled
+
+
+def evaluate_condition(link: models.ChapterLink, variables: Variables) -> bool:
+    """Returns `True` if the link should be shown to a reader with the given variables."""
+    return bool(_compiled_link(link)[0](variables))
+
+
+def apply_action(link: models.ChapterLink, variables: MutableMapping[str, int]):
+    """Applies the action of the link (taken by a reader) to the given variables, in place."""
+    _compiled_link(link)[1](variables)
+
+
+def visible_links(links: Iterable[models.ChapterLink], variables: Variables) -> List[models.ChapterLink]:
+    """Filters the links down to those whose conditions hold for the given variables."""
+    return [link for link in links if evaluate_condition(link, variables)]
+
+
+def clear_cache():
+    """Drops all compiled expressions."""
+    _compiled_links.clear()
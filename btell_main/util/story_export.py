@@ -0,0 +1,204 @@
+"""Streaming export and import of whole stories (the story, its tags, chapters and links).
+
+A story is exported as a stream of records, one JSON object per line: first the story itself,
+then all of its chapters, then all of its links. Chapters and links are read from the database in
+chunks, so exporting takes constant memory regardless of the size of the story. The stream can
+be gzip-compressed.
+
+Importing creates a new story, and inserts chapters and links in batches with `bulk_create`. Ids
+are not preserved: links refer to chapters by their exported ids, which are remapped on import.
+"""
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional
+import gzip
+import json
+
+from django.contrib.auth import models as auth_models
+from django.db import transaction
+from django.utils import dateparse
+
+from btell_main import models
+from btell_main.util import search
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 500
+GZIP_MAGIC = b'\x1f\x8b'
+
+STORY_FIELDS = ('title', 'description', 'published', 'last_update', 'completed',
+                'cover_image_file', 'cover_image_source')
+CHAPTER_FIELDS = ('title', 'content', 'published', 'last_update', 'chapter_image', 'chapter_image_source')
+LINK_FIELDS = ('text', 'condition', 'action')
+DATETIME_FIELDS = ('published', 'last_update')
+# Fields which records must have (and can't be null), by record type.
+REQUIRED_FIELDS = {
+    'story': ('title', 'description', 'last_update', 'completed'),
+    'chapter': ('id', 'title', 'content'),
+    'link': ('from_chapter_id', 'to_chapter_id', 'text'),
+}
+# The JSON types of record fields (checked when the field is not null). Other fields are strings.
+FIELD_TYPES = {'completed': bool, 'id': int, 'from_chapter_id': int, 'to_chapter_id': int, 'tags': list}
+
+
+def _record(record_type: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    record = {'type': record_type}
+    for name, value in values.items():
+        record[name] = value.isoformat() if name in DATETIME_FIELDS and value is not None else value
+    return record
+
+
+def export_story(story_id: int) -> Iterator[Dict[str, Any]]:
+    """Yields the records of the story: the story first, then chapters, then links."""
+    story = models.Story.objects.select_related('author').get(pk=story_id)  # pylint:disable=no-member
+    yield _record('story', {
+        'version': FORMAT_VERSION,
+        'author': story.author.username,
+        'tags': list(story.tags.order_by('tag_name').values_list('tag_name', flat=True)),
+        **{name: getattr(story, name) for name in STORY_FIELDS},
+    })
+    chapters = models.Chapter.objects.filter(story_id=story_id).order_by('id')  # pylint:disable=no-member
+    for values in chapters.values('id', *CHAPTER_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        yield _record('chapter', values)
+    links = models.ChapterLink.objects.filter(story_id=story_id).order_by('id')  # pylint:disable=no-member
+    for values in links.values('from_chapter_id', 'to_chapter_id', *LINK_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        yield _record('link', values)
+
+
+def export_lines(story_id: int) -> Iterator[bytes]:
+    """Yields the records of the story as newline-delimited JSON."""
+    for record in export_story(story_id):
+        yield json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def write_export(story_id: int, output: BinaryIO, compress: bool = False):
+    """Writes the export of the story to a binary stream, optionally gzip-compressed."""
+    if compress:
+        with gzip.GzipFile(fileobj=output, mode='wb') as compressed:
+            for line in export_lines(story_id):
+                compressed.write(line)
+    else:
+        for line in export_lines(story_id):
+            output.write(line)
+
+
+def open_export(path: str) -> BinaryIO:
+    """Opens an export file for reading, decompressing it if it's gzip-compressed."""
+    with open(path, 'rb') as export_file:
+        compressed = export_file.read(2) == GZIP_MAGIC
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')  # type: ignore pylint:disable=consider-using-with
+
+
+def read_records(source: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Reads records from an export stream, one line at a time."""
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _has_type(value: Any, field_type: type) -> bool:
+    # `bool` is a subclass of `int`, but `true` is not a chapter id.
+    return isinstance(value, field_type) and not (field_type is int and isinstance(value, bool))
+
+
+def _check_record(record: Any, record_type: str, index: int):
+    """Raises `ValueError` if the record is not an object with all the required fields of its type.
+
+    Also checks the types of the fields which are imported, so malformed values are reported with the
+    index of their record (in the stream, counting from 0) instead of failing (or worse, being coerced)
+    on insert.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f'Record {index}: records of a story export must be JSON objects.')
+    missing = [name for name in REQUIRED_FIELDS[record_type] if record.get(name) is None]
+    if missing:
+        raise ValueError(f"Record {index}: {record_type} record without {', '.join(missing)}.")
+    fields = {'story': STORY_FIELDS + ('tags',), 'chapter': ('id',) + CHAPTER_FIELDS,
+              'link': ('from_chapter_id', 'to_chapter_id') + LINK_FIELDS}[record_type]
+    for name in fields:
+        value = record.get(name)
+        field_type = FIELD_TYPES.get(name, str)
+        if value is not None and not _has_type(value, field_type):
+            raise ValueError(f'Record {index}: {name} must be of type {field_type.__name__}, not {value!r}.')
+    if not all(isinstance(tag, str) for tag in record.get('tags') or []):
+        raise ValueError(f"Record {index}: tags must be strings, not {record['tags']!r}.")
+
+
+def _parse_values(record: Dict[str, Any], fields: Iterable[str], index: int) -> Dict[str, Any]:
+    values = {name: record.get(name) for name in fields}
+    for name in DATETIME_FIELDS:
+        if values.get(name):
+            try:
+                parsed = dateparse.parse_datetime(values[name])
+            except ValueError:  # Well formatted, but not a valid date (e.g. February 30th).
+                parsed = None
+            if parsed is None:
+                raise ValueError(f'Record {index}: invalid {name}: {values[name]!r}')
+            values[name] = parsed
+    return values
+
+
+def import_story(records: Iterable[Dict[str, Any]], author: Optional[auth_models.User] = None) -> models.Story:
+    """Creates a new story from exported records, in a single transaction.
+
+    Args:
+        records: The records, as produced by `export_story` (or `read_records`).
+        author: The author of the new story. Defaults to the user with the exported author's username.
+
+    Raises:
+        ValueError: if the records are not a valid story export.
+    """
+    records = iter(records)
+    header = next(records, None)
+    if not isinstance(header, dict) or header.get('type') != 'story' or header.get('version') != FORMAT_VERSION:
+        raise ValueError('Not a story export (or an unsupported version).')
+    _check_record(header, 'story', 0)
+    if author is None:
+        author = auth_models.User.objects.filter(username=header.get('author')).first()
+        if author is None:
+            raise ValueError(f"Unknown author: {header.get('author')}")
+
+    with transaction.atomic():
+        story = models.Story.objects.create(author=author, **_parse_values(header, STORY_FIELDS, 0))  # pylint:disable=no-member
+        tags = [models.Tags.objects.get_or_create(tag_name=models.normalize_tag_name(name))[0]  # pylint:disable=no-member
+                for name in header.get('tags') or []]
+        story.tags.add(*tags)
+
+        chapter_ids: Dict[int, int] = {}
+        chapter_batch = []
+        link_batch = []
+
+        def flush_chapters():
+            created = models.Chapter.objects.bulk_create(  # pylint:disable=no-member
+                [chapter for _, chapter in chapter_batch])
+            for (old_id, _), chapter in zip(chapter_batch, created):
+                chapter_ids[old_id] = chapter.pk
+            chapter_batch.clear()
+
+        for index, record in enumerate(records, start=1):
+            record_type = record.get('type') if isinstance(record, dict) else None
+            if record_type not in ('chapter', 'link'):
+                raise ValueError(f'Record {index}: unknown record type: {record_type}')
+            _check_record(record, record_type, index)
+            if record_type == 'chapter':
+                chapter_batch.append(
+                    (record['id'], models.Chapter(story=story, **_parse_values(record, CHAPTER_FIELDS, index))))
+                if len(chapter_batch) >= BATCH_SIZE:
+                    flush_chapters()
+            else:
+                if chapter_batch:
+                    flush_chapters()
+                try:
+                    link_batch.append(models.ChapterLink(
+                        story=story, from_chapter_id=chapter_ids[record['from_chapter_id']],
+                        to_chapter_id=chapter_ids[record['to_chapter_id']], **_parse_values(record, LINK_FIELDS, index)))
+                except KeyError as missing:
+                    raise ValueError(f'Record {index}: link to an unknown chapter: {missing}') from missing
+                if len(link_batch) >= BATCH_SIZE:
+                    models.ChapterLink.objects.bulk_create(link_batch)  # pylint:disable=no-member
+                    link_batch.clear()
+        if chapter_batch:
+            flush_chapters()
+        if link_batch:
+            models.ChapterLink.objects.bulk_create(link_batch)  # pylint:disable=no-member
+
+        # Bulk inserts skip the signals which would index the chapter contents.
+        search.index_story(story)
+    return story
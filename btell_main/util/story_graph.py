@@ -0,0 +1,171 @@
+"""The graph of chapters and links of a story, with some analysis for the graph editor.
+
+The graph is built from two queries (chapter ids, and all the links of the story) into compact
+arrays, in compressed sparse row form: the outgoing links of the chapter at index `i` lead to
+the chapters at indices `targets[offsets[i]:offsets[i + 1]]`.
+
+Built graphs are kept in the Django cache, and dropped whenever a chapter or link of the story
+is saved or deleted.
+"""
+from array import array
+from typing import Dict, List, Optional
+import dataclasses
+
+from django import dispatch
+from django.core.cache import cache
+from django.db.models import signals
+
+from btell_main import models
+
+CACHE_KEY = 'btell:story_graph:{story_id}'
+
+
+@dataclasses.dataclass
+class StoryGraph:
+    """Chapters and links of a story, plus the results of the graph analysis.
+
+    All the analysis results are lists of chapter ids (not indices).
+    """
+    story_id: int
+    chapter_ids: array  # Index -> chapter id, sorted by id.
+    offsets: array
+    targets: array
+    start_chapter: Optional[int] = None
+    # Chapters which can be reached from the start chapter (including the start chapter).
+    reachable: List[int] = dataclasses.field(default_factory=list)
+    # Chapters which can't be reached from the start chapter.
+    unreachable: List[int] = dataclasses.field(default_factory=list)
+    # Chapters without any outgoing links, i.e. endings.
+    dead_ends: List[int] = dataclasses.field(default_factory=list)
+    # Groups of chapters which can loop back to themselves.
+    cycles: List[List[int]] = dataclasses.field(default_factory=list)
+
+    def successors(self, index: int) -> array:
+        """Returns the indices of the chapters linked from the chapter at the given index."""
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+    def edges(self) -> List[List[int]]:
+        """Returns all links as `[from chapter id, to chapter id]` pairs."""
+        return [[self.chapter_ids[index], self.chapter_ids[target]]
+                for index in range(len(self.chapter_ids)) for target in self.successors(index)]
+
+
+def _build(story_id: int) -> StoryGraph:
+    """Loads the chapters and links of the story, and builds the adjacency arrays."""
+    chapter_ids = array('q', models.Chapter.objects.filter(  # pylint:disable=no-member
+        story_id=story_id).order_by('id').values_list('id', flat=True))
+    index_of: Dict[int, int] = {chapter_id: index for index, chapter_id in enumerate(chapter_ids)}
+    links = sorted(
+        (index_of[from_id], index_of[to_id])
+        for from_id, to_id in models.ChapterLink.objects.filter(  # pylint:disable=no-member
+            story_id=story_id).values_list('from_chapter_id', 'to_chapter_id')
+        # Links to chapters of another story would be a data error; leave them out of the graph.
+        if from_id in index_of and to_id in index_of)
+
+    offsets = array('l', [0] * (len(chapter_ids) + 1))
+    for from_index, _ in links:
+        offsets[from_index + 1] += 1
+    for index in range(len(chapter_ids)):
+        offsets[index + 1] += offsets[index]
+    targets = array('l', (to_index for _, to_index in links))
+    return StoryGraph(story_id=story_id, chapter_ids=chapter_ids, offsets=offsets, targets=targets)
+
+
+def _reachable_from(graph: StoryGraph, start: int) -> bytearray:
+    """Returns a flag per chapter index, set if it's reachable from the start index."""
+    seen = bytearray(len(graph.chapter_ids))
+    seen[start] = 1
+    stack = [start]
+    while stack:
+        for target in graph.successors(stack.pop()):
+            if not seen[target]:
+                seen[target] = 1
+                stack.append(target)
+    return seen
+
+
+def _cycles(graph: StoryGraph) -> List[List[int]]:
+    """Finds strongly connected components which contain a cycle (Tarjan's algorithm, iterative)."""
+    count = len(graph.chapter_ids)
+    order = array('l', [-1] * count)
+    low = array('l', [0] * count)
+    on_stack = bytearray(count)
+    stack: List[int] = []
+    cycles = []
+    counter = 0
+    for root in range(count):
+        if order[root] != -1:
+            continue
+        # Work items are (node, position of the next successor to visit).
+        work = [(root, graph.offsets[root])]
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        while work:
+            node, position = work[-1]
+            if position < graph.offsets[node + 1]:
+                work[-1] = (node, position + 1)
+                target = graph.targets[position]
+                if order[target] == -1:
+                    order[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = 1
+                    work.append((target, graph.offsets[target]))
+                elif on_stack[target]:
+                    low[node] = min(low[node], order[target])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == order[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in graph.successors(node):
+                    cycles.append(sorted(graph.chapter_ids[member] for member in component))
+    return sorted(cycles)
+
+
+def analyse(graph: StoryGraph) -> StoryGraph:
+    """Fills in the analysis results of the graph. The first chapter (lowest id) is the start chapter."""
+    if not graph.chapter_ids:
+        return graph
+    graph.start_chapter = graph.chapter_ids[0]
+    reachable = _reachable_from(graph, 0)
+    graph.reachable = [chapter_id for index, chapter_id in enumerate(graph.chapter_ids) if reachable[index]]
+    graph.unreachable = [chapter_id for index, chapter_id in enumerate(graph.chapter_ids) if not reachable[index]]
+    graph.dead_ends = [chapter_id for index, chapter_id in enumerate(graph.chapter_ids)
+                       if graph.offsets[index] == graph.offsets[index + 1]]
+    graph.cycles = _cycles(graph)
+    return graph
+
+
+def story_graph(story_id: int) -> StoryGraph:
+    """Returns the analysed graph of the story, from the cache if possible."""
+    key = CACHE_KEY.format(story_id=story_id)
+    graph = cache.get(key)
+    if graph is None:
+        graph = analyse(_build(story_id))
+        cache.set(key, graph, timeout=None)
+    return graph
+
+
+def invalidate(story_id: int):
+    """Drops the cached graph of the story."""
+    cache.delete(CACHE_KEY.format(story_id=story_id))
+
+
+@dispatch.receiver(signals.post_save, sender=models.Chapter)
+@dispatch.receiver(signals.post_delete, sender=models.Chapter)
+@dispatch.receiver(signals.post_save, sender=models.ChapterLink)
+@dispatch.receiver(signals.post_delete, sender=models.ChapterLink)
+def _graph_changed(sender, instance, **kwargs):
+    del sender, kwargs
+    invalidate(instance.story_id)
@@ -0,0 +1,65 @@
+"""Compiles a parsed `StoryFilter` into a single QuerySet over published stories."""
+from typing import Tuple
+
+from django.db.models import QuerySet
+
+from btell_main import models
+from btell_main.util import filter_query, search, tags
+
+# Orderings we allow the user to request, mapped to the actual `order_by` arguments. Every
+# ordering ends with the primary key, so that the result order is total (and stable between pages).
+SORT_ORDERS = {
+    '-last_update': ('-last_update', '-id'),
+    'last_update': ('last_update', 'id'),
+    '-published': ('-published', '-id'),
+    'published': ('published', 'id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+    '-likes': ('-likes', '-id'),
+}
+DEFAULT_SORT = '-last_update'
+
+
+# Ordering for freeform searches, most relevant first (see `search.search_stories`).
+RELEVANCE_ORDER = ('-search_rank', '-id')
+
+
+def story_ordering(story_filter: filter_query.StoryFilter) -> Tuple[str, ...]:
+    """Returns the `order_by` arguments for the sorting requested by the filter.
+
+    Freeform searches are ordered by relevance, unless the filter explicitly asked for another order.
+    """
+    if story_filter.freeform and story_filter.sortby == DEFAULT_SORT and search.supports_ranking():
+        return RELEVANCE_ORDER
+    return SORT_ORDERS.get(story_filter.sortby, SORT_ORDERS[DEFAULT_SORT])
+
+
+def published_stories() -> QuerySet:
+    """Returns the base QuerySet of all published stories, with their authors joined in."""
+    return models.Story.objects.filter(published__isnull=False).select_related('author')  # pylint:disable=no-member
+
+
+def build_story_queryset(story_filter: filter_query.StoryFilter) -> QuerySet:
+    """Turns the given story filter into a QuerySet which evaluates as a single SQL statement.
+
+    Authors are matched through a join, and tags through a subquery on the tags join table
+    (see `tags.stories_with_all_tags`), so a story has to carry all of the requested tags to match.
+    Freeform terms are looked up in the full-text index (see `search.search_stories`).
+    Nothing here will issue follow-up queries per story.
+
+    Args:
+        story_filter: The parsed filter, as returned by `filter_query.prepare_stories_query`.
+
+    Returns:
+        An (unevaluated) QuerySet of published stories, ordered as the filter requested.
+    """
+    stories = published_stories()
+    if story_filter.author:
+        stories = stories.filter(author__username=story_filter.author)
+    if story_filter.tags:
+        stories = stories.filter(pk__in=tags.stories_with_all_tags(story_filter.tags))
+    if story_filter.completed is not None:
+        stories = stories.filter(completed=story_filter.completed)
+    if story_filter.freeform:
+        stories = search.search_stories(stories, story_filter.freeform)
+    return stories.order_by(*story_ordering(story_filter))
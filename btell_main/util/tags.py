@@ -0,0 +1,88 @@
+"""Tag lookups, and the published-story counts of tags.
+
+`Tags.story_count` counts the published stories of each tag. It's recounted for the affected
+tags whenever stories are tagged or untagged, and whenever a tagged story is saved (which covers
+publishing) or deleted.
+"""
+from typing import Iterable, List, Set
+
+from django import dispatch
+from django.db.models import Count, IntegerField, OuterRef, QuerySet, Subquery, signals
+from django.db.models.functions import Coalesce
+
+from btell_main import models
+
+TagsThrough = models.Story.tags.through  # pylint:disable=no-member
+# Highest code point, used as the upper bound of prefix range scans.
+_MAX_CHAR = '\U0010ffff'
+
+
+def stories_with_all_tags(tag_names: Iterable[str]) -> QuerySet:
+    """Returns a subquery of the ids of stories which carry all of the given tags.
+
+    The tags are matched through the unique tag name index, and the intersection is a single
+    `GROUP BY` over the matching rows of the tags join table.
+    """
+    names: Set[str] = {models.normalize_tag_name(name) for name in tag_names}
+    return (TagsThrough.objects.filter(tags__tag_name__in=names)
+            .values('story_id')
+            .annotate(matched=Count('tags_id'))
+            .filter(matched=len(names))
+            .values('story_id'))
+
+
+def autocomplete(prefix: str, limit: int = 10) -> List[models.Tags]:
+    """Returns the tags starting with the given prefix, most used first.
+
+    The prefix becomes a range condition on the tag name, which (unlike `LIKE`) can always use the index.
+    """
+    prefix = models.normalize_tag_name(prefix)
+    tags = models.Tags.objects.filter(tag_name__gte=prefix, tag_name__lt=prefix + _MAX_CHAR)  # pylint:disable=no-member
+    return list(tags.order_by('-story_count', 'tag_name')[:limit])
+
+
+def refresh_story_counts(tag_ids: Iterable[int]):
+    """Recounts the published stories of the given tags, with a single `UPDATE`."""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    counts = (TagsThrough.objects.filter(tags_id=OuterRef('pk'), story__published__isnull=False)
+              .values('tags_id').annotate(count=Count('story_id')).values('count'))
+    models.Tags.objects.filter(pk__in=tag_ids).update(  # pylint:disable=no-member
+        story_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+def _story_tag_ids(story_id: int) -> List[int]:
+    return list(TagsThrough.objects.filter(story_id=story_id).values_list('tags_id', flat=True))
+
+
+@dispatch.receiver(signals.m2m_changed, sender=TagsThrough)
+def _story_tags_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    del sender, kwargs
+    if action == 'pre_clear':
+        # The cleared ids are not passed to `post_clear`, so remember them.
+        instance._btell_cleared_tags = (  # pylint:disable=protected-access
+            [instance.pk] if reverse else _story_tag_ids(instance.pk))
+    elif action == 'post_clear':
+        refresh_story_counts(getattr(instance, '_btell_cleared_tags', []))
+    elif action in ('post_add', 'post_remove'):
+        refresh_story_counts([instance.pk] if reverse else pk_set)
+
+
+@dispatch.receiver(signals.post_save, sender=models.Story)
+def _story_saved(sender, instance: models.Story, created: bool, **kwargs):
+    del sender, kwargs
+    if not created:
+        refresh_story_counts(_story_tag_ids(instance.pk))
+
+
+@dispatch.receiver(signals.pre_delete, sender=models.Story)
+def _story_deleting(sender, instance: models.Story, **kwargs):
+    del sender, kwargs
+    instance._btell_deleted_tags = _story_tag_ids(instance.pk)  # pylint:disable=protected-access
+
+
+@dispatch.receiver(signals.post_delete, sender=models.Story)
+def _story_deleted(sender, instance: models.Story, **kwargs):
+    del sender, kwargs
+    refresh_story_counts(getattr(instance, '_btell_deleted_tags', []))
@@ -5,6 +5,7 @@ import logging
 
 from typing import Optional
 
+from asgiref import sync
 from django import http
 from django.contrib.auth import models as auth_models
 
@@ -47,3 +48,12 @@ def get_user_object(request: http.HttpRequest) -> Optional[auth_models.User]:
                             auth_models.User._meta.object_name,  # pylint:disable=protected-access,no-member
                             type(request.user))
         return None
+
+
+async def aget_user_object(request: http.HttpRequest) -> Optional[auth_models.User]:
+    """Async version of `get_user_object`, for async views.
+
+    `request.user` is loaded lazily from the session, which only has a synchronous API (in this
+    version of Django), so the lookup runs in the thread used for synchronous database access.
+    """
+    return await sync.sync_to_async(get_user_object)(request)
@@ -0,0 +1,123 @@
+"""Likes and dislikes of stories.
+
+Every user has at most one vote per story (`StoryVote`), so voting is idempotent: voting the same
+way twice changes nothing, and changing a vote moves it from one counter to the other. The
+denormalized `Story.likes` and `Story.dislikes` counters are only ever changed with `F()`
+expressions, so concurrent votes can't overwrite each other.
+
+If `BTELL_VOTE_COUNTER_SHARDS` is set, votes don't touch the `Story` row at all. The counter
+changes go to one of that many `StoryVoteShard` rows of the story, picked at random, which spreads
+the writes of popular stories over several rows. `fold_vote_shards` (run periodically with the
+`fold_votes` management command) then moves the pending changes into `Story`.
+"""
+from typing import Dict, Tuple
+import random
+
+from django.contrib.auth import models as auth_models
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from btell import settings
+from btell_main import models
+
+LIKE = 1
+DISLIKE = -1
+NO_VOTE = 0
+
+
+def _counter_changes(old_value: int, new_value: int) -> Tuple[int, int]:
+    """Returns how the (likes, dislikes) counters change when a vote changes."""
+    likes = int(new_value == LIKE) - int(old_value == LIKE)
+    dislikes = int(new_value == DISLIKE) - int(old_value == DISLIKE)
+    return likes, dislikes
+
+
+def _add_to_shard(story_id: int, likes: int, dislikes: int):
+    """Adds counter changes to a random shard of the story."""
+    shard = random.randrange(settings.BTELL_VOTE_COUNTER_SHARDS)
+    shards = models.StoryVoteShard.objects.filter(story_id=story_id, shard=shard)  # pylint:disable=no-member
+    if shards.update(likes=F('likes') + likes, dislikes=F('dislikes') + dislikes):
+        return
+    try:
+        with transaction.atomic():
+            models.StoryVoteShard.objects.create(  # pylint:disable=no-member
+                story_id=story_id, shard=shard, likes=likes, dislikes=dislikes)
+    except IntegrityError:
+        # Someone else created the shard in the meantime.
+        shards.update(likes=F('likes') + likes, dislikes=F('dislikes') + dislikes)
+
+
+def cast_vote(user: auth_models.User, story_id: int, value: int):
+    """Records the vote of the user, and updates the counters of the story.
+
+    Args:
+        user: The voting user.
+        story_id: The story being voted on.
+        value: `LIKE`, `DISLIKE`, or `NO_VOTE` to take a previous vote back.
+
+    Raises:
+        ValueError: if the value is not one of the above.
+    """
+    if value not in (LIKE, DISLIKE, NO_VOTE):
+        raise ValueError(f'Invalid vote: {value}')
+    try:
+        _apply_vote(user, story_id, value)
+    except IntegrityError:
+        # A concurrent first vote of the same user (e.g. a double click) created the vote row
+        # in the meantime. There is nothing to lock before the row exists, so apply ours on top of it.
+        _apply_vote(user, story_id, value)
+
+
+def _apply_vote(user: auth_models.User, story_id: int, value: int):
+    """Changes the vote of the user and the counters of the story, in a transaction (or savepoint)."""
+    with transaction.atomic():
+        votes = models.StoryVote.objects.select_for_update().filter(  # pylint:disable=no-member
+            user=user, story_id=story_id)
+        vote = votes.first()
+        old_value = vote.value if vote else NO_VOTE
+        if old_value == value:
+            return
+        if value == NO_VOTE:
+            votes.delete()
+        elif vote:
+            votes.update(value=value)
+        else:
+            models.StoryVote.objects.create(user=user, story_id=story_id, value=value)  # pylint:disable=no-member
+
+        likes, dislikes = _counter_changes(old_value, value)
+        if settings.BTELL_VOTE_COUNTER_SHARDS:
+            _add_to_shard(story_id, likes, dislikes)
+        else:
+            models.Story.objects.filter(pk=story_id).update(  # pylint:disable=no-member
+                likes=F('likes') + likes, dislikes=F('dislikes') + dislikes)
+
+
+def vote_counts(story_id: int) -> Dict[str, int]:
+    """Returns the current likes and dislikes of the story, including changes not folded yet."""
+    story = models.Story.objects.values('likes', 'dislikes').get(pk=story_id)  # pylint:disable=no-member
+    pending = models.StoryVoteShard.objects.filter(story_id=story_id).aggregate(  # pylint:disable=no-member
+        likes=Sum('likes'), dislikes=Sum('dislikes'))
+    return {
+        'likes': story['likes'] + (pending['likes'] or 0),
+        'dislikes': story['dislikes'] + (pending['dislikes'] or 0),
+    }
+
+
+def fold_vote_shards() -> int:
+    """Moves the pending counter changes from the vote shards into the stories.
+
+    Returns:
+        The number of stories whose counters were updated.
+    """
+    with transaction.atomic():
+        shards = list(models.StoryVoteShard.objects.select_for_update().all())  # pylint:disable=no-member
+        totals: Dict[int, Tuple[int, int]] = {}
+        for shard in shards:
+            likes, dislikes = totals.get(shard.story_id, (0, 0))  # type: ignore
+            totals[shard.story_id] = (likes + shard.likes, dislikes + shard.dislikes)  # type: ignore
+        for story_id, (likes, dislikes) in totals.items():
+            if likes or dislikes:
+                models.Story.objects.filter(pk=story_id).update(  # pylint:disable=no-member
+                    likes=F('likes') + likes, dislikes=F('dislikes') + dislikes)
+        models.StoryVoteShard.objects.filter(pk__in=[shard.pk for shard in shards]).delete()  # pylint:disable=no-member
+    return len(totals)
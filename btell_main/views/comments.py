@@ -0,0 +1,44 @@
+"""Listing and posting comments on stories."""
+from typing import Any, Dict
+
+from django import http, shortcuts
+
+from btell import settings
+from btell_main import models
+from btell_main.util import comments, replicas, user_util
+
+
+def _comment_json(comment: models.Comment) -> Dict[str, Any]:
+    return {
+        'id': comment.pk,
+        'commenter': comment.commenter.username,
+        'text': comment.comment_text,
+        'created': comment.created,
+    }
+
+
+@replicas.read_from_replica
+def story_comments(request: http.HttpRequest, story_id: int) -> http.HttpResponse:
+    """GET returns a page of the story's comments (newest first), POST adds a comment (`text`)."""
+    story = shortcuts.get_object_or_404(models.Story, pk=story_id, published__isnull=False)
+    if request.method == 'GET':
+        try:
+            page = comments.comment_page(story.pk, settings.BTELL_COMMENTS_PER_PAGE, request.GET.get('cursor'))
+        except ValueError as cursor_error:
+            return http.JsonResponse({'error': str(cursor_error)}, status=400)
+        return http.JsonResponse({
+            'comment_count': story.comment_count,
+            'comments': [_comment_json(comment) for comment in page.items],
+            'next_cursor': page.next_cursor,
+        })
+    if request.method == 'POST':
+        user = user_util.get_user_object(request)
+        if user is None:
+            return http.HttpResponseForbidden('Log in to comment.')
+        text = request.POST.get('text', '').strip()
+        max_length = models.Comment._meta.get_field('comment_text').max_length  # type: ignore pylint:disable=protected-access,no-member
+        if not text or len(text) > max_length:
+            return http.JsonResponse({'error': f'Comments must have between 1 and {max_length} characters.'}, status=400)
+        comment = comments.add_comment(user, story.pk, text)
+        return http.JsonResponse(_comment_json(comment), status=201)
+    return http.HttpResponseNotAllowed(['GET', 'POST'])
@@ -1,10 +1,114 @@
 """Functions which help build out common parts of the context."""
-from typing import Dict, Any
-from django import http
+from typing import Any, Dict, Optional
 
-from btell_main.util import user_util
+from asgiref import sync
+from django import dispatch, http
+from django.contrib.auth import models as auth_models
+from django.core.cache import cache
+from django.db.models import signals
+
+from btell import settings
+from btell_main.util import site_settings, user_util
 from btell_main import models
 
+USER_INFO_CACHE_KEY = 'btell:user_info:{user_id}'
+# `Profile.theme` of users who use the default theme of the site (`SiteSettings.default_theme`).
+DEFAULT_THEME = 'DEFAULT'
+# Attributes of the request under which the user info and theme are memoized.
+_REQUEST_ATTR = '_btell_user_info'
+_THEME_ATTR = '_btell_theme'
+
+
+def _load_user_info(user_id: int) -> Dict[str, Any]:
+    """Loads the user with their profile (a single query), and builds the user info."""
+    user = auth_models.User.objects.select_related('profile').get(pk=user_id)
+    profile = models.Profile.profile_from_user(user)
+    full_name = f"{user.first_name} {user.last_name}".strip()
+    return {
+        'username': user.username.strip(),
+        'full_name': full_name if full_name else None,
+        'email': user.email,
+        'profile': {
+            'theme': profile.theme
+        }
+    }
+
+
+def user_info(request: http.HttpRequest) -> Optional[Dict[str, Any]]:
+    """Returns information about the logged-in user, or `None` for anonymous users.
+
+    The information is resolved once per request, and otherwise comes from the cache (for
+    `BTELL_USER_INFO_CACHE_TIMEOUT` seconds). Saving the user or their profile invalidates it.
+    """
+    if hasattr(request, _REQUEST_ATTR):
+        return getattr(request, _REQUEST_ATTR)
+    info = None
+    user = user_util.get_user_object(request)
+    if user:
+        key = USER_INFO_CACHE_KEY.format(user_id=user.pk)
+        info = cache.get(key)
+        if info is None:
+            info = _load_user_info(user.pk)
+            cache.set(key, info, timeout=settings.BTELL_USER_INFO_CACHE_TIMEOUT)
+    setattr(request, _REQUEST_ATTR, info)
+    return info
+
+
+async def auser_info(request: http.HttpRequest) -> Optional[Dict[str, Any]]:
+    """Async version of `user_info`, for async views.
+
+    It memoizes the information on the request in the same way, so context processors running
+    later (during template rendering) don't need to touch the database.
+    """
+    if hasattr(request, _REQUEST_ATTR):
+        return getattr(request, _REQUEST_ATTR)
+    info = None
+    user = await user_util.aget_user_object(request)
+    if user:
+        key = USER_INFO_CACHE_KEY.format(user_id=user.pk)
+        info = await cache.aget(key)
+        if info is None:
+            # May have to create a missing profile, which has no async API.
+            info = await sync.sync_to_async(_load_user_info)(user.pk)
+            await cache.aset(key, info, timeout=settings.BTELL_USER_INFO_CACHE_TIMEOUT)
+    setattr(request, _REQUEST_ATTR, info)
+    return info
+
+
+def site_default_theme() -> str:
+    """Returns the default theme of the site (empty if it isn't configured)."""
+    return site_settings.get().default_theme
+
+
+def _theme_of(info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Returns the theme chosen by the user, or `None` if the site default applies."""
+    theme = info['profile']['theme'] if info else DEFAULT_THEME
+    return None if theme == DEFAULT_THEME else theme
+
+
+def theme(request: http.HttpRequest) -> str:
+    """Returns the theme pages are shown in for the user of the request (memoized on the request)."""
+    if not hasattr(request, _THEME_ATTR):
+        setattr(request, _THEME_ATTR, _theme_of(user_info(request)) or site_default_theme())
+    return getattr(request, _THEME_ATTR)
+
+
+async def atheme(request: http.HttpRequest) -> str:
+    """Async version of `theme`."""
+    if not hasattr(request, _THEME_ATTR):
+        chosen = _theme_of(await auser_info(request))
+        setattr(request, _THEME_ATTR, chosen or (await site_settings.aget()).default_theme)
+    return getattr(request, _THEME_ATTR)
+
+
+def _set_user_info(info: Optional[Dict[str, Any]], context: Dict[str, Any]):
+    if info:
+        context['btell_user'] = info
+    else:
+        # Ensure that the user section of the context does not exist.
+        if 'btell_user' in context:
+            del context['btell_user']
+
 
 def context_add_user_info(request: http.HttpRequest, context: Dict[str, Any]):
     """Appends information about the logged-in user to the given context.
@@ -17,19 +121,47 @@ def context_add_user_info(request: http.HttpRequest, context: Dict[str, Any]):
           about the logged-in user will be retrieved.
         context: A template rendering context being constructed.
     """
-    user = user_util.get_user_object(request)
-    if user:
-        profile = models.Profile.profile_from_user(user)
-        full_name = f"{user.first_name} {user.last_name}".strip()
-        context['btell_user'] = {
-            'username': user.username.strip(),
-            'full_name': full_name if full_name else None,
-            'email': user.email,
-            'profile': {
-                'theme': profile.theme
-            }
-        }
-    else:
-        # Ensure that the user section of the context does not exist.
-        if 'btell_user' in context:
-            del context['btell_user']
+    _set_user_info(user_info(request), context)
+
+
+async def acontext_add_user_info(request: http.HttpRequest, context: Dict[str, Any]):
+    """Async version of `context_add_user_info`, for async views.
+
+    Also resolves the theme, so that `user_context` doesn't need the database while rendering.
+    """
+    _set_user_info(await auser_info(request), context)
+    context['btell_theme'] = await atheme(request)
+
+
+def user_context(request: http.HttpRequest) -> Dict[str, Any]:
+    """Context processor which provides `btell_user` and `btell_theme` to all templates.
+
+    Also provides `btell_fragment_timeout`, for the `{% cache %}` tags of shared page fragments.
+    """
+    info = user_info(request)
+    ctx: Dict[str, Any] = {
+        'btell_theme': theme(request),
+        'btell_fragment_timeout': settings.BTELL_FRAGMENT_CACHE_TIMEOUT,
+    }
+    if info:
+        ctx['btell_user'] = info
+    return ctx
+
+
+def invalidate_user_info(user_id: int):
+    """Drops the cached user info of the given user."""
+    cache.delete(USER_INFO_CACHE_KEY.format(user_id=user_id))
+
+
+@dispatch.receiver(signals.post_save, sender=auth_models.User)
+@dispatch.receiver(signals.post_delete, sender=auth_models.User)
+def _user_changed(sender, instance: auth_models.User, **kwargs):
+    del sender, kwargs
+    invalidate_user_info(instance.pk)
+
+
+@dispatch.receiver(signals.post_save, sender=models.Profile)
+@dispatch.receiver(signals.post_delete, sender=models.Profile)
+def _profile_changed(sender, instance: models.Profile, **kwargs):
+    del sender, kwargs
+    invalidate_user_info(instance.user_id)  # type: ignore
@@ -0,0 +1,57 @@
+"""Serving and uploading images from the content-addressed image store."""
+import os
+
+from django import http, shortcuts, urls
+from django.utils import cache as cache_utils
+
+from btell_main import models
+from btell_main.util import image_store, user_util
+
+# Images never change under their name, so they may be cached forever.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def image(request: http.HttpRequest, digest: str, variant: str = image_store.ORIGINAL) -> http.HttpResponse:
+    """Serves an image (or one of its variants) with a strong ETag and immutable cache headers."""
+    if request.method not in ('GET', 'HEAD'):
+        return http.HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        path = image_store.image_path(digest, variant)
+    except ValueError as bad_name:
+        raise http.Http404('No such image.') from bad_name
+    etag = f'"{digest}.{variant}"'
+    not_modified = cache_utils.get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        if not os.path.exists(image_store.image_path(digest)):
+            raise http.Http404('No such image.')
+        if not os.path.exists(path):
+            # Requested before the background workers got to it.
+            image_store.generate_variant(digest, variant)
+        content_type = image_store.content_type(digest, variant)
+        response: http.HttpResponse = http.FileResponse(open(path, 'rb'), content_type=content_type)  # pylint:disable=consider-using-with
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def upload_cover(request: http.HttpRequest, story_id: int) -> http.HttpResponse:
+    """Stores an uploaded cover image (`image`) and sets it as the cover of the author's story."""
+    if request.method != 'POST':
+        return http.HttpResponseNotAllowed(['POST'])
+    user = user_util.get_user_object(request)
+    story = shortcuts.get_object_or_404(models.Story, pk=story_id, author_id=user.pk if user else None)
+    upload = request.FILES.get('image')
+    if upload is None:
+        return http.JsonResponse({'error': 'No image uploaded.'}, status=400)
+    try:
+        digest = image_store.store_image(upload)
+    except image_store.InvalidImage as invalid:
+        return http.JsonResponse({'error': str(invalid)}, status=400)
+    story.cover_image_file = digest
+    story.save(update_fields=['cover_image_file'])
+    return http.JsonResponse({
+        'digest': digest,
+        'url': urls.reverse('image', args=[digest]),
+    })
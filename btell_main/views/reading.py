@@ -0,0 +1,133 @@
+"""Views for reading a story, one chapter at a time.
+
+The views are async, so that under an ASGI server a few workers can serve many (slow) readers.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+
+from django import http, shortcuts
+from django.contrib.auth import models as auth_models
+from django.middleware import csrf
+from django.utils import cache as cache_utils
+
+from btell import settings
+from btell_main import models
+from btell_main.util import chapter_render, reader_state, replicas, story_dsl, user_util
+from btell_main.views import context as btell_context
+
+
+async def _readable_chapter(user: Optional[auth_models.User], story_id: int, chapter_id: int) -> models.Chapter:
+    """Loads the chapter (with its story), if the user may read it. Raises `Http404` otherwise.
+
+    Published chapters of published stories can be read by anyone, and authors can read all of theirs.
+    """
+    try:
+        chapter = await models.Chapter.objects.select_related('story').aget(  # pylint:disable=no-member
+            pk=chapter_id, story_id=story_id)
+    except models.Chapter.DoesNotExist as not_found:  # pylint:disable=no-member
+        raise http.Http404('No such chapter.') from not_found
+    is_author = user is not None and chapter.story.author_id == user.pk  # type: ignore
+    if not is_author and (not chapter.story.is_published() or chapter.published is None):
+        raise http.Http404('No such chapter.')
+    return chapter
+
+
+async def _reader_state(user: Optional[auth_models.User], story_id: int) -> Optional[reader_state.ReaderState]:
+    """Loads the reading state of a logged-in user, if they already started reading the story."""
+    if user is None:
+        return None
+    reader = await models.StoryReader.objects.filter(user=user, story_id=story_id).afirst()  # pylint:disable=no-member
+    return await reader_state.ReaderState.aload(reader) if reader else None
+
+
+def _chapter_etag(request: http.HttpRequest, chapter: models.Chapter, links: List[models.ChapterLink],
+                  state: Optional[reader_state.ReaderState], info: Optional[Dict[str, Any]], theme: str) -> str:
+    """Returns the ETag of a chapter page, without rendering it.
+
+    The ETag covers everything the page is made from: the chapter and story, the links of the chapter,
+    the theme, and for logged-in readers their story variables, user info and CSRF cookie (used by the
+    link forms). There is no Last-Modified time, since not all of these have one (e.g. deleted links).
+    """
+    parts: List[Any] = [chapter.pk, chapter.last_update.isoformat(), chapter.story.title, theme,
+                        [(link.pk, link.last_update.isoformat()) for link in links]]
+    if info is not None:
+        csrf.get_token(request)  # Makes sure the CSRF secret of the page exists before it's rendered.
+        parts += [info, request.META['CSRF_COOKIE']]
+    if state is not None:
+        parts.append(sorted(state.variables.items()))
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    # Weak, because the masked CSRF tokens in the page differ with every rendering.
+    return f'W/"{digest[:32]}"'
+
+
+@replicas.read_from_replica
+async def read_chapter(request: http.HttpRequest, story_id: int, chapter_id: int) -> http.HttpResponse:
+    """Shows a chapter, with the selective text and links picked for the reader's story variables.
+
+    Anonymous readers keep their reading state in the browser, so they see the chapter as a new reader,
+    and the page is the same for all of them. Published chapters can then be cached publicly (e.g. by a
+    CDN) for `BTELL_CHAPTER_CACHE_SECONDS`. Pages of logged-in readers have to be revalidated, which is
+    answered with "304 Not Modified" (without rendering) if nothing changed.
+    """
+    if request.method != 'GET':
+        return http.HttpResponseNotAllowed(['GET'])
+    user = await user_util.aget_user_object(request)
+    chapter = await _readable_chapter(user, story_id, chapter_id)
+    state = await _reader_state(user, story_id)
+    variables = state.variables if state else {}
+    links = [link async for link in models.ChapterLink.objects.filter(from_chapter=chapter).order_by('id')]  # pylint:disable=no-member
+    info = await btell_context.auser_info(request)
+    etag = _chapter_etag(request, chapter, links, state, info, await btell_context.atheme(request))
+    response = cache_utils.get_conditional_response(request, etag=etag)
+    if response is None:
+        ctx: Dict[str, Any] = {
+            'story': chapter.story,
+            'chapter': chapter,
+            'content': chapter_render.render_chapter(chapter, variables),
+            'links': story_dsl.visible_links(links, variables),
+        }
+        await btell_context.acontext_add_user_info(request, ctx)
+        response = shortcuts.render(request, 'btell_main/chapter.html', ctx)
+    response['ETag'] = etag
+    if user is None:
+        cache_utils.patch_cache_control(response, public=True, max_age=settings.BTELL_CHAPTER_CACHE_SECONDS)
+    else:
+        cache_utils.patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def follow_link(request: http.HttpRequest, story_id: int, link_id: int) -> http.HttpResponse:
+    """Moves the reader along a link, and redirects to the chapter it leads to.
+
+    Logged-in readers can only follow links from the chapter they are on; otherwise they are sent back
+    to it. Readers who haven't started the story yet can only follow links from its first chapter.
+    """
+    if request.method != 'POST':
+        return http.HttpResponseNotAllowed(['POST'])
+    user = await user_util.aget_user_object(request)
+    try:
+        link = await models.ChapterLink.objects.aget(pk=link_id, story_id=story_id)  # pylint:disable=no-member
+    except models.ChapterLink.DoesNotExist as not_found:  # pylint:disable=no-member
+        raise http.Http404('No such link.') from not_found
+    await _readable_chapter(user, story_id, link.from_chapter_id)  # type: ignore
+    if user is not None:
+        reader = await models.StoryReader.objects.filter(user=user, story_id=story_id).afirst()  # pylint:disable=no-member
+        if reader is None:
+            # New readers start at the first chapter of the story (see `util.story_graph`).
+            start = await models.Chapter.objects.filter(  # pylint:disable=no-member
+                story_id=story_id).order_by('id').values_list('id', flat=True).afirst()
+            if link.from_chapter_id != start:  # type: ignore
+                return http.HttpResponse('Start reading the story from its first chapter.', status=409)
+            reader, _ = await models.StoryReader.objects.aget_or_create(  # pylint:disable=no-member
+                user=user, story_id=story_id, defaults={'current_chapter_id': link.from_chapter_id})  # type: ignore
+        state = await reader_state.ReaderState.aload(reader)
+        if state.reader.current_chapter_id != link.from_chapter_id:  # type: ignore
+            # Not on the chapter of the link, e.g. because the form was submitted twice. Following it
+            # would skip ahead, or apply its action again.
+            return shortcuts.redirect('read_chapter', story_id=story_id, chapter_id=state.reader.current_chapter_id)  # type: ignore
+        if not story_dsl.evaluate_condition(link, state.variables):
+            return http.HttpResponseForbidden('This path is not open to you.')
+        state.follow_link(link)
+        await state.aflush()
+    return shortcuts.redirect('read_chapter', story_id=story_id, chapter_id=link.to_chapter_id)  # type: ignore
@@ -0,0 +1,17 @@
+"""Export of whole stories, for their authors."""
+from django import http, shortcuts
+
+from btell_main import models
+from btell_main.util import story_export as export_util
+from btell_main.util import user_util
+
+
+def story_export(request: http.HttpRequest, story_id: int) -> http.HttpResponse:
+    """Streams the export of a story (see `util.story_export`) to the author of the story."""
+    if request.method != 'GET':
+        return http.HttpResponseNotAllowed(['GET'])
+    user = user_util.get_user_object(request)
+    story = shortcuts.get_object_or_404(models.Story, pk=story_id, author_id=user.pk if user else None)
+    response = http.StreamingHttpResponse(export_util.export_lines(story.pk), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="story-{story.pk}.ndjson"'
+    return response
@@ -0,0 +1,24 @@
+"""Graph of a story's chapters and links, for the graph editor."""
+from django import http, shortcuts
+
+from btell_main import models
+from btell_main.util import story_graph as graph_util
+from btell_main.util import user_util
+
+
+def story_graph_json(request: http.HttpRequest, story_id: int) -> http.HttpResponse:
+    """Serves the graph of a story, with its analysis, to the author of the story."""
+    if request.method != 'GET':
+        return http.HttpResponseNotAllowed(['GET'])
+    user = user_util.get_user_object(request)
+    # Only the author may see the whole graph, other users get the same answer as for missing stories.
+    story = shortcuts.get_object_or_404(models.Story, pk=story_id, author_id=user.pk if user else None)
+    graph = graph_util.story_graph(story.pk)
+    return http.JsonResponse({
+        'chapters': list(graph.chapter_ids),
+        'links': graph.edges(),
+        'start_chapter': graph.start_chapter,
+        'unreachable': graph.unreachable,
+        'dead_ends': graph.dead_ends,
+        'cycles': graph.cycles,
+    })
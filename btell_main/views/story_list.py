@@ -1,32 +1,100 @@
 """View for displaying a list of stories, with optional filtering."""
+from typing import Any, Dict, Optional
 
-from django import http
-from django.db.models import query
+from asgiref import sync
+from django import http, shortcuts
 
+from btell import settings
 from btell_main import models
+from btell_main.util import filter_query, listing_cache, replicas
+from btell_main.views import context as btell_context
 
 
 # Dispatcher
-def story_list(request: http.HttpRequest) -> http.HttpResponse:
+@replicas.read_from_replica
+async def story_list(request: http.HttpRequest) -> http.HttpResponse:
     if request.method == 'GET':
-        return story_list_get(request)
+        return await story_list_get(request)
     elif request.method == 'POST':
         return story_list_post(request)
     else:
         return http.HttpResponseNotAllowed(['GET', 'POST'])
 
 
-def story_list_get(request: http.HttpRequest) -> http.HttpResponse:
+def _story_page(filter_str: Optional[str], cursor: Optional[str]) -> Dict[str, Any]:
+    """Loads a single page of stories for the given filter string.
+
+    Returns:
+        A dictionary with the parsed `story_filter`, the loaded `page`, and the `generation` of the
+        listing cache it was loaded in.
+
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    # Read before the page, so whatever is cached by it can't be older than the stories on the page.
+    generation = listing_cache.current_generation()
+    story_filter = filter_query.prepare_stories_query(filter_str)
+    page = listing_cache.story_page(story_filter, settings.BTELL_STORIES_PER_PAGE, cursor)
+    return {'story_filter': story_filter, 'page': page, 'generation': generation}
+
+
+# The listing cache and keyset paging are synchronous, so a page is loaded with a single hop to the
+# database thread.
+_astory_page = sync.sync_to_async(_story_page)
+
+
+async def story_list_get(request: http.HttpRequest) -> http.HttpResponse:
     """Get method for the list of stories."""
     # Steps:
     # 1. If logged in user, may have some preferences for tags set in profile (future improvements)
     # 2. Grab query string (filter), and construct a `QuerySet`
-    filter = request.GET.get('filter')
-    # 3. Paging or endless scroll? Implement paging first, add endless scroll function later via REST
+    filter_str = request.GET.get('filter')
+    # 3. Paging via an opaque cursor; `story_list_json` serves the same pages for endless scroll.
+    try:
+        result = await _astory_page(filter_str, request.GET.get('cursor'))
+    except ValueError as cursor_error:
+        return http.HttpResponseBadRequest(str(cursor_error))
     # 4. Fill context with stories (from QuerySet)
+    ctx: Dict[str, Any] = {
+        'filter': filter_str or '',
+        'filter_error': result['story_filter'].filter_error,
+        'stories': result['page'].items,
+        'next_cursor': result['page'].next_cursor,
+        'listing_generation': result['generation'],
+    }
+    await btell_context.acontext_add_user_info(request, ctx)
     # 5. HTML template
-    return http.HttpResponse('Test - GET')
+    return shortcuts.render(request, 'btell_main/story_list.html', ctx)
 
 
 def story_list_post(request: http.HttpRequest) -> http.HttpResponse:
-    return http.HttpResponse('Test - POST')
\ No newline at end of file
+    return http.HttpResponse('Test - POST')
+
+
+def _story_json(story: models.Story) -> Dict[str, Any]:
+    """Serializes a story for the JSON story list."""
+    return {
+        'id': story.pk,
+        'title': story.title,
+        'author': story.author.username,
+        'description': story.description,
+        'published': story.published,
+        'last_update': story.last_update,
+        'completed': story.completed,
+    }
+
+
+@replicas.read_from_replica
+async def story_list_json(request: http.HttpRequest) -> http.HttpResponse:
+    """Serves pages of the story list as JSON, for endless scrolling."""
+    if request.method != 'GET':
+        return http.HttpResponseNotAllowed(['GET'])
+    try:
+        result = await _astory_page(request.GET.get('filter'), request.GET.get('cursor'))
+    except ValueError as cursor_error:
+        return http.JsonResponse({'error': str(cursor_error)}, status=400)
+    return http.JsonResponse({
+        'filter_error': result['story_filter'].filter_error,
+        'stories': [_story_json(story) for story in result['page'].items],
+        'next_cursor': result['page'].next_cursor,
+    })
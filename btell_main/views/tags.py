@@ -0,0 +1,13 @@
+"""Tag autocomplete for the story filter box."""
+from django import http
+
+from btell_main.util import replicas, tags
+
+
+@replicas.read_from_replica
+def tag_autocomplete(request: http.HttpRequest) -> http.HttpResponse:
+    """Returns the most used tags starting with `prefix`, with their published story counts."""
+    if request.method != 'GET':
+        return http.HttpResponseNotAllowed(['GET'])
+    matches = tags.autocomplete(request.GET.get('prefix', ''))
+    return http.JsonResponse({'tags': [{'name': tag.tag_name, 'stories': tag.story_count} for tag in matches]})
@@ -0,0 +1,26 @@
+"""Liking and disliking stories."""
+from django import http, shortcuts
+
+from btell_main import models
+from btell_main.util import user_util, votes
+
+VOTE_VALUES = {
+    'like': votes.LIKE,
+    'dislike': votes.DISLIKE,
+    'none': votes.NO_VOTE,
+}
+
+
+def vote_story(request: http.HttpRequest, story_id: int) -> http.HttpResponse:
+    """Records the vote of the logged-in user (`vote` is 'like', 'dislike' or 'none'), and returns the counts."""
+    if request.method != 'POST':
+        return http.HttpResponseNotAllowed(['POST'])
+    user = user_util.get_user_object(request)
+    if user is None:
+        return http.HttpResponseForbidden('Log in to vote.')
+    story = shortcuts.get_object_or_404(models.Story, pk=story_id, published__isnull=False)
+    value = VOTE_VALUES.get(request.POST.get('vote', ''))
+    if value is None:
+        return http.HttpResponseBadRequest('Unknown vote.')
+    votes.cast_vote(user, story.pk, value)
+    return http.JsonResponse(votes.vote_counts(story.pk))